@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -10,10 +10,128 @@ class Settings(BaseSettings):
     db_name: str = "finance_bot_db"
     db_user: str = "postgres"
     db_password: str = "123"
+    db_stream_batch_size: int = 1000
+    # Подготовленные запросы на соединение; 0 — без подготовки (PgBouncer в режиме транзакций)
+    db_statement_cache_size: int = 100
+    # Месячные партиции user_interactions, создаваемые заранее
+    interaction_partitions_ahead: int = 2
+    # Хранение истории: месяцев в рабочей таблице и в архиве, период проверки (секунды)
+    interaction_hot_months: int = 3
+    interaction_archive_months: int = 24
+    retention_interval: float = 86400
+    
+    # Отложенная запись взаимодействий
+    interaction_buffer_size: int = 10000
+    interaction_batch_size: int = 500
+    interaction_flush_interval: float = 1.0
+    interaction_put_timeout: float = 0.5
+    # Повторы неудачной записи пачки: паузы retry_backoff, 2 * retry_backoff, ...
+    interaction_write_retries: int = 5
+    interaction_retry_backoff: float = 0.5
+    # Кэш пользователей, уже записанных в users (TTL задает точность last_seen)
+    user_cache_size: int = 100000
+    user_cache_ttl: float = 3600
     
     coingecko_api_url: str = "https://api.coingecko.com/api/v3"
     alpha_vantage_api_key: Optional[str] = None
     alpha_vantage_api_url: str = "https://www.alphavantage.co/query"
+    coingecko_batch_size: int = 250
+    coingecko_ids_max_length: int = 1500
+    
+    # HTTP-пул и таймауты провайдеров (секунды)
+    http_pool_limit: int = 100
+    http_pool_limit_per_host: int = 20
+    http_dns_cache_ttl: int = 300
+    http_keepalive_timeout: float = 30
+    coingecko_connect_timeout: float = 3
+    coingecko_read_timeout: float = 10
+    coingecko_total_timeout: float = 15
+    alpha_vantage_connect_timeout: float = 3
+    alpha_vantage_read_timeout: float = 15
+    alpha_vantage_total_timeout: float = 20
+    
+    # Лимиты запросов к провайдерам
+    coingecko_rate_limit_per_minute: float = 30
+    coingecko_rate_limit_burst: int = 10
+    alpha_vantage_rate_limit_per_minute: float = 5
+    alpha_vantage_rate_limit_burst: int = 1
+    
+    # Кэш котировок (время жизни в секундах)
+    cache_max_size: int = 2048
+    price_cache_ttl: float = 30
+    crypto_info_cache_ttl: float = 60
+    stock_cache_ttl: float = 60
+    trending_cache_ttl: float = 300
+    search_cache_ttl: float = 600
+    market_cache_ttl: float = 120
+    
+    # Локальный справочник символов
+    symbol_catalog_refresh_interval: float = 21600
+    symbol_catalog_poll_interval: float = 300
+    symbol_catalog_rank_pages: int = 4
+    symbol_catalog_scan_limit: int = 500
+    
+    # История котировок
+    price_ingestion_interval: float = 60
+    price_ticks_partitions_ahead: int = 3
+    
+    # Хранилище FSM: memory (один процесс) или postgres (несколько реплик)
+    fsm_storage: str = "memory"
+    fsm_state_ttl: float = 86400
+    fsm_purge_interval: float = 3600
+    
+    # Рассылка подписок (лимиты Telegram)
+    telegram_global_rate: float = 30
+    telegram_chat_interval: float = 1.0
+    fanout_concurrency: int = 50
+    fanout_max_retries: int = 3
+    # Полная перезагрузка индекса алертов из БД (между ними — дочитывание изменений), секунды
+    alert_index_reload_interval: float = 3600
+    
+    # Режим приема обновлений: polling или webhook
+    bot_mode: str = "polling"
+    webhook_base_url: Optional[str] = None
+    webhook_path: str = "/webhook"
+    webhook_secret: Optional[str] = None
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8000
+    webhook_workers: int = 32
+    webhook_queue_size: int = 1000
+    
+    # Многопроцессный запуск (runner.py): число воркеров (0 — по числу ядер)
+    runner_workers: int = 0
+    runner_queue_size: int = 1000
+    runner_worker_concurrency: int = 64
+    # Шард текущего процесса; runner задает их воркерам сам
+    shard_index: int = 0
+    shard_count: int = 1
+    # Период попыток взять блокировку задач, выполняемых одним процессом в кластере
+    # (рассылки шарда, история котировок, ротация, очистка общего кэша), секунды
+    leader_retry_interval: float = 30
+    
+    # Общий кэш ответов провайдеров между процессами: none или postgres
+    shared_cache: str = "none"
+    shared_cache_purge_interval: float = 300
+    
+    # Telegram id администраторов (служебные команды, например /profile)
+    admin_ids: List[int] = []
+    
+    # Сэмплирующий профилировщик: интервал и длительность по умолчанию/максимум (секунды)
+    profiler_interval: float = 0.005
+    profiler_default_seconds: float = 30
+    profiler_max_seconds: float = 300
+    profiler_output_dir: str = "profiles"
+    
+    # Монитор цикла событий: период замера задержки, порог остановки (секунды),
+    # число последних замеров для перцентилей и глубина стека в отчете (0 — выключен)
+    loop_monitor_interval: float = 0.1
+    loop_stall_threshold: float = 0.2
+    loop_lag_window: int = 600
+    loop_stall_stack_depth: int = 25
+    
+    # Метрики в формате Prometheus (0 — выключены)
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9101
     
     debug: bool = True
     
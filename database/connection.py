@@ -1,220 +1,675 @@
 import asyncpg
-from typing import Optional, List
-from datetime import datetime
+import time
+from typing import Any, AsyncIterator, Dict, Optional, List, Set, Tuple
+from datetime import date, datetime, timedelta
 from config import settings
-from .models import UserInteraction, PriceAlert, UserSubscription
+from . import queries
+from .models import (
+    UserInteraction, PriceAlert, UserSubscription, PriceTick, PriceCandle,
+    UserUsage, DailyUsage, DailyActivity
+)
+from .migrations import backfill_usage_rollups, create_month_partition, migrate, next_month
+from .queries import Query, QueryConnection
+from services.alert_index import alert_index
+from services.metrics import DB_METHOD_DURATION, DB_METHOD_ERRORS, DB_POOL_WAIT
+
+
+class InstrumentedAcquire:
+    """Соединение из пула с замером ожидания пула и времени работы вызвавшего метода"""
+
+    __slots__ = ("pool", "method", "started", "context")
+
+    def __init__(self, pool: asyncpg.Pool, method: str):
+        self.pool = pool
+        self.method = method
+
+    async def __aenter__(self):
+        self.started = time.perf_counter()
+        self.context = self.pool.acquire()
+        try:
+            conn = await self.context.__aenter__()
+        except Exception:
+            DB_METHOD_ERRORS.labels(self.method).inc()
+            raise
+        DB_POOL_WAIT.labels(self.method).observe(time.perf_counter() - self.started)
+        return conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            return await self.context.__aexit__(exc_type, exc, tb)
+        finally:
+            if exc_type is not None:
+                DB_METHOD_ERRORS.labels(self.method).inc()
+            DB_METHOD_DURATION.labels(self.method).observe(time.perf_counter() - self.started)
 
 
 class Database:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self._price_tick_partitions = set()
+        self._interaction_partitions = set()
+    
+    @staticmethod
+    def _connect_params() -> Dict[str, Any]:
+        return {
+            "host": settings.db_host,
+            "port": settings.db_port,
+            "database": settings.db_name,
+            "user": settings.db_user,
+            "password": settings.db_password,
+        }
     
     async def connect(self):
         self.pool = await asyncpg.create_pool(
-            host=settings.db_host,
-            port=settings.db_port,
-            database=settings.db_name,
-            user=settings.db_user,
-            password=settings.db_password,
+            **self._connect_params(),
             min_size=1,
-            max_size=10
+            max_size=10,
+            connection_class=QueryConnection,
+            statement_cache_size=settings.db_statement_cache_size
         )
-        await self.create_tables()
+        await self.migrate()
+    
+    async def open_connection(self) -> asyncpg.Connection:
+        """Отдельное соединение вне пула — для сессионных блокировок, которые держатся долго"""
+        return await asyncpg.connect(**self._connect_params())
+    
+    def acquire(self, method: str) -> InstrumentedAcquire:
+        """Соединение из пула: async with db.acquire("Database.get_user_alerts") as conn.
+
+        method — метка метрик пула и длительности: квалифицированное имя
+        вызывающего метода (Database.get_user_alerts, PostgresStorage.set_state).
+        """
+        return InstrumentedAcquire(self.pool, method)
     
     async def close(self):
         """Закрытие пула соединений"""
         if self.pool:
             await self.pool.close()
     
-    async def create_tables(self):
-        async with self.pool.acquire() as conn:
-            # User interactions table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_interactions (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    username VARCHAR(255),
-                    request_text TEXT NOT NULL,
-                    response_text TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    async def migrate(self):
+        """Применение миграций схемы и загрузка списка существующих партиций"""
+        await migrate(self.pool)
+        await self._load_partitions()
+        await self.ensure_price_tick_partitions(date.today())
+        await self.ensure_interaction_partitions(date.today())
+    
+    async def _load_partitions(self):
+        self._price_tick_partitions.update(await self.get_partitions('price_ticks'))
+        self._interaction_partitions.update(await self.get_partitions('user_interactions'))
+    
+    async def get_partitions(self, parent: str) -> Dict[date, str]:
+        """Партиции таблицы по дате начала диапазона (из суффикса имени)"""
+        async with self.acquire("Database.get_partitions") as conn:
+            rows = await conn.fetch('''
+                SELECT child.relname AS name
+                FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = $1::regclass
+            ''', parent)
+        
+        partitions = {}
+        for row in rows:
+            suffix = row['name'][len(parent) + 1:]
+            if suffix.isdigit():
+                day_format = '%Y%m%d' if len(suffix) == 8 else '%Y%m'
+                partitions[datetime.strptime(suffix, day_format).date()] = row['name']
+        return partitions
+    
+    async def ensure_price_tick_partitions(self, start: date, days: Optional[int] = None):
+        """Создание дневных партиций price_ticks начиная с start"""
+        days = days or settings.price_ticks_partitions_ahead
+        async with self.acquire("Database.ensure_price_tick_partitions") as conn:
+            for offset in range(days):
+                day = start + timedelta(days=offset)
+                if day in self._price_tick_partitions:
+                    continue
+                await conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS price_ticks_{day:%Y%m%d}
+                    PARTITION OF price_ticks
+                    FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')
+                ''')
+                self._price_tick_partitions.add(day)
+    
+    async def ensure_interaction_partitions(self, start: date, months: Optional[int] = None):
+        """Создание месячных партиций user_interactions начиная с месяца start"""
+        months = months or settings.interaction_partitions_ahead
+        month = start.replace(day=1)
+        async with self.acquire("Database.ensure_interaction_partitions") as conn:
+            for _ in range(months):
+                if month not in self._interaction_partitions:
+                    await create_month_partition(conn, 'user_interactions', month)
+                    self._interaction_partitions.add(month)
+                month = next_month(month)
+    
+    _UPSERT_USERS = Query("upsert_users", '''
+        INSERT INTO users (user_id, username, first_seen, last_seen)
+        SELECT user_id, username, seen, seen
+        FROM unnest($1::bigint[], $2::varchar[], $3::timestamp[]) AS t(user_id, username, seen)
+        ON CONFLICT (user_id) DO UPDATE
+        SET username = EXCLUDED.username,
+            last_seen = GREATEST(users.last_seen, EXCLUDED.last_seen)
+    ''')
+    
+    async def upsert_users(self, users: List[Tuple[int, Optional[str], datetime]]) -> int:
+        """Добавление или обновление пользователей одной командой
+
+        users: кортежи (user_id, username, время последнего обращения)
+        """
+        if not users:
+            return 0
+        user_ids, usernames, seen = zip(*users)
+        async with self.acquire("Database.upsert_users") as conn:
+            await queries.execute(conn, self._UPSERT_USERS, list(user_ids), list(usernames), list(seen))
+            return len(users)
+    
+    async def save_interactions(self, records: List[tuple]) -> int:
+        """Пакетная запись взаимодействий через COPY
+
+        records: кортежи (user_id, username, request_text, response_text, created_at)
+        """
+        months = {record[4].date().replace(day=1) for record in records}
+        for month in months - self._interaction_partitions:
+            await self.ensure_interaction_partitions(month, 1)
+        
+        # Счетчики по пользователю и дню для user_daily_usage: [число, первое, последнее]
+        usage: Dict[Tuple[int, date], list] = {}
+        for user_id, _, _, _, created_at in records:
+            entry = usage.get((user_id, created_at.date()))
+            if entry is None:
+                usage[(user_id, created_at.date())] = [1, created_at, created_at]
+            else:
+                entry[0] += 1
+                entry[1] = min(entry[1], created_at)
+                entry[2] = max(entry[2], created_at)
+        
+        async with self.acquire("Database.save_interactions") as conn:
+            async with conn.transaction():
+                # username хранится в users (upsert_users), в журнал не пишется
+                await conn.copy_records_to_table(
+                    'user_interactions',
+                    records=[(user_id, request_text, response_text, created_at)
+                             for user_id, _, request_text, response_text, created_at in records],
+                    columns=['user_id', 'request_text', 'response_text', 'created_at']
                 )
-            ''')
-            
-            # Price alerts table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS price_alerts (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    symbol VARCHAR(50) NOT NULL,
-                    target_price DECIMAL(20, 8) NOT NULL,
-                    alert_type VARCHAR(10) NOT NULL CHECK (alert_type IN ('above', 'below')),
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                await queries.execute(
+                    conn, self._UPDATE_USAGE,
+                    [user_id for user_id, _ in usage],
+                    [day for _, day in usage],
+                    [entry[0] for entry in usage.values()],
+                    [entry[1] for entry in usage.values()],
+                    [entry[2] for entry in usage.values()]
                 )
-            ''')
-            
-            # User subscriptions table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_subscriptions (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    subscription_type VARCHAR(20) NOT NULL CHECK (subscription_type IN ('crypto', 'stocks', 'news')),
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, subscription_type)
-                )
-            ''')
-    
-    async def save_interaction(self, user_id: int, username: Optional[str], 
-                             request_text: str, response_text: str) -> UserInteraction:
-        """Сохранение взаимодействия пользователя"""
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow('''
-                INSERT INTO user_interactions (user_id, username, request_text, response_text)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id, user_id, username, request_text, response_text, created_at
-            ''', user_id, username, request_text, response_text)
-            
-            return UserInteraction(
-                id=row['id'],
-                user_id=row['user_id'],
-                username=row['username'],
-                request_text=row['request_text'],
-                response_text=row['response_text'],
-                created_at=row['created_at']
-            )
+            return len(records)
     
-    async def get_user_interactions(self, user_id: int, limit: int = 10) -> List[UserInteraction]:
-        """Получение истории взаимодействий пользователя"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT id, user_id, username, request_text, response_text, created_at
-                FROM user_interactions
-                WHERE user_id = $1
-                ORDER BY created_at DESC
-                LIMIT $2
-            ''', user_id, limit)
+    # Инкрементальное обновление счетчиков; xmax = 0 — строка дня вставлена впервые
+    _UPDATE_USAGE = Query("update_usage", '''
+        WITH batch AS (
+            SELECT *
+            FROM unnest($1::bigint[], $2::date[], $3::int[], $4::timestamp[], $5::timestamp[])
+                AS t(user_id, day, interactions, first_at, last_at)
+        ), daily AS (
+            INSERT INTO user_daily_usage AS d (user_id, day, interactions, first_at, last_at)
+            SELECT user_id, day, interactions, first_at, last_at FROM batch
+            ON CONFLICT (user_id, day) DO UPDATE
+            SET interactions = d.interactions + EXCLUDED.interactions,
+                first_at = LEAST(d.first_at, EXCLUDED.first_at),
+                last_at = GREATEST(d.last_at, EXCLUDED.last_at)
+            RETURNING d.user_id, (d.xmax = 0) AS inserted
+        )
+        INSERT INTO user_usage_totals AS t (user_id, total_interactions, active_days, first_interaction, last_interaction)
+        SELECT b.user_id, b.interactions, n.new_days, b.first_at, b.last_at
+        FROM (
+            SELECT user_id, sum(interactions) AS interactions, min(first_at) AS first_at, max(last_at) AS last_at
+            FROM batch
+            GROUP BY user_id
+        ) b
+        JOIN (
+            SELECT user_id, count(*) FILTER (WHERE inserted) AS new_days
+            FROM daily
+            GROUP BY user_id
+        ) n ON n.user_id = b.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_interactions = t.total_interactions + EXCLUDED.total_interactions,
+            active_days = t.active_days + EXCLUDED.active_days,
+            first_interaction = LEAST(t.first_interaction, EXCLUDED.first_interaction),
+            last_interaction = GREATEST(t.last_interaction, EXCLUDED.last_interaction)
+    ''')
+    
+    async def backfill_usage_rollups(self, since: Optional[date] = None):
+        """Пересчет счетчиков использования из журнала начиная с дня since"""
+        async with self.acquire("Database.backfill_usage_rollups") as conn:
+            async with conn.transaction():
+                await backfill_usage_rollups(conn, since)
+    
+    _GET_USER_USAGE = Query("get_user_usage", '''
+        SELECT user_id, total_interactions, active_days, first_interaction, last_interaction
+        FROM user_usage_totals
+        WHERE user_id = $1
+    ''', UserUsage)
+    
+    async def get_user_usage(self, user_id: int) -> Optional[UserUsage]:
+        """Суммарная статистика пользователя"""
+        async with self.acquire("Database.get_user_usage") as conn:
+            return await queries.fetchrow(conn, self._GET_USER_USAGE, user_id)
+    
+    _GET_USER_DAILY_USAGE = Query("get_user_daily_usage", '''
+        SELECT user_id, day, interactions, first_at, last_at
+        FROM user_daily_usage
+        WHERE user_id = $1 AND day >= $2 AND day < COALESCE($3, 'infinity'::date)
+        ORDER BY day
+    ''', DailyUsage)
+    
+    async def get_user_daily_usage(self, user_id: int, since: date,
+                                   until: Optional[date] = None) -> List[DailyUsage]:
+        """Активность пользователя по дням"""
+        async with self.acquire("Database.get_user_daily_usage") as conn:
+            return await queries.fetch(conn, self._GET_USER_DAILY_USAGE, user_id, since, until)
+    
+    _GET_DAILY_ACTIVITY = Query("get_daily_activity", '''
+        SELECT day, count(*) AS active_users, sum(interactions) AS interactions
+        FROM user_daily_usage
+        WHERE day >= $1 AND day < COALESCE($2, 'infinity'::date)
+        GROUP BY day
+        ORDER BY day
+    ''', DailyActivity)
+    
+    async def get_daily_activity(self, since: date, until: Optional[date] = None) -> List[DailyActivity]:
+        """Активные пользователи и число взаимодействий по дням"""
+        async with self.acquire("Database.get_daily_activity") as conn:
+            return await queries.fetch(conn, self._GET_DAILY_ACTIVITY, since, until)
+    
+    _OLDER_INTERACTIONS = Query("older_interactions", '''
+        SELECT id, user_id, (SELECT username FROM users WHERE user_id = $1) AS username,
+               request_text, response_text, created_at
+        FROM user_interactions
+        WHERE user_id = $1 AND (created_at, id) < ($2, $3)
+        ORDER BY created_at DESC, id DESC
+        LIMIT $4
+    ''', UserInteraction)
+    
+    _NEWER_INTERACTIONS = Query("newer_interactions", '''
+        SELECT id, user_id, (SELECT username FROM users WHERE user_id = $1) AS username,
+               request_text, response_text, created_at
+        FROM user_interactions
+        WHERE user_id = $1 AND (created_at, id) > ($2, $3)
+        ORDER BY created_at, id
+        LIMIT $4
+    ''', UserInteraction)
+    
+    _OLDER_ARCHIVED_INTERACTIONS = Query("older_archived_interactions", '''
+        SELECT a.id, a.user_id, (SELECT username FROM users WHERE user_id = $1) AS username,
+               a.request_text, COALESCE(r.body, '') AS response_text, a.created_at
+        FROM user_interactions_archive a
+        LEFT JOIN interaction_responses r ON r.hash = a.response_hash
+        WHERE a.user_id = $1 AND (a.created_at, a.id) < ($2, $3)
+        ORDER BY a.created_at DESC, a.id DESC
+        LIMIT $4
+    ''', UserInteraction)
+    
+    _NEWER_ARCHIVED_INTERACTIONS = Query("newer_archived_interactions", '''
+        SELECT a.id, a.user_id, (SELECT username FROM users WHERE user_id = $1) AS username,
+               a.request_text, COALESCE(r.body, '') AS response_text, a.created_at
+        FROM user_interactions_archive a
+        LEFT JOIN interaction_responses r ON r.hash = a.response_hash
+        WHERE a.user_id = $1 AND (a.created_at, a.id) > ($2, $3)
+        ORDER BY a.created_at, a.id
+        LIMIT $4
+    ''', UserInteraction)
+    
+    async def get_user_interactions(self, user_id: int, limit: int = 10,
+                                    before: Optional[Tuple[datetime, int]] = None,
+                                    after: Optional[Tuple[datetime, int]] = None) -> List[UserInteraction]:
+        """Получение истории взаимодействий пользователя, от новых к старым
+
+        Страницы выбираются по ключу (created_at, id): before — записи старше
+        курсора, after — новее. Каждая страница — диапазон индекса
+        (user_id, created_at DESC, id DESC), ее цена не зависит от глубины.
+        Недостающее в рабочей таблице добирается из архива.
+        """
+        if after is not None:
+            # Архив старше рабочей таблицы: к новым записям идем от него
+            sources = (self._NEWER_ARCHIVED_INTERACTIONS, self._NEWER_INTERACTIONS)
+            cursor = after
+        else:
+            sources = (self._OLDER_INTERACTIONS, self._OLDER_ARCHIVED_INTERACTIONS)
+            cursor = before or (datetime.max, 0)
+        
+        rows = []
+        async with self.acquire("Database.get_user_interactions") as conn:
+            for query in sources:
+                rows += await queries.fetch(conn, query, user_id, cursor[0], cursor[1], limit - len(rows))
+                if len(rows) >= limit:
+                    break
+        
+        if after is not None:
+            rows.reverse()
+        return rows
+    
+    async def archive_interaction_partition(self, month: date) -> int:
+        """Перенос месячной партиции user_interactions в архив и удаление ее целиком
+
+        Тексты ответов сохраняются один раз в interaction_responses по md5,
+        в архиве остаются метаданные запроса и ссылка на ответ. Копирование
+        идет из еще присоединенной партиции и не мешает чтению истории и COPY
+        журнала; user_interactions затрагивает только DETACH CONCURRENTLY.
+        Прерванный перенос можно повторить: месяц архива перезаписывается.
+        """
+        name = f"user_interactions_{month:%Y%m}"
+        archive = f"user_interactions_archive_{month:%Y%m}"
+        async with self.acquire("Database.archive_interaction_partition") as conn:
+            # Отдельно от копирования: создание партиции блокирует архив целиком
+            await create_month_partition(conn, 'user_interactions_archive', month)
+            async with conn.transaction():
+                await conn.execute(f'DELETE FROM {archive}')
+                await conn.execute(f'''
+                    INSERT INTO interaction_responses (hash, body, last_seen)
+                    SELECT md5(response_text)::uuid, min(response_text), $1::date
+                    FROM {name}
+                    GROUP BY md5(response_text)
+                    ON CONFLICT (hash) DO UPDATE
+                    SET last_seen = GREATEST(interaction_responses.last_seen, EXCLUDED.last_seen)
+                ''', month)
+                result = await conn.execute(f'''
+                    INSERT INTO user_interactions_archive
+                        (id, user_id, request_text, response_hash, created_at)
+                    SELECT id, user_id, request_text, md5(response_text)::uuid, created_at
+                    FROM {name}
+                ''')
             
-            return [
-                UserInteraction(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    username=row['username'],
-                    request_text=row['request_text'],
-                    response_text=row['response_text'],
-                    created_at=row['created_at']
-                )
-                for row in rows
-            ]
+            # Вне транзакции: CONCURRENTLY не берет ACCESS EXCLUSIVE на user_interactions.
+            # Прерванный DETACH оставляет партицию в состоянии pending — его завершает FINALIZE
+            pending = await conn.fetchval('''
+                SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass($1)
+            ''', name)
+            if pending is not None:
+                mode = 'FINALIZE' if pending else 'CONCURRENTLY'
+                await conn.execute(f'ALTER TABLE user_interactions DETACH PARTITION {name} {mode}')
+            await conn.execute(f'DROP TABLE IF EXISTS {name}')
+        
+        self._interaction_partitions.discard(month)
+        return int(result.split()[-1])
+    
+    async def drop_archive_partition(self, month: date):
+        """Удаление месячной партиции архива"""
+        async with self.acquire("Database.drop_archive_partition") as conn:
+            await conn.execute(f'DROP TABLE IF EXISTS user_interactions_archive_{month:%Y%m}')
+    
+    async def purge_interaction_responses(self, before: date) -> int:
+        """Удаление текстов ответов, на которые ссылались только удаленные партиции архива"""
+        async with self.acquire("Database.purge_interaction_responses") as conn:
+            result = await conn.execute('''
+                DELETE FROM interaction_responses
+                WHERE last_seen < $1
+            ''', before)
+            return int(result.split()[-1])
+    
+    _ADD_PRICE_ALERT = Query("add_price_alert", '''
+        INSERT INTO price_alerts (user_id, symbol, target_price, alert_type)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id, user_id, symbol, target_price::float8 AS target_price, alert_type, is_active, created_at
+    ''', PriceAlert)
     
     async def add_price_alert(self, user_id: int, symbol: str, 
                             target_price: float, alert_type: str) -> PriceAlert:
         """Добавление ценового алерта"""
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow('''
-                INSERT INTO price_alerts (user_id, symbol, target_price, alert_type)
-                VALUES ($1, $2, $3, $4)
-                RETURNING id, user_id, symbol, target_price, alert_type, is_active, created_at
-            ''', user_id, symbol, target_price, alert_type)
-            
-            return PriceAlert(
-                id=row['id'],
-                user_id=row['user_id'],
-                symbol=row['symbol'],
-                target_price=float(row['target_price']),
-                alert_type=row['alert_type'],
-                is_active=row['is_active'],
-                created_at=row['created_at']
+        async with self.acquire("Database.add_price_alert") as conn:
+            alert = await queries.fetchrow(
+                conn, self._ADD_PRICE_ALERT, user_id, symbol, target_price, alert_type
             )
+            alert_index.add(alert)
+            return alert
+    
+    _GET_USER_ALERTS = Query("get_user_alerts", '''
+        SELECT id, user_id, symbol, target_price::float8 AS target_price, alert_type, is_active, created_at
+        FROM price_alerts
+        WHERE user_id = $1 AND is_active = TRUE
+        ORDER BY created_at DESC
+    ''', PriceAlert)
     
     async def get_user_alerts(self, user_id: int) -> List[PriceAlert]:
         """Получение алертов пользователя"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT id, user_id, symbol, target_price, alert_type, is_active, created_at
-                FROM price_alerts
-                WHERE user_id = $1 AND is_active = TRUE
-                ORDER BY created_at DESC
-            ''', user_id)
-            
-            return [
-                PriceAlert(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    symbol=row['symbol'],
-                    target_price=float(row['target_price']),
-                    alert_type=row['alert_type'],
-                    is_active=row['is_active'],
-                    created_at=row['created_at']
-                )
-                for row in rows
-            ]
+        async with self.acquire("Database.get_user_alerts") as conn:
+            return await queries.fetch(conn, self._GET_USER_ALERTS, user_id)
+    
+    _ACTIVE_ALERTS = Query("active_alerts", '''
+        SELECT id, user_id, symbol, target_price::float8 AS target_price, alert_type, is_active, created_at
+        FROM price_alerts
+        WHERE is_active = TRUE
+          AND mod(abs(user_id), $1) = $2
+          AND id > $3
+    ''', PriceAlert)
+    
+    async def iter_active_alerts(self, batch_size: Optional[int] = None,
+                                 after_id: int = 0) -> AsyncIterator[List[PriceAlert]]:
+        """Потоковое чтение активных алертов шарда (с id больше after_id) пачками через серверный курсор"""
+        batch_size = batch_size or settings.db_stream_batch_size
+        async with self.acquire("Database.iter_active_alerts") as conn:
+            async with conn.transaction():
+                async for rows in queries.iter_batches(
+                    conn, self._ACTIVE_ALERTS, batch_size, settings.shard_count, settings.shard_index, after_id
+                ):
+                    yield rows
+    
+    _ALERTED_SYMBOLS = Query("alerted_symbols", '''
+        SELECT DISTINCT symbol
+        FROM price_alerts
+        WHERE is_active = TRUE
+    ''')
+    
+    async def get_alerted_symbols(self) -> List[str]:
+        """Символы с активными алертами всех шардов"""
+        async with self.acquire("Database.get_alerted_symbols") as conn:
+            return [row['symbol'] for row in await queries.fetch(conn, self._ALERTED_SYMBOLS)]
+    
+    _ACTIVE_ALERT_IDS = Query("active_alert_ids", '''
+        SELECT id
+        FROM price_alerts
+        WHERE id = ANY($1::int[]) AND is_active = TRUE
+    ''')
+    
+    async def get_active_alert_ids(self, alert_ids: List[int]) -> Set[int]:
+        """Те из alert_ids, что еще существуют и активны"""
+        if not alert_ids:
+            return set()
+        async with self.acquire("Database.get_active_alert_ids") as conn:
+            rows = await queries.fetch(conn, self._ACTIVE_ALERT_IDS, alert_ids)
+            return {row['id'] for row in rows}
+    
+    _GET_SUBSCRIPTION = Query("get_subscription", '''
+        SELECT id, user_id, subscription_type, is_active, created_at
+        FROM user_subscriptions
+        WHERE user_id = $1 AND subscription_type = $2
+    ''', UserSubscription)
+    
+    _SET_SUBSCRIPTION_ACTIVE = Query("set_subscription_active", '''
+        UPDATE user_subscriptions
+        SET is_active = $1
+        WHERE user_id = $2 AND subscription_type = $3
+        RETURNING id, user_id, subscription_type, is_active, created_at
+    ''', UserSubscription)
+    
+    _ADD_SUBSCRIPTION = Query("add_subscription", '''
+        INSERT INTO user_subscriptions (user_id, subscription_type, is_active)
+        VALUES ($1, $2, TRUE)
+        RETURNING id, user_id, subscription_type, is_active, created_at
+    ''', UserSubscription)
     
     async def toggle_subscription(self, user_id: int, subscription_type: str) -> UserSubscription:
         """Переключение подписки пользователя"""
-        async with self.pool.acquire() as conn:
+        async with self.acquire("Database.toggle_subscription") as conn:
             # Проверяем существующую подписку
-            existing = await conn.fetchrow('''
-                SELECT id, user_id, subscription_type, is_active, created_at
-                FROM user_subscriptions
-                WHERE user_id = $1 AND subscription_type = $2
-            ''', user_id, subscription_type)
+            existing = await queries.fetchrow(conn, self._GET_SUBSCRIPTION, user_id, subscription_type)
             
             if existing:
                 # Обновляем существующую подписку
-                is_active = not existing['is_active']
-                row = await conn.fetchrow('''
-                    UPDATE user_subscriptions
-                    SET is_active = $1
-                    WHERE user_id = $2 AND subscription_type = $3
-                    RETURNING id, user_id, subscription_type, is_active, created_at
-                ''', is_active, user_id, subscription_type)
-            else:
-                # Создаем новую подписку
-                row = await conn.fetchrow('''
-                    INSERT INTO user_subscriptions (user_id, subscription_type, is_active)
-                    VALUES ($1, $2, TRUE)
-                    RETURNING id, user_id, subscription_type, is_active, created_at
-                ''', user_id, subscription_type)
-            
-            return UserSubscription(
-                id=row['id'],
-                user_id=row['user_id'],
-                subscription_type=row['subscription_type'],
-                is_active=row['is_active'],
-                created_at=row['created_at']
-            )
+                return await queries.fetchrow(
+                    conn, self._SET_SUBSCRIPTION_ACTIVE, not existing.is_active, user_id, subscription_type
+                )
+            # Создаем новую подписку
+            return await queries.fetchrow(conn, self._ADD_SUBSCRIPTION, user_id, subscription_type)
+    
+    _GET_USER_SUBSCRIPTIONS = Query("get_user_subscriptions", '''
+        SELECT id, user_id, subscription_type, is_active, created_at
+        FROM user_subscriptions
+        WHERE user_id = $1
+        ORDER BY created_at DESC
+    ''', UserSubscription)
     
     async def get_user_subscriptions(self, user_id: int) -> List[UserSubscription]:
         """Получение подписок пользователя"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT id, user_id, subscription_type, is_active, created_at
-                FROM user_subscriptions
-                WHERE user_id = $1
-                ORDER BY created_at DESC
-            ''', user_id)
-            
-            return [
-                UserSubscription(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    subscription_type=row['subscription_type'],
-                    is_active=row['is_active'],
-                    created_at=row['created_at']
-                )
-                for row in rows
-            ]
+        async with self.acquire("Database.get_user_subscriptions") as conn:
+            return await queries.fetch(conn, self._GET_USER_SUBSCRIPTIONS, user_id)
+    
+    # Страницы по ключу: (subscription_type, user_id) — частичный индекс активных подписок по типу
+    _ACTIVE_SUBSCRIPTIONS_OF_TYPE = Query("active_subscriptions_of_type", '''
+        SELECT id, user_id, subscription_type, is_active, created_at
+        FROM user_subscriptions
+        WHERE is_active = TRUE
+          AND subscription_type = $1
+          AND mod(abs(user_id), $2) = $3
+          AND user_id > $4
+        ORDER BY user_id
+        LIMIT $5
+    ''', UserSubscription)
+    
+    # Все типы: ключ (user_id, subscription_type) — уникальный индекс таблицы
+    _ACTIVE_SUBSCRIPTIONS = Query("active_subscriptions", '''
+        SELECT id, user_id, subscription_type, is_active, created_at
+        FROM user_subscriptions
+        WHERE is_active = TRUE
+          AND mod(abs(user_id), $1) = $2
+          AND (user_id, subscription_type) > ($3, $4)
+        ORDER BY user_id, subscription_type
+        LIMIT $5
+    ''', UserSubscription)
+    
+    async def iter_active_subscriptions(self, subscription_type: Optional[str] = None,
+                                        batch_size: Optional[int] = None) -> AsyncIterator[List[UserSubscription]]:
+        """Активные подписки шарда (всех или одного типа) страницами по ключу
+
+        Каждая страница читается отдельным запросом, и соединение возвращается
+        в пул до того, как страницу начнут обрабатывать: рассылка со скоростью
+        лимита Telegram не держит ни соединение, ни снимок БД.
+        """
+        batch_size = batch_size or settings.db_stream_batch_size
+        # user_id может быть отрицательным (чаты), поэтому начинаем с минимального BIGINT
+        last_user_id, last_type = -2 ** 63, ''
+        while True:
+            async with self.acquire("Database.iter_active_subscriptions") as conn:
+                if subscription_type is None:
+                    rows = await queries.fetch(
+                        conn, self._ACTIVE_SUBSCRIPTIONS, settings.shard_count, settings.shard_index,
+                        last_user_id, last_type, batch_size
+                    )
+                else:
+                    rows = await queries.fetch(
+                        conn, self._ACTIVE_SUBSCRIPTIONS_OF_TYPE, subscription_type,
+                        settings.shard_count, settings.shard_index, last_user_id, batch_size
+                    )
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            last_user_id, last_type = rows[-1].user_id, rows[-1].subscription_type
+    
+    _DELETE_PRICE_ALERT = Query("delete_price_alert", '''
+        DELETE FROM price_alerts
+        WHERE id = $1 AND user_id = $2
+    ''')
     
     async def delete_price_alert(self, alert_id: int, user_id: int) -> bool:
         """Удаление ценового алерта"""
-        async with self.pool.acquire() as conn:
-            result = await conn.execute('''
-                DELETE FROM price_alerts
-                WHERE id = $1 AND user_id = $2
-            ''', alert_id, user_id)
+        async with self.acquire("Database.delete_price_alert") as conn:
+            result = await queries.execute(conn, self._DELETE_PRICE_ALERT, alert_id, user_id)
+            
+            deleted = result == "DELETE 1"
+            if deleted:
+                alert_index.remove(alert_id)
+            return deleted
+    
+    _DEACTIVATE_PRICE_ALERT = Query("deactivate_price_alert", '''
+        UPDATE price_alerts
+        SET is_active = FALSE
+        WHERE id = $1 AND is_active = TRUE
+    ''')
+    
+    async def deactivate_price_alert(self, alert_id: int) -> bool:
+        """Деактивация сработавшего алерта"""
+        async with self.acquire("Database.deactivate_price_alert") as conn:
+            result = await queries.execute(conn, self._DEACTIVATE_PRICE_ALERT, alert_id)
             
-            return result == "DELETE 1"
+            alert_index.remove(alert_id)
+            return result == "UPDATE 1"
+    
+    async def save_price_ticks(self, records: List[tuple]) -> int:
+        """Пакетная запись котировок через COPY
+
+        records: кортежи (symbol, ts, price, change_24h, market_cap)
+        """
+        days = {record[1].date() for record in records}
+        for day in days - self._price_tick_partitions:
+            await self.ensure_price_tick_partitions(day, 1)
+        
+        async with self.acquire("Database.save_price_ticks") as conn:
+            await conn.copy_records_to_table(
+                'price_ticks',
+                records=records,
+                columns=['symbol', 'ts', 'price', 'change_24h', 'market_cap']
+            )
+            return len(records)
+    
+    _GET_PRICE_TICKS = Query("get_price_ticks", '''
+        SELECT symbol, ts, price, change_24h, market_cap
+        FROM price_ticks
+        WHERE symbol = $1 AND ts >= $2 AND ts < COALESCE($3, 'infinity'::timestamp)
+        ORDER BY ts
+        LIMIT $4
+    ''', PriceTick)
+    
+    async def get_price_ticks(self, symbol: str, since: datetime,
+                              until: Optional[datetime] = None, limit: int = 10000) -> List[PriceTick]:
+        """Котировки символа за период (по возрастанию времени)"""
+        async with self.acquire("Database.get_price_ticks") as conn:
+            return await queries.fetch(conn, self._GET_PRICE_TICKS, symbol, since, until, limit)
+    
+    _GET_LATEST_PRICE_TICK = Query("get_latest_price_tick", '''
+        SELECT symbol, ts, price, change_24h, market_cap
+        FROM price_ticks
+        WHERE symbol = $1
+        ORDER BY ts DESC
+        LIMIT 1
+    ''', PriceTick)
+    
+    async def get_latest_price_tick(self, symbol: str) -> Optional[PriceTick]:
+        """Последняя сохраненная котировка символа"""
+        async with self.acquire("Database.get_latest_price_tick") as conn:
+            return await queries.fetchrow(conn, self._GET_LATEST_PRICE_TICK, symbol)
+    
+    _GET_PRICE_CANDLES = Query("get_price_candles", '''
+        SELECT
+            $1::varchar AS symbol,
+            to_timestamp(floor(extract(epoch FROM ts) / $4) * $4) AT TIME ZONE 'UTC' AS bucket,
+            (array_agg(price ORDER BY ts))[1] AS open,
+            max(price) AS high,
+            min(price) AS low,
+            (array_agg(price ORDER BY ts DESC))[1] AS close,
+            count(*) AS ticks
+        FROM price_ticks
+        WHERE symbol = $1 AND ts >= $2 AND ts < COALESCE($3, 'infinity'::timestamp)
+        GROUP BY bucket
+        ORDER BY bucket
+    ''', PriceCandle)
+    
+    async def get_price_candles(self, symbol: str, since: datetime, until: Optional[datetime] = None,
+                                bucket_seconds: int = 3600) -> List[PriceCandle]:
+        """Свечи OHLC символа за период с шагом bucket_seconds"""
+        async with self.acquire("Database.get_price_candles") as conn:
+            return await queries.fetch(conn, self._GET_PRICE_CANDLES, symbol, since, until, bucket_seconds)
+    
+    def query_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Время выполнения и число строк по запросам"""
+        return queries.query_stats()
 
 
 # Глобальный экземпляр базы данных
@@ -0,0 +1,109 @@
+import asyncio
+import json
+from typing import Any, Dict, Mapping, Optional, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from config import settings
+from .connection import Database, db
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище FSM в PostgreSQL для нескольких реплик бота.
+
+    Состояние и данные хранятся одной строкой на ключ в fsm_states. Чтения и
+    записи всегда идут в БД: следующий шаг диалога может попасть на другую
+    реплику, и кэш в процессе вернул бы ей устаревшее состояние. Брошенные
+    диалоги удаляются фоновой очисткой по fsm_state_ttl.
+    """
+
+    def __init__(self, database: Database, state_ttl: float):
+        self.database = database
+        self.state_ttl = state_ttl
+        self._purge_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id,
+            getattr(key, "business_connection_id", None), key.destiny
+        ))
+
+    async def _load(self, key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        async with self.database.acquire("PostgresStorage._load") as conn:
+            row = await conn.fetchrow('''
+                SELECT state, data
+                FROM fsm_states
+                WHERE key = $1
+            ''', key)
+
+        return (row['state'], json.loads(row['data'])) if row else (None, {})
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        storage_key = self._key(key)
+        async with self.database.acquire("PostgresStorage.set_state") as conn:
+            await conn.execute('''
+                INSERT INTO fsm_states (key, state, updated_at)
+                VALUES ($1, $2, CURRENT_TIMESTAMP)
+                ON CONFLICT (key) DO UPDATE
+                SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+            ''', storage_key, state)
+        self._ensure_purge_task()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self._key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self._key(key)
+        async with self.database.acquire("PostgresStorage.set_data") as conn:
+            await conn.execute('''
+                INSERT INTO fsm_states (key, data, updated_at)
+                VALUES ($1, $2::jsonb, CURRENT_TIMESTAMP)
+                ON CONFLICT (key) DO UPDATE
+                SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+            ''', storage_key, json.dumps(dict(data), ensure_ascii=False))
+        self._ensure_purge_task()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self._key(key))
+        return data
+
+    async def purge_expired(self) -> int:
+        """Удаление брошенных и пустых состояний"""
+        async with self.database.acquire("PostgresStorage.purge_expired") as conn:
+            result = await conn.execute('''
+                DELETE FROM fsm_states
+                WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                   OR (state IS NULL AND data = '{}'::jsonb)
+            ''', float(self.state_ttl))
+        return int(result.split()[-1])
+
+    def _ensure_purge_task(self):
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(settings.fsm_purge_interval)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                print(f"Error purging FSM states: {e}")
+
+    async def close(self) -> None:
+        if self._purge_task:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище FSM по настройке fsm_storage: memory или postgres"""
+    if settings.fsm_storage == "postgres":
+        return PostgresStorage(db, state_ttl=settings.fsm_state_ttl)
+    return MemoryStorage()
@@ -0,0 +1,400 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Awaitable, Callable, List, Optional
+import asyncpg
+
+
+# Ключ advisory-блокировки: миграции применяет только один процесс одновременно
+MIGRATIONS_LOCK_ID = 7240316
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[asyncpg.Connection], Awaitable[None]]
+
+
+# Миграции в порядке версий; каждая выполняется в своей транзакции
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    """Регистрация функции как миграции с номером version"""
+    def decorator(func: Callable[[asyncpg.Connection], Awaitable[None]]):
+        if MIGRATIONS and MIGRATIONS[-1].version >= version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append(Migration(version, name, func))
+        return func
+    return decorator
+
+
+def shift_month(month: date, months: int) -> date:
+    """Первое число месяца, отстоящего от month на months (может быть отрицательным)"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def next_month(month: date) -> date:
+    return shift_month(month, 1)
+
+
+async def create_month_partition(conn: asyncpg.Connection, table: str, month: date):
+    """Месячная партиция table_YYYYMM для месяца, содержащего month"""
+    month = month.replace(day=1)
+    await conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table}_{month:%Y%m}
+        PARTITION OF {table}
+        FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')
+    ''')
+
+
+async def applied_versions(conn: asyncpg.Connection) -> List[int]:
+    exists = await conn.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not exists:
+        return []
+    return [row['version'] for row in await conn.fetch('SELECT version FROM schema_migrations')]
+
+
+async def migrate(pool: asyncpg.Pool) -> List[int]:
+    """Применение недостающих миграций; возвращает номера примененных.
+
+    Если схема актуальна, выполняется только чтение schema_migrations — без
+    DDL и без блокировок.
+    """
+    async with pool.acquire() as conn:
+        if set(await applied_versions(conn)) >= {m.version for m in MIGRATIONS}:
+            return []
+
+        await conn.execute('SELECT pg_advisory_lock($1)', MIGRATIONS_LOCK_ID)
+        try:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Повторное чтение под блокировкой: миграции мог применить другой процесс
+            applied = set(await applied_versions(conn))
+            done = []
+            for m in MIGRATIONS:
+                if m.version in applied:
+                    continue
+                async with conn.transaction():
+                    await m.apply(conn)
+                    await conn.execute('''
+                        INSERT INTO schema_migrations (version, name) VALUES ($1, $2)
+                    ''', m.version, m.name)
+                print(f"Applied migration {m.version}: {m.name}")
+                done.append(m.version)
+            return done
+        finally:
+            await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATIONS_LOCK_ID)
+
+
+@migration(1, "initial_schema")
+async def _initial_schema(conn: asyncpg.Connection):
+    # IF NOT EXISTS: существующие базы, созданные до миграций, принимаются как есть
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_interactions (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            username VARCHAR(255),
+            request_text TEXT NOT NULL,
+            response_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS price_alerts (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            symbol VARCHAR(50) NOT NULL,
+            target_price DECIMAL(20, 8) NOT NULL,
+            alert_type VARCHAR(10) NOT NULL CHECK (alert_type IN ('above', 'below')),
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS user_subscriptions (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            subscription_type VARCHAR(20) NOT NULL CHECK (subscription_type IN ('crypto', 'stocks', 'news')),
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, subscription_type)
+        );
+    ''')
+
+
+@migration(2, "alert_and_subscription_indexes")
+async def _alert_and_subscription_indexes(conn: asyncpg.Connection):
+    # Индексы по булевым флагам и по user_id заменяются частичными и составными
+    await conn.execute('''
+        DROP INDEX IF EXISTS idx_price_alerts_active;
+        DROP INDEX IF EXISTS idx_price_alerts_user_id;
+        DROP INDEX IF EXISTS idx_user_subscriptions_active;
+        DROP INDEX IF EXISTS idx_user_subscriptions_user_id;
+
+        -- get_user_alerts: WHERE user_id AND is_active ORDER BY created_at DESC
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_user_active
+            ON price_alerts (user_id, created_at DESC) WHERE is_active;
+        -- Загрузка индекса алертов: только активные
+        CREATE INDEX IF NOT EXISTS idx_price_alerts_active_symbol
+            ON price_alerts (symbol) WHERE is_active;
+        -- Рассылка подписок: активные подписчики по типу
+        CREATE INDEX IF NOT EXISTS idx_user_subscriptions_active_type
+            ON user_subscriptions (subscription_type, user_id) WHERE is_active;
+    ''')
+
+
+@migration(3, "partition_user_interactions_by_month")
+async def _partition_user_interactions(conn: asyncpg.Connection):
+    had_views = await conn.fetchval('''
+        SELECT to_regclass('user_stats') IS NOT NULL AND to_regclass('active_alerts') IS NOT NULL
+    ''')
+
+    # Старая таблица переименовывается, новая создается с тем же именем и последовательностью.
+    # username переносится как есть: из него миграция users заполняет таблицу пользователей.
+    # Партиции DEFAULT нет: ее не архивирует ротация, и с ней невозможен DETACH CONCURRENTLY
+    await conn.execute('''
+        ALTER TABLE user_interactions RENAME TO user_interactions_legacy;
+        ALTER TABLE user_interactions_legacy
+            RENAME CONSTRAINT user_interactions_pkey TO user_interactions_legacy_pkey;
+        ALTER SEQUENCE user_interactions_id_seq AS BIGINT;
+
+        CREATE TABLE user_interactions (
+            id BIGINT NOT NULL DEFAULT nextval('user_interactions_id_seq'),
+            user_id BIGINT NOT NULL,
+            username VARCHAR(255),
+            request_text TEXT NOT NULL,
+            response_text TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+    ''')
+
+    # Месячные партиции для уже накопленной истории; следующие создает приложение
+    first = await conn.fetchval('SELECT min(created_at) FROM user_interactions_legacy')
+    month = (first.date() if first else date.today()).replace(day=1)
+    while month <= date.today():
+        await create_month_partition(conn, 'user_interactions', month)
+        month = next_month(month)
+
+    await conn.execute('''
+        INSERT INTO user_interactions (id, user_id, username, request_text, response_text, created_at)
+        SELECT id, user_id, username, request_text, response_text, COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM user_interactions_legacy;
+
+        ALTER SEQUENCE user_interactions_id_seq OWNED BY user_interactions.id;
+        DROP TABLE user_interactions_legacy CASCADE;
+    ''')
+
+    if had_views:
+        await conn.execute('''
+            CREATE OR REPLACE VIEW user_stats AS
+            SELECT
+                user_id,
+                COUNT(*) as total_interactions,
+                COUNT(DISTINCT DATE(created_at)) as active_days,
+                MIN(created_at) as first_interaction,
+                MAX(created_at) as last_interaction
+            FROM user_interactions
+            GROUP BY user_id;
+
+            CREATE OR REPLACE VIEW active_alerts AS
+            SELECT
+                pa.*,
+                ui.username
+            FROM price_alerts pa
+            LEFT JOIN user_interactions ui ON pa.user_id = ui.user_id
+            WHERE pa.is_active = TRUE
+            ORDER BY pa.created_at DESC;
+        ''')
+
+    # История пользователя постранично: WHERE user_id AND (created_at, id) < курсор
+    # ORDER BY created_at DESC, id DESC — по индексу в каждой партиции, без сортировки
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_interactions_user_created_id
+            ON user_interactions (user_id, created_at DESC, id DESC);
+    ''')
+
+
+@migration(4, "interaction_archive")
+async def _interaction_archive(conn: asyncpg.Connection):
+    # Архив старых взаимодействий: тексты ответов хранятся один раз в словаре по md5
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS interaction_responses (
+            hash UUID PRIMARY KEY,
+            body TEXT NOT NULL,
+            last_seen DATE NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS user_interactions_archive (
+            id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            request_text TEXT NOT NULL,
+            response_hash UUID NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        ) PARTITION BY RANGE (created_at);
+
+        CREATE INDEX IF NOT EXISTS idx_user_interactions_archive_user_created_id
+            ON user_interactions_archive (user_id, created_at DESC, id DESC);
+    ''')
+
+
+@migration(5, "users")
+async def _users(conn: asyncpg.Connection):
+    # Пользователь хранится один раз; username обновляется только при изменении
+    # и из журнала взаимодействий переносится сюда
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            username VARCHAR(255),
+            first_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        INSERT INTO users (user_id, username, first_seen, last_seen)
+        SELECT DISTINCT ON (user_id) user_id, username, first_seen, last_seen
+        FROM (
+            SELECT
+                user_id, username, created_at,
+                min(created_at) OVER (PARTITION BY user_id) AS first_seen,
+                max(created_at) OVER (PARTITION BY user_id) AS last_seen
+            FROM (
+                SELECT user_id, username, created_at
+                FROM user_interactions
+                UNION ALL
+                SELECT user_id, NULL AS username, created_at
+                FROM user_interactions_archive
+            ) history
+        ) seen
+        ORDER BY user_id, created_at DESC
+        ON CONFLICT (user_id) DO NOTHING;
+
+        -- Имя для алертов берется из users, а не из журнала взаимодействий;
+        -- user_stats перестраивает миграция usage_rollups
+        DROP VIEW IF EXISTS active_alerts;
+        CREATE VIEW active_alerts AS
+        SELECT
+            pa.*,
+            u.username
+        FROM price_alerts pa
+        LEFT JOIN users u ON u.user_id = pa.user_id
+        WHERE pa.is_active = TRUE
+        ORDER BY pa.created_at DESC;
+
+        ALTER TABLE user_interactions DROP COLUMN username;
+    ''')
+
+
+async def backfill_usage_rollups(conn: asyncpg.Connection, since: Optional[date] = None):
+    """Пересчет дневных и суммарных счетчиков из журнала взаимодействий (рабочего и архива)
+
+    Дни начиная с since пересчитываются заново; дни, уже удаленные из архива,
+    при since=None теряются — пересчитывать все имеет смысл только при полном архиве.
+    """
+    since = since or date.min
+    await conn.execute('''
+        DELETE FROM user_daily_usage WHERE day >= $1
+    ''', since)
+    await conn.execute('''
+        INSERT INTO user_daily_usage (user_id, day, interactions, first_at, last_at)
+        SELECT user_id, created_at::date, count(*), min(created_at), max(created_at)
+        FROM (
+            SELECT user_id, created_at FROM user_interactions WHERE created_at >= $1
+            UNION ALL
+            SELECT user_id, created_at FROM user_interactions_archive WHERE created_at >= $1
+        ) history
+        GROUP BY user_id, created_at::date
+    ''', since)
+    await conn.execute('''
+        TRUNCATE user_usage_totals;
+        INSERT INTO user_usage_totals (user_id, total_interactions, active_days, first_interaction, last_interaction)
+        SELECT user_id, sum(interactions), count(*), min(first_at), max(last_at)
+        FROM user_daily_usage
+        GROUP BY user_id;
+    ''')
+
+
+@migration(6, "usage_rollups")
+async def _usage_rollups(conn: asyncpg.Connection):
+    # Счетчики обновляются при каждой записи пачки взаимодействий (Database.save_interactions)
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_daily_usage (
+            user_id BIGINT NOT NULL,
+            day DATE NOT NULL,
+            interactions INTEGER NOT NULL,
+            first_at TIMESTAMP NOT NULL,
+            last_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, day)
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_daily_usage_day ON user_daily_usage (day);
+
+        CREATE TABLE IF NOT EXISTS user_usage_totals (
+            user_id BIGINT PRIMARY KEY,
+            total_interactions BIGINT NOT NULL,
+            active_days INTEGER NOT NULL,
+            first_interaction TIMESTAMP NOT NULL,
+            last_interaction TIMESTAMP NOT NULL
+        );
+    ''')
+    await backfill_usage_rollups(conn)
+    await conn.execute('''
+        DROP VIEW IF EXISTS user_stats;
+        CREATE VIEW user_stats AS
+        SELECT
+            u.user_id,
+            u.username,
+            COALESCE(t.total_interactions, 0) AS total_interactions,
+            COALESCE(t.active_days, 0) AS active_days,
+            COALESCE(t.first_interaction, u.first_seen) AS first_interaction,
+            COALESCE(t.last_interaction, u.last_seen) AS last_interaction
+        FROM users u
+        LEFT JOIN user_usage_totals t ON t.user_id = u.user_id;
+    ''')
+
+
+# Таблицы, которые появились после базовой схемы
+
+@migration(7, "price_ticks")
+async def _price_ticks(conn: asyncpg.Connection):
+    # Дневные партиции создает приложение (Database.ensure_price_tick_partitions)
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS price_ticks (
+            symbol VARCHAR(50) NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            price DOUBLE PRECISION NOT NULL,
+            change_24h DOUBLE PRECISION,
+            market_cap DOUBLE PRECISION,
+            PRIMARY KEY (symbol, ts)
+        ) PARTITION BY RANGE (ts);
+    ''')
+
+
+@migration(8, "fsm_states")
+async def _fsm_states(conn: asyncpg.Connection):
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data JSONB NOT NULL DEFAULT '{}',
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at);
+    ''')
+
+
+@migration(9, "api_cache")
+async def _api_cache(conn: asyncpg.Connection):
+    # Без WAL: при сбое БД общий кэш просто теряется
+    await conn.execute('''
+        CREATE UNLOGGED TABLE IF NOT EXISTS api_cache (
+            namespace VARCHAR(50) NOT NULL,
+            key TEXT NOT NULL,
+            value JSONB NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (namespace, key)
+        );
+    ''')
@@ -1,10 +1,31 @@
-from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
+import asyncpg
 
 
-@dataclass
-class UserInteraction:
+class Model(asyncpg.Record):
+    """Строка результата запроса с доступом к колонкам как к атрибутам.
+
+    Модели передаются asyncpg как record_class: строки сразу создаются нужного
+    класса, без копирования полей в промежуточные объекты. Аннотации описывают
+    колонки, которые должен вернуть запрос.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{key}={value!r}" for key, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+class UserInteraction(Model):
+    __slots__ = ()
     id: Optional[int]
     user_id: int
     username: Optional[str]
@@ -13,8 +34,8 @@ class UserInteraction:
     created_at: datetime
 
 
-@dataclass
-class PriceAlert:
+class PriceAlert(Model):
+    __slots__ = ()
     id: Optional[int]
     user_id: int
     symbol: str
@@ -24,10 +45,55 @@ class PriceAlert:
     created_at: datetime
 
 
-@dataclass
-class UserSubscription:
+class UserSubscription(Model):
+    __slots__ = ()
     id: Optional[int]
     user_id: int
     subscription_type: str  # 'crypto', 'stocks', 'news'
     is_active: bool
     created_at: datetime
+
+
+class PriceTick(Model):
+    __slots__ = ()
+    symbol: str
+    ts: datetime
+    price: float
+    change_24h: Optional[float]
+    market_cap: Optional[float]
+
+
+class PriceCandle(Model):
+    __slots__ = ()
+    symbol: str
+    bucket: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: int
+
+
+class UserUsage(Model):
+    __slots__ = ()
+    user_id: int
+    total_interactions: int
+    active_days: int
+    first_interaction: datetime
+    last_interaction: datetime
+
+
+class DailyUsage(Model):
+    __slots__ = ()
+    user_id: int
+    day: date
+    interactions: int
+    first_at: datetime
+    last_at: datetime
+
+
+class DailyActivity(Model):
+    __slots__ = ()
+    day: date
+    active_users: int
+    interactions: int
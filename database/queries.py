@@ -0,0 +1,168 @@
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Type
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+from config import settings
+
+
+class QueryStats:
+    """Время выполнения и число строк одного запроса"""
+
+    __slots__ = ("calls", "rows", "errors", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, rows: int):
+        self.calls += 1
+        self.rows += rows
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "errors": self.errors,
+            "avg_ms": self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+# Все объявленные запросы по имени
+QUERIES: Dict[str, "Query"] = {}
+
+
+class Query:
+    """Именованный запрос: SQL, класс строк результата и статистика"""
+
+    __slots__ = ("name", "sql", "record_class", "stats")
+
+    def __init__(self, name: str, sql: str, record_class: Type[asyncpg.Record] = asyncpg.Record):
+        if name in QUERIES:
+            raise ValueError(f"Query {name} is already registered")
+        self.name = name
+        self.sql = sql
+        self.record_class = record_class
+        self.stats = QueryStats()
+        QUERIES[name] = self
+
+
+class QueryConnection(asyncpg.Connection):
+    """Соединение, которое готовит запросы реестра один раз и хранит их до закрытия"""
+
+    __slots__ = ("_prepared",)
+
+    async def prepared(self, query: Query) -> PreparedStatement:
+        try:
+            statements = self._prepared
+        except AttributeError:
+            statements = self._prepared = {}
+
+        statement = statements.get(query.name)
+        if statement is None:
+            statement = await self.prepare(query.sql, record_class=query.record_class)
+            statements[query.name] = statement
+        return statement
+
+    def forget_prepared(self, query: Query):
+        try:
+            self._prepared.pop(query.name, None)
+        except AttributeError:
+            pass
+
+
+async def _run(conn, query: Query, call: Callable[[PreparedStatement], Awaitable[Any]]) -> Any:
+    """Выполнение через подготовленный запрос; после изменения схемы он готовится заново"""
+    try:
+        return await call(await conn.prepared(query))
+    except asyncpg.exceptions.InvalidCachedStatementError:
+        conn.forget_prepared(query)
+        return await call(await conn.prepared(query))
+
+
+def _use_prepared() -> bool:
+    # Без кэша выражений (например, за PgBouncer в режиме транзакций) запросы не готовятся
+    return settings.db_statement_cache_size > 0
+
+
+async def fetch(conn, query: Query, *args) -> List[asyncpg.Record]:
+    started = time.perf_counter()
+    try:
+        if _use_prepared():
+            rows = await _run(conn, query, lambda statement: statement.fetch(*args))
+        else:
+            rows = await conn.fetch(query.sql, *args, record_class=query.record_class)
+    except Exception:
+        query.stats.errors += 1
+        raise
+    query.stats.record(time.perf_counter() - started, len(rows))
+    return rows
+
+
+async def fetchrow(conn, query: Query, *args) -> Optional[asyncpg.Record]:
+    started = time.perf_counter()
+    try:
+        if _use_prepared():
+            row = await _run(conn, query, lambda statement: statement.fetchrow(*args))
+        else:
+            row = await conn.fetchrow(query.sql, *args, record_class=query.record_class)
+    except Exception:
+        query.stats.errors += 1
+        raise
+    query.stats.record(time.perf_counter() - started, row is not None)
+    return row
+
+
+async def execute(conn, query: Query, *args) -> str:
+    """Выполнение без результата; возвращает статус команды (например, 'DELETE 1')"""
+    async def call(statement: PreparedStatement) -> str:
+        await statement.fetch(*args)
+        return statement.get_statusmsg()
+
+    started = time.perf_counter()
+    try:
+        if _use_prepared():
+            status = await _run(conn, query, call)
+        else:
+            status = await conn.execute(query.sql, *args)
+    except Exception:
+        query.stats.errors += 1
+        raise
+    parts = status.split()
+    query.stats.record(time.perf_counter() - started, int(parts[-1]) if parts and parts[-1].isdigit() else 0)
+    return status
+
+
+async def iter_batches(conn, query: Query, batch_size: int, *args) -> AsyncIterator[List[asyncpg.Record]]:
+    """Чтение результата пачками через серверный курсор (внутри транзакции)"""
+    started = time.perf_counter()
+    try:
+        if _use_prepared():
+            cursor = await _run(conn, query, lambda statement: statement.cursor(*args))
+        else:
+            cursor = await conn.cursor(query.sql, *args, record_class=query.record_class)
+    except Exception:
+        query.stats.errors += 1
+        raise
+
+    first = True
+    while True:
+        rows = await cursor.fetch(batch_size)
+        if rows or first:
+            query.stats.record(time.perf_counter() - started, len(rows))
+        if not rows:
+            break
+        yield rows
+        first = False
+        started = time.perf_counter()
+
+
+def query_stats() -> Dict[str, Dict[str, Any]]:
+    """Статистика выполненных запросов"""
+    return {name: query.stats.as_dict() for name, query in QUERIES.items() if query.stats.calls}
@@ -0,0 +1,43 @@
+import asyncio
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
+from config import settings
+from services.profiler import profiler
+
+router = Router()
+
+# Служебные команды доступны только администраторам. Остальным роутер отвечает
+# сам, чтобы команда не ушла в следующие роутеры (свободный текст — это запрос котировки)
+is_admin = F.from_user.id.in_(set(settings.admin_ids))
+
+
+@router.message(Command("profile"), is_admin)
+async def cmd_profile(message: Message, command: CommandObject):
+    """Сэмплирующее профилирование цикла событий: /profile [секунды]"""
+    try:
+        seconds = float(command.args) if command.args else settings.profiler_default_seconds
+    except ValueError:
+        await message.answer("Использование: /profile [секунды]")
+        return
+    seconds = min(max(seconds, 1), settings.profiler_max_seconds)
+    
+    if profiler.running:
+        await message.answer("⏳ Профилирование уже идет.")
+        return
+    
+    await message.answer(f"⏱ Профилирование {seconds:.0f} с...")
+    result = await profiler.profile(seconds)
+    folded, _ = await asyncio.get_running_loop().run_in_executor(None, profiler.save, result)
+    
+    # Лимит длины сообщения Telegram — 4096 символов
+    await message.answer(result.summary(limit=10)[:4000])
+    await message.answer_document(
+        BufferedInputFile(result.collapsed().encode(), filename=folded.rsplit("/", 1)[-1]),
+        caption="Свернутые стеки для flamegraph.pl / speedscope"
+    )
+
+
+@router.message(Command("profile"))
+async def cmd_admin_only(message: Message):
+    await message.answer("⛔ Команда доступна только администраторам.")
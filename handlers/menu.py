@@ -1,10 +1,14 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from database.connection import db
-from services.finance_api import finance_api
+from services.finance_api import finance_api, POPULAR_CRYPTO_IDS
+from services.interaction_logger import interaction_logger
 import re
 
 router = Router()
@@ -91,7 +95,7 @@ async def cmd_start(message: Message):
     
     await message.answer(welcome_text, reply_markup=get_main_menu())
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=message.from_user.id,
         username=message.from_user.username,
         request_text="/start",
@@ -148,7 +152,7 @@ async def show_trending(callback: CallbackQuery):
     await callback.message.edit_text(response, reply_markup=builder.as_markup())
     await callback.answer()
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=callback.from_user.id,
         username=callback.from_user.username,
         request_text="trending",
@@ -159,7 +163,11 @@ async def show_trending(callback: CallbackQuery):
 @router.callback_query(F.data == "menu_market")
 async def show_market(callback: CallbackQuery):
     """Показать обзор рынка"""
-    market_data = await finance_api.get_market_summary()
+    # Сводку и цены топ-5 запрашиваем параллельно, цены — одним пакетным запросом
+    market_data, prices = await asyncio.gather(
+        finance_api.get_market_summary(),
+        finance_api.get_crypto_prices(POPULAR_CRYPTO_IDS)
+    )
     
     if market_data:
         response = f"""📊 Сводка крипторынка
@@ -172,9 +180,8 @@ async def show_market(callback: CallbackQuery):
 🏆 Топ-5 по капитализации:
 """
         # Добавляем топ-5 криптовалют
-        top_coins = ['bitcoin', 'ethereum', 'binancecoin', 'solana', 'cardano']
-        for coin_id in top_coins:
-            coin_info = await finance_api.get_crypto_price(coin_id)
+        for coin_id in POPULAR_CRYPTO_IDS:
+            coin_info = prices.get(coin_id, {}).get("usd")
             if coin_info:
                 response += f"• {coin_id.title()}: ${coin_info['price']:,.2f}\n"
     else:
@@ -186,7 +193,7 @@ async def show_market(callback: CallbackQuery):
     await callback.message.edit_text(response, reply_markup=builder.as_markup())
     await callback.answer()
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=callback.from_user.id,
         username=callback.from_user.username,
         request_text="market",
@@ -227,26 +234,72 @@ async def show_subscriptions_menu(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu_history")
-async def show_history(callback: CallbackQuery):
-    """Показать историю запросов"""
-    interactions = await db.get_user_interactions(callback.from_user.id, limit=5)
+HISTORY_PAGE_SIZE = 5
+_HISTORY_EPOCH = datetime(1970, 1, 1)
+
+
+def _history_cursor(interaction) -> str:
+    """Компактный курсор (created_at, id) для callback_data: микросекунды и id в hex"""
+    micros = (interaction.created_at - _HISTORY_EPOCH) // timedelta(microseconds=1)
+    return f"{micros:x}_{interaction.id:x}"
+
+
+def _parse_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    micros, interaction_id = cursor.split("_")
+    return _HISTORY_EPOCH + timedelta(microseconds=int(micros, 16)), int(interaction_id, 16)
+
+
+async def _render_history_page(user_id: int, direction: Optional[str] = None,
+                               cursor: Optional[str] = None) -> Tuple[str, InlineKeyboardMarkup]:
+    """Страница истории: direction 'o' — старше курсора, 'n' — новее"""
+    key = _parse_history_cursor(cursor) if cursor else None
+    has_newer = has_older = False
+    
+    if direction == "n" and key:
+        interactions = await db.get_user_interactions(user_id, limit=HISTORY_PAGE_SIZE + 1, after=key)
+        has_newer = len(interactions) > HISTORY_PAGE_SIZE
+        interactions = interactions[-HISTORY_PAGE_SIZE:]
+        has_older = True
+        if not has_newer:
+            # Дошли до начала — показываем первую страницу целиком
+            return await _render_history_page(user_id)
+    else:
+        interactions = await db.get_user_interactions(user_id, limit=HISTORY_PAGE_SIZE + 1, before=key)
+        has_older = len(interactions) > HISTORY_PAGE_SIZE
+        interactions = interactions[:HISTORY_PAGE_SIZE]
+        has_newer = key is not None
     
     if interactions:
-        response = "📚 Ваша история запросов (последние 5):\n\n"
-        for i, interaction in enumerate(interactions, 1):
-            response += f"{i}. {interaction.request_text}\n"
+        response = "📚 Ваша история запросов:\n\n"
+        for interaction in interactions:
+            response += f"• {interaction.request_text}\n"
             response += f"   📅 {interaction.created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
     else:
         response = "📚 История запросов пуста."
     
     builder = InlineKeyboardBuilder()
-    builder.button(text="⬅️ Назад", callback_data="menu_main")
+    navigation = 0
+    if interactions and has_newer:
+        builder.button(text="⬅️ Новее", callback_data=f"hist_n_{_history_cursor(interactions[0])}")
+        navigation += 1
+    if interactions and has_older:
+        builder.button(text="Старее ➡️", callback_data=f"hist_o_{_history_cursor(interactions[-1])}")
+        navigation += 1
+    builder.button(text="🏠 Главное меню", callback_data="menu_main")
+    builder.adjust(*((navigation, 1) if navigation else (1,)))
     
-    await callback.message.edit_text(response, reply_markup=builder.as_markup())
+    return response, builder.as_markup()
+
+
+@router.callback_query(F.data == "menu_history")
+async def show_history(callback: CallbackQuery):
+    """Показать историю запросов"""
+    response, markup = await _render_history_page(callback.from_user.id)
+    
+    await callback.message.edit_text(response, reply_markup=markup)
     await callback.answer()
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=callback.from_user.id,
         username=callback.from_user.username,
         request_text="history",
@@ -254,6 +307,16 @@ async def show_history(callback: CallbackQuery):
     )
 
 
+@router.callback_query(F.data.startswith("hist_"))
+async def show_history_page(callback: CallbackQuery):
+    """Листание истории запросов по курсору"""
+    _, direction, cursor = callback.data.split("_", 2)
+    response, markup = await _render_history_page(callback.from_user.id, direction, cursor)
+    
+    await callback.message.edit_text(response, reply_markup=markup)
+    await callback.answer()
+
+
 @router.callback_query(F.data == "menu_help")
 async def show_help(callback: CallbackQuery):
     """Показать справку"""
@@ -302,7 +365,7 @@ async def handle_crypto_selection(callback: CallbackQuery):
     await callback.message.edit_text(response, reply_markup=builder.as_markup())
     await callback.answer()
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=callback.from_user.id,
         username=callback.from_user.username,
         request_text=f"crypto_{symbol}",
@@ -333,7 +396,7 @@ async def handle_stock_selection(callback: CallbackQuery):
     await callback.message.edit_text(response, reply_markup=builder.as_markup())
     await callback.answer()
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=callback.from_user.id,
         username=callback.from_user.username,
         request_text=f"stock_{symbol}",
@@ -375,13 +438,10 @@ async def process_symbol_input(message: Message, state: FSMContext):
     
     # Если это режим алерта
     if alert_mode:
-        # Проверяем существование символа
-        crypto_info = await finance_api.get_crypto_info(symbol)
-        if not crypto_info:
-            stock_info = await finance_api.get_stock_price(symbol.upper())
-            if not stock_info:
-                await message.answer(f"❌ Символ '{symbol}' не найден. Попробуйте другой символ.")
-                return
+        # Проверяем существование символа (криптовалюта или акция)
+        if not await finance_api.resolve_query(symbol, kinds=("crypto", "stock")):
+            await message.answer(f"❌ Символ '{symbol}' не найден. Попробуйте другой символ.")
+            return
         
         await state.update_data(symbol=symbol)
         await state.set_state(AlertStates.waiting_for_price)
@@ -423,7 +483,7 @@ async def process_symbol_input(message: Message, state: FSMContext):
     await message.answer(response, reply_markup=builder.as_markup())
     await state.clear()
     
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=message.from_user.id,
         username=message.from_user.username,
         request_text=f"search_{symbol}",
@@ -1,7 +1,8 @@
 from aiogram import Router, F
 from aiogram.types import Message
-from database.connection import db
 from services.finance_api import finance_api
+from services.interaction_logger import interaction_logger
+from services.symbol_catalog import symbol_catalog
 import re
 
 router = Router()
@@ -25,7 +26,7 @@ async def handle_text_message(message: Message):
     await message.answer(response)
     
     # Сохраняем взаимодействие
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=message.from_user.id,
         username=message.from_user.username,
         request_text=message.text,
@@ -35,21 +36,47 @@ async def handle_text_message(message: Message):
 
 async def process_finance_query(query: str) -> str:
     """Обработка финансового запроса"""
-    # Сначала пробуем найти точное совпадение для криптовалюты
-    crypto_info = await finance_api.get_crypto_info(query)
+    if symbol_catalog.loaded:
+        return await process_catalog_query(query)
     
-    if crypto_info:
-        return format_crypto_response(crypto_info)
+    # Справочник еще не загружен — параллельно ищем криптовалюту, акцию и результаты поиска
+    found = await finance_api.resolve_query(query)
     
-    # Если не нашли криптовалюту, пробуем акции
-    stock_info = await finance_api.get_stock_price(query.upper())
-    if stock_info:
-        return format_stock_response(stock_info)
+    if found:
+        kind, data = found
+        if kind == "crypto":
+            return format_crypto_response(data)
+        if kind == "stock":
+            return format_stock_response(data)
+        return format_search_results(data, query)
     
-    # Если не нашли точное совпадение, пробуем поиск
-    search_results = await finance_api.search_crypto(query)
-    if search_results:
-        return format_search_results(search_results, query)
+    return f"❌ Не удалось найти информацию для '{query}'.\n\n💡 Попробуйте:\n• Используйте меню для навигации\n• Или напишите точное название криптовалюты/акции"
+
+
+async def process_catalog_query(query: str) -> str:
+    """Обработка запроса через локальный справочник: запрашиваются данные только найденного актива"""
+    entry = symbol_catalog.resolve(query)
+    
+    if entry and entry.kind == "crypto":
+        crypto_info = await finance_api.get_crypto_info(entry.id)
+        if crypto_info:
+            return format_crypto_response(crypto_info)
+    elif entry:
+        stock_info = await finance_api.get_stock_price(entry.id)
+        if stock_info:
+            return format_stock_response(stock_info)
+    
+    suggestions = symbol_catalog.suggest(query)
+    if suggestions:
+        return format_search_results([
+            {
+                "id": item.id,
+                "name": item.name,
+                "symbol": item.symbol.upper(),
+                "market_cap_rank": item.rank
+            }
+            for item in suggestions
+        ], query)
     
     return f"❌ Не удалось найти информацию для '{query}'.\n\n💡 Попробуйте:\n• Используйте меню для навигации\n• Или напишите точное название криптовалюты/акции"
 
@@ -134,7 +161,7 @@ async def handle_bitcoin(message: Message):
     await message.answer(response)
     
     # Сохраняем взаимодействие
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=message.from_user.id,
         username=message.from_user.username,
         request_text=message.text,
@@ -168,7 +195,7 @@ async def handle_ethereum(message: Message):
     await message.answer(response)
     
     # Сохраняем взаимодействие
-    await db.save_interaction(
+    await interaction_logger.log(
         user_id=message.from_user.id,
         username=message.from_user.username,
         request_text=message.text,
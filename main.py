@@ -1,50 +1,177 @@
 import asyncio
 import logging
+import signal
+from typing import List
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import ErrorEvent, Update
 
 from config import settings
 from database.connection import db
+from database.fsm_storage import create_fsm_storage
 from services.finance_api import finance_api
+from services.interaction_logger import interaction_logger
+from services.leader import LeaderLock
+from services.loop_monitor import loop_monitor
+from services.metrics import HandlerMetricsMiddleware, metrics_server
+from services.price_ingestion import price_ingestion
+from services.profiler import profiler
+from services.retention import retention_service
+from services.shared_cache import shared_cache
 from services.subscription_service import subscription_service
-from handlers import menu, messages
+from services.symbol_catalog import symbol_catalog
+from services.webhook_server import WebhookServer
+from handlers import admin, menu, messages
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    # Создаем бота
-    bot = Bot(token=settings.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Прием обновлений через webhook вместо long polling"""
+    async def process_update(data: dict):
+        update = Update.model_validate(data, context={"bot": bot})
+        await dp.feed_update(bot, update)
     
-    # Подключаемся к БД
-    logger.info("Connecting to database...")
-    await db.connect()
+    server = WebhookServer(
+        process_update,
+        path=settings.webhook_path,
+        secret_token=settings.webhook_secret,
+        workers=settings.webhook_workers,
+        queue_size=settings.webhook_queue_size,
+        readiness=lambda: db.pool is not None
+    )
+    await server.start(settings.webhook_host, settings.webhook_port)
     
-    # Запускаем сервис подписок  
-    await subscription_service.start_subscription_service()
+    if settings.webhook_base_url:
+        await bot.set_webhook(
+            url=f"{settings.webhook_base_url.rstrip('/')}{settings.webhook_path}",
+            secret_token=settings.webhook_secret,
+            allowed_updates=dp.resolve_used_update_types()
+        )
     
-    # Подключаем обработчики
+    # Работаем до SIGTERM/SIGINT
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop()
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер с хранилищем FSM и обработчиками"""
+    dp = Dispatcher(storage=create_fsm_storage())
+    dp.include_router(admin.router)
     dp.include_router(menu.router)
     dp.include_router(messages.router)
+    # Внутренние middleware диспетчера действуют и во вложенных роутерах
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
     
     @dp.error()
-    async def error_handler(update, exception):
-        logger.error(f"Error: {exception}")
+    async def error_handler(event: ErrorEvent):
+        logger.error(f"Error: {event.exception}")
         return True
     
+    loop_monitor.register_handlers(dp)
+    return dp
+
+
+# Блокировки задач, которые выполняет один процесс в кластере
+leader_locks: List[LeaderLock] = []
+
+
+async def start_services(bot: Bot, background: bool = True):
+    """Подключение к БД и запуск сервисов.
+
+    background=False — процесс не претендует на задачи, которым достаточно
+    одного экземпляра на кластер (загрузка справочника символов, сбор истории
+    котировок, ротация истории, очистка общего кэша). Среди претендентов их получает один — владелец
+    advisory-блокировки.
+    """
+    if settings.metrics_port:
+        # У каждого воркера runner свой порт: metrics_port + номер шарда
+        await metrics_server.start(settings.metrics_host, settings.metrics_port + settings.shard_index)
+    
+    # kill -USR1 <pid> — профилирование работающего процесса
+    profiler.install_signal_handler()
+    if settings.loop_monitor_interval:
+        await loop_monitor.start()
+    
+    logger.info("Connecting to database...")
+    await db.connect()
+    await interaction_logger.start()
+    
+    if settings.shared_cache == "postgres":
+        finance_api.enable_shared_cache(shared_cache)
+    # Справочник символов читается из снимка; загружает его из API владелец background
+    await symbol_catalog.start()
+    
+    # Рассылки и алерты шарда, а также задачи уровня кластера выполняет один
+    # процесс из всех реплик; остальные подхватят их, если владелец упадет
+    async def start_subscriptions():
+        await subscription_service.start_subscription_service(bot)
+    
+    leader_locks.append(LeaderLock(
+        f"subscriptions:{settings.shard_index}/{settings.shard_count}",
+        start_subscriptions, subscription_service.stop_subscription_service
+    ))
+    if background:
+        leader_locks.append(LeaderLock("background", start_background_jobs, stop_background_jobs))
+    for lock in leader_locks:
+        await lock.start()
+
+
+async def start_background_jobs():
+    """Задачи уровня кластера: справочник символов, история котировок, ротация истории,
+    очистка общего кэша"""
+    await shared_cache.start_purge()
+    await symbol_catalog.start_refresh()
+    await price_ingestion.start()
+    await retention_service.start()
+
+
+async def stop_background_jobs():
+    await symbol_catalog.stop_refresh()
+    await price_ingestion.stop()
+    await retention_service.stop()
+    await shared_cache.stop_purge()
+
+
+async def stop_services(bot: Bot, dp: Dispatcher):
+    profiler.remove_signal_handler()
+    for lock in leader_locks:
+        await lock.stop()
+    leader_locks.clear()
+    await symbol_catalog.stop()
+    await interaction_logger.stop()
+    await dp.storage.close()
+    await db.close()
+    await finance_api.close_sessions()
+    await loop_monitor.stop()
+    await metrics_server.stop()
+    await bot.session.close()
+
+
+async def main():
+    # Создаем бота
+    bot = Bot(token=settings.bot_token)
+    dp = create_dispatcher()
+    await start_services(bot)
+    
     # Запускаем бота
     logger.info("Starting bot...")
     try:
-        await dp.start_polling(bot)
+        if settings.bot_mode == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Bot stopped")
     finally:
-        await subscription_service.stop_subscription_service()
-        await db.close()
-        await finance_api.close_sessions()
-        await bot.session.close()
+        await stop_services(bot, dp)
 
 
 if __name__ == "__main__":
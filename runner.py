@@ -0,0 +1,254 @@
+"""
+Многопроцессный запуск бота.
+
+Процесс-диспетчер принимает обновления (long polling или webhook) и, не
+разбирая их, передает воркеру по хэшу user_id. Каждый воркер — отдельный
+экземпляр бота со своим циклом событий: он обслуживает только пользователей
+своего шарда, держит их FSM-состояния и индекс алертов, рассылает им
+подписки. Ответы провайдеров воркеры делят через общий кэш
+(SHARED_CACHE=postgres), а лимиты провайдеров и Telegram — поровну.
+
+    python runner.py
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+from multiprocessing.process import BaseProcess
+from typing import Any, Dict, List, Optional
+import aiohttp
+from aiogram import Bot
+
+from config import settings
+from services.webhook_server import WebhookServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+
+
+def update_user_id(update: Any) -> int:
+    """Пользователь, от которого пришло обновление (0, если его нет или обновление некорректно)"""
+    if not isinstance(update, dict):
+        return 0
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        message = value.get("message")
+        for owner in (value.get("from"), value.get("user"), value.get("chat"),
+                      message.get("chat") if isinstance(message, dict) else None):
+            if isinstance(owner, dict) and isinstance(owner.get("id"), int):
+                return owner["id"]
+    return 0
+
+
+def shard_of(user_id: int, shard_count: int) -> int:
+    """Номер шарда пользователя; совпадает с mod(abs(user_id), n) в запросах к БД"""
+    return abs(user_id) % shard_count
+
+
+def _configure_shard(index: int, count: int):
+    settings.shard_index = index
+    settings.shard_count = count
+    # Глобальный лимит Telegram делится между воркерами
+    settings.telegram_global_rate = settings.telegram_global_rate / count
+
+
+def worker_main(index: int, count: int, updates: multiprocessing.Queue):
+    """Точка входа процесса-воркера"""
+    # Останавливает воркер диспетчер, а не Ctrl+C, пришедший всей группе процессов
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s", force=True)
+    _configure_shard(index, count)
+    asyncio.run(_run_worker(index, count, updates))
+
+
+async def _run_worker(index: int, count: int, updates: multiprocessing.Queue):
+    # Импорт после настройки шарда: сервисы читают settings при создании
+    from aiogram.types import Update
+    from main import create_dispatcher, start_services, stop_services
+    from services.finance_api import finance_api
+
+    finance_api.scale_rate_limits(1 / count)
+    bot = Bot(token=settings.bot_token)
+    dp = create_dispatcher()
+    # На фоновые задачи уровня кластера (история котировок, ротация, общий кэш) претендует только нулевой воркер
+    await start_services(bot, background=index == 0)
+
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    semaphore = asyncio.Semaphore(settings.runner_worker_concurrency)
+    tasks = set()
+
+    async def process_update(data: dict):
+        try:
+            update = Update.model_validate(data, context={"bot": bot})
+            await dp.feed_update(bot, update)
+        except Exception:
+            update_id = data.get("update_id") if isinstance(data, dict) else None
+            logger.exception(f"Error processing update {update_id}")
+        finally:
+            semaphore.release()
+
+    try:
+        while True:
+            try:
+                data = await loop.run_in_executor(None, updates.get, True, 1.0)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+            if data is None:
+                break
+
+            await semaphore.acquire()
+            task = asyncio.create_task(process_update(data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await stop_services(bot, dp)
+
+
+class ShardRouter:
+    """Воркеры и очереди обновлений к ним"""
+
+    def __init__(self, count: int, queue_size: int):
+        self.count = count
+        self.context = multiprocessing.get_context("spawn")
+        self.queues = [self.context.Queue(maxsize=queue_size) for _ in range(count)]
+        self.processes: List[Optional[BaseProcess]] = [None] * count
+        self.routed = [0] * count
+        self.restarts = 0
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+        logger.info(f"Started {self.count} workers")
+
+    def _spawn(self, index: int):
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.count, self.queues[index]),
+            name=f"bot-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+
+    def all_alive(self) -> bool:
+        return all(process is not None and process.is_alive() for process in self.processes)
+
+    def check_workers(self):
+        """Перезапуск упавших воркеров; обновления в их очередях сохраняются"""
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.warning(f"Worker {index} exited with code {process.exitcode}, restarting")
+                self.restarts += 1
+                self._spawn(index)
+
+    async def route(self, data: Dict[str, Any]):
+        if not isinstance(data, dict):
+            logger.warning(f"Dropping malformed update: {type(data).__name__}")
+            return
+        index = shard_of(update_user_id(data), self.count)
+        updates = self.queues[index]
+        try:
+            updates.put_nowait(data)
+        except queue.Full:
+            # Воркер не успевает: ждем места, не блокируя цикл событий
+            await asyncio.get_running_loop().run_in_executor(None, updates.put, data)
+        self.routed[index] += 1
+
+    def stop(self, timeout: float = 30):
+        """Остановка воркеров после обработки уже переданных обновлений"""
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+async def poll_updates(router: ShardRouter):
+    """Long polling без разбора обновлений: JSON уходит воркерам как есть"""
+    url = f"{TELEGRAM_API_URL}/bot{settings.bot_token}/getUpdates"
+    params: Dict[str, Any] = {"timeout": 30}
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as session:
+        while True:
+            try:
+                async with session.post(url, json=params) as response:
+                    payload = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Polling error: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if not payload.get("ok"):
+                logger.error(f"getUpdates failed: {payload.get('description')}")
+                await asyncio.sleep(payload.get("parameters", {}).get("retry_after", 1))
+                continue
+
+            for data in payload["result"]:
+                params["offset"] = data["update_id"] + 1
+                await router.route(data)
+
+
+async def run(count: int):
+    router = ShardRouter(count, settings.runner_queue_size)
+    router.start()
+
+    server: Optional[WebhookServer] = None
+    intake: Optional[asyncio.Task] = None
+    if settings.bot_mode == "webhook":
+        server = WebhookServer(
+            router.route,
+            path=settings.webhook_path,
+            secret_token=settings.webhook_secret,
+            workers=settings.webhook_workers,
+            queue_size=settings.webhook_queue_size,
+            readiness=router.all_alive
+        )
+        await server.start(settings.webhook_host, settings.webhook_port)
+        if settings.webhook_base_url:
+            bot = Bot(token=settings.bot_token)
+            try:
+                await bot.set_webhook(
+                    url=f"{settings.webhook_base_url.rstrip('/')}{settings.webhook_path}",
+                    secret_token=settings.webhook_secret
+                )
+            finally:
+                await bot.session.close()
+    else:
+        intake = asyncio.create_task(poll_updates(router))
+
+    # Работаем до SIGTERM/SIGINT, присматривая за воркерами
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    try:
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                router.check_workers()
+    finally:
+        if intake:
+            intake.cancel()
+            await asyncio.gather(intake, return_exceptions=True)
+        if server:
+            await server.stop()
+        await loop.run_in_executor(None, router.stop)
+        logger.info(f"Runner stopped, routed per worker: {router.routed}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(settings.runner_workers or os.cpu_count() or 1))
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Локальная замена CoinGecko и Alpha Vantage для замеров без реальных API
+
+Сервер отвечает на те же запросы, что делает FinanceAPIService: /simple/price,
+/coins/{id}, /coins/list, /coins/markets, /search/trending, /search, /global
+(под префиксом /api/v3) и /query с function=GLOBAL_QUOTE или LISTING_STATUS.
+Ответы синтетические, в формате провайдеров, либо берутся из сохраненных
+фикстур. Задержка, ошибки 5xx, ответы 429 и лимит запросов в минуту задаются
+параметрами; GET /stats возвращает число запросов по эндпоинтам и статусам.
+
+Боту достаточно сменить адреса провайдеров:
+    COINGECKO_API_URL=http://localhost:8090/api/v3
+    ALPHA_VANTAGE_API_URL=http://localhost:8090/query
+
+Примеры:
+    python -m scripts.fake_providers --latency 150 --error-rate 0.01 --throttle-rate 0.02
+    python -m scripts.fake_providers --limit-per-minute 30
+    python -m scripts.fake_providers --record --fixtures fixtures/providers
+    python -m scripts.fake_providers --fixtures fixtures/providers --strict
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import aiohttp
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_PREFIX = "/api/v3"
+ALPHA_VANTAGE_PATH = "/query"
+COINGECKO_UPSTREAM = "https://api.coingecko.com/api/v3"
+ALPHA_VANTAGE_UPSTREAM = "https://www.alphavantage.co/query"
+
+# Заглушка не импортирует модули бота: ей не нужны токен и остальные настройки
+KNOWN_COINS = [
+    'bitcoin', 'ethereum', 'binancecoin', 'solana', 'cardano', 'ripple', 'dogecoin', 'polkadot',
+    'tron', 'chainlink', 'litecoin', 'avalanche-2', 'stellar', 'monero', 'uniswap', 'cosmos', 'near', 'aptos', 'arbitrum', 'optimism'
+]
+KNOWN_STOCKS = ['AAPL', 'GOOGL', 'TSLA', 'MSFT', 'AMZN', 'NVDA', 'META', 'NFLX', 'AMD', 'INTC', 'ORCL', 'IBM']
+
+# Валюты в market_data ответа /coins/{id}: у CoinGecko их около шестидесяти
+MARKET_CURRENCIES = [
+    'usd', 'eur', 'gbp', 'jpy', 'cny', 'rub', 'inr', 'brl', 'cad', 'aud', 'chf', 'krw', 'try', 'uah',
+    'pln', 'sek', 'nok', 'dkk', 'czk', 'huf', 'ils', 'mxn', 'nzd', 'sgd', 'hkd', 'twd', 'thb', 'idr',
+    'myr', 'php', 'vnd', 'zar', 'sar', 'aed', 'kwd', 'bhd', 'clp', 'ars', 'ngn', 'pkr', 'bdt', 'lkr',
+    'mmk', 'gel', 'vef', 'bmd', 'xag', 'xau', 'xdr', 'btc', 'eth', 'ltc', 'bch', 'bnb', 'eos', 'xrp',
+    'xlm', 'link', 'dot', 'yfi', 'bits', 'sats'
+]
+
+
+def _fraction(key: str) -> float:
+    """Детерминированное число из [0, 1) для ключа"""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:4], "big") / 2 ** 32
+
+
+class Universe:
+    """Набор монет и тикеров, о которых знает заглушка, и их «котировки»"""
+
+    def __init__(self, coins: int, stocks: int):
+        self.coins = KNOWN_COINS + [f"coin-{i:05d}" for i in range(max(0, coins - len(KNOWN_COINS)))]
+        self.stocks = KNOWN_STOCKS + [f"T{i:04d}" for i in range(max(0, stocks - len(KNOWN_STOCKS)))]
+        self.coin_ranks = {coin_id: rank for rank, coin_id in enumerate(self.coins, 1)}
+        self.stock_set = set(self.stocks)
+
+    @staticmethod
+    def price(key: str) -> float:
+        # Базовая цена от 10 до 100000 и медленное колебание, чтобы алерты и рассылки срабатывали
+        base = 10 ** (1 + 4 * _fraction(key))
+        return round(base * (1 + 0.02 * math.sin(time.time() / 60 + 2 * math.pi * _fraction(key + ":phase"))), 6)
+
+    @staticmethod
+    def change(key: str) -> float:
+        return round(20 * _fraction(key + ":change") - 10, 4)
+
+    @staticmethod
+    def name(coin_id: str) -> str:
+        return coin_id.replace("-", " ").title()
+
+    @staticmethod
+    def symbol(coin_id: str) -> str:
+        return coin_id.replace("-", "")[:4]
+
+    def rank(self, coin_id: str) -> int:
+        return self.coin_ranks.get(coin_id, 0)
+
+
+class ProviderStub:
+    """HTTP-заглушка провайдеров с инъекцией задержек и ошибок, записью и воспроизведением"""
+
+    def __init__(self, universe: Universe, latency: float = 0.0, jitter: float = 0.5,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 limit_per_minute: Optional[float] = None, fixtures: Optional[str] = None,
+                 strict: bool = False, record: bool = False,
+                 coingecko_upstream: str = COINGECKO_UPSTREAM,
+                 alpha_vantage_upstream: str = ALPHA_VANTAGE_UPSTREAM):
+        self.universe = universe
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.limit_per_minute = limit_per_minute
+        self.fixtures = fixtures
+        self.strict = strict
+        self.record = record
+        self.upstreams = {"coingecko": coingecko_upstream.rstrip("/"), "alpha_vantage": alpha_vantage_upstream}
+        self._recent: Dict[str, Deque[float]] = {"coingecko": deque(), "alpha_vantage": deque()}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.replayed = 0
+        self.recorded = 0
+        self.bytes_sent = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        cg = COINGECKO_PREFIX
+        # Фиксированные пути /coins/* регистрируются раньше /coins/{id}
+        app.router.add_get(f"{cg}/simple/price", self._route("simple/price", self.simple_price))
+        app.router.add_get(f"{cg}/coins/list", self._route("coins/list", self.coins_list))
+        app.router.add_get(f"{cg}/coins/markets", self._route("coins/markets", self.coins_markets))
+        app.router.add_get(f"{cg}/coins/{{coin_id}}", self._route("coins/{id}", self.coin))
+        app.router.add_get(f"{cg}/search/trending", self._route("search/trending", self.trending))
+        app.router.add_get(f"{cg}/search", self._route("search", self.search))
+        app.router.add_get(f"{cg}/global", self._route("global", self.global_data))
+        app.router.add_get(ALPHA_VANTAGE_PATH, self._route("query", self.alpha_vantage))
+        app.router.add_get("/stats", self._handle_stats)
+        return app
+
+    async def start(self, host: str, port: int):
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Fake providers listening on http://{host}:{port} "
+                    f"(CoinGecko {COINGECKO_PREFIX}, Alpha Vantage {ALPHA_VANTAGE_PATH})")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "statuses": {f"{endpoint} {status}": count for (endpoint, status), count in self.statuses.items()},
+            "replayed": self.replayed,
+            "recorded": self.recorded,
+            "bytes_sent": self.bytes_sent,
+        }
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def _route(self, endpoint: str, build):
+        async def handle(request: web.Request) -> web.Response:
+            if endpoint == "query":
+                endpoint_name = request.query.get("function", "query")
+                provider = "alpha_vantage"
+            else:
+                endpoint_name = endpoint
+                provider = "coingecko"
+            self.requests[endpoint_name] += 1
+
+            response = await self._respond(request, provider, endpoint_name, build)
+            self.statuses[(endpoint_name, response.status)] += 1
+            self.bytes_sent += len(response.body or b"")
+            return response
+        return handle
+
+    async def _respond(self, request: web.Request, provider: str, endpoint: str, build) -> web.Response:
+        if self.record:
+            return await self._proxy(request, provider, endpoint)
+
+        if self.latency:
+            await asyncio.sleep(self.latency * (1 + self.jitter * (2 * random.random() - 1)))
+
+        if self._over_limit(provider) or random.random() < self.throttle_rate:
+            return self._throttled(provider)
+        if random.random() < self.error_rate:
+            return web.json_response({"error": "injected failure"}, status=random.choice((500, 502, 503)))
+
+        fixture = self._load_fixture(endpoint, request)
+        if fixture is not None:
+            self.replayed += 1
+            return web.Response(status=fixture["status"], text=fixture["body"], content_type=fixture["content_type"])
+        if self.strict:
+            return web.json_response({"error": "no fixture for request"}, status=404)
+
+        status, body = build(request)
+        if isinstance(body, str):
+            return web.Response(status=status, text=body, content_type="text/csv")
+        return web.json_response(body, status=status)
+
+    def _over_limit(self, provider: str) -> bool:
+        """Скользящее окно в минуту, как у бесплатного тарифа провайдеров"""
+        if not self.limit_per_minute:
+            return False
+        now = time.monotonic()
+        recent = self._recent[provider]
+        while recent and now - recent[0] >= 60:
+            recent.popleft()
+        if len(recent) >= self.limit_per_minute:
+            return True
+        recent.append(now)
+        return False
+
+    @staticmethod
+    def _throttled(provider: str) -> web.Response:
+        if provider == "alpha_vantage":
+            # Alpha Vantage сообщает о лимите телом с кодом 200
+            return web.json_response({
+                "Information": "Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day."
+            })
+        return web.json_response(
+            {"status": {"error_code": 429, "error_message": "You've exceeded the Rate Limit."}},
+            status=429, headers={"Retry-After": "60"}
+        )
+
+    # Фикстуры: один JSON-файл на запрос (эндпоинт и параметры без ключа API)
+
+    def _fixture_path(self, endpoint: str, request: web.Request) -> str:
+        params = sorted((key, value) for key, value in request.query.items() if key != "apikey")
+        key = json.dumps([request.path, params])
+        name = endpoint.replace("/", "_").replace("{", "").replace("}", "")
+        return os.path.join(self.fixtures, f"{name}-{hashlib.sha1(key.encode()).hexdigest()[:16]}.json")
+
+    def _load_fixture(self, endpoint: str, request: web.Request) -> Optional[Dict[str, Any]]:
+        if not self.fixtures:
+            return None
+        try:
+            with open(self._fixture_path(endpoint, request)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_fixture(self, endpoint: str, request: web.Request, status: int, body: str, content_type: str):
+        os.makedirs(self.fixtures, exist_ok=True)
+        fixture = {
+            "request": {"path": request.path, "params": {k: v for k, v in request.query.items() if k != "apikey"}},
+            "status": status,
+            "content_type": content_type,
+            "body": body,
+        }
+        with open(self._fixture_path(endpoint, request), "w") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        self.recorded += 1
+
+    async def _proxy(self, request: web.Request, provider: str, endpoint: str) -> web.Response:
+        """Запрос к настоящему провайдеру с сохранением ответа в фикстуры"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        if provider == "coingecko":
+            url = self.upstreams["coingecko"] + request.path[len(COINGECKO_PREFIX):]
+        else:
+            url = self.upstreams["alpha_vantage"]
+
+        async with self._session.get(url, params=request.query) as upstream:
+            body = await upstream.text()
+            content_type = upstream.content_type or "application/json"
+            status = upstream.status
+
+        if status == 200 and self.fixtures:
+            self._save_fixture(endpoint, request, status, body, content_type)
+        return web.Response(status=status, text=body, content_type=content_type)
+
+    # Синтетические ответы в формате провайдеров
+
+    def simple_price(self, request: web.Request) -> Tuple[int, Any]:
+        ids = [coin_id for coin_id in request.query.get("ids", "").split(",") if coin_id]
+        currencies = [c for c in request.query.get("vs_currencies", "usd").split(",") if c]
+        with_change = request.query.get("include_24hr_change") == "true"
+        with_cap = request.query.get("include_market_cap") == "true"
+
+        result = {}
+        for coin_id in ids:
+            if coin_id not in self.universe.coin_ranks:
+                continue
+            quote = {}
+            for currency in currencies:
+                price = self.universe.price(f"{coin_id}:{currency}")
+                quote[currency] = price
+                if with_cap:
+                    quote[f"{currency}_market_cap"] = price * 1e7
+                if with_change:
+                    quote[f"{currency}_24h_change"] = self.universe.change(coin_id)
+            result[coin_id] = quote
+        return 200, result
+
+    def coin(self, request: web.Request) -> Tuple[int, Any]:
+        coin_id = request.match_info["coin_id"]
+        if coin_id not in self.universe.coin_ranks:
+            return 404, {"error": "coin not found"}
+        price = self.universe.price(f"{coin_id}:usd")
+        change = self.universe.change(coin_id)
+
+        def per_currency(scale: float) -> Dict[str, float]:
+            return {currency: self.universe.price(f"{coin_id}:{currency}") * scale for currency in MARKET_CURRENCIES}
+
+        return 200, {
+            "id": coin_id,
+            "symbol": self.universe.symbol(coin_id),
+            "name": self.universe.name(coin_id),
+            "categories": ["Cryptocurrency", "Layer 1 (L1)", "Smart Contract Platform"],
+            "description": {"en": f"{self.universe.name(coin_id)} is a synthetic coin. " * 40},
+            "links": {
+                "homepage": [f"https://{coin_id}.example.org"],
+                "blockchain_site": [f"https://explorer{i}.example.org/{coin_id}" for i in range(10)],
+            },
+            "market_cap_rank": self.universe.rank(coin_id),
+            "market_data": {
+                "current_price": per_currency(1),
+                "market_cap": per_currency(1e7),
+                "total_volume": per_currency(1e5),
+                "high_24h": per_currency(1.05),
+                "low_24h": per_currency(0.95),
+                "price_change_24h": price * change / 100,
+                "price_change_percentage_24h": change,
+            },
+        }
+
+    def coins_list(self, request: web.Request) -> Tuple[int, Any]:
+        return 200, [
+            {"id": coin_id, "symbol": self.universe.symbol(coin_id), "name": self.universe.name(coin_id)}
+            for coin_id in self.universe.coins
+        ]
+
+    def coins_markets(self, request: web.Request) -> Tuple[int, Any]:
+        per_page = int(request.query.get("per_page", 100))
+        page = int(request.query.get("page", 1))
+        start = (page - 1) * per_page
+        return 200, [
+            {
+                "id": coin_id,
+                "symbol": self.universe.symbol(coin_id),
+                "name": self.universe.name(coin_id),
+                "current_price": self.universe.price(f"{coin_id}:usd"),
+                "market_cap_rank": start + offset + 1,
+            }
+            for offset, coin_id in enumerate(self.universe.coins[start:start + per_page])
+        ]
+
+    def trending(self, request: web.Request) -> Tuple[int, Any]:
+        return 200, {"coins": [
+            {"item": {
+                "id": coin_id,
+                "name": self.universe.name(coin_id),
+                "symbol": self.universe.symbol(coin_id),
+                "market_cap_rank": self.universe.rank(coin_id),
+                "price_btc": self.universe.price(f"{coin_id}:btc"),
+            }}
+            for coin_id in self.universe.coins[:15]
+        ]}
+
+    def search(self, request: web.Request) -> Tuple[int, Any]:
+        query = request.query.get("query", "").lower()
+        coins = [coin_id for coin_id in self.universe.coins if query and query in coin_id][:25]
+        return 200, {"coins": [
+            {
+                "id": coin_id,
+                "name": self.universe.name(coin_id),
+                "symbol": self.universe.symbol(coin_id),
+                "market_cap_rank": self.universe.rank(coin_id),
+            }
+            for coin_id in coins
+        ]}
+
+    def global_data(self, request: web.Request) -> Tuple[int, Any]:
+        return 200, {"data": {
+            "active_cryptocurrencies": len(self.universe.coins),
+            "total_market_cap": {currency: 2.5e12 for currency in MARKET_CURRENCIES},
+            "total_volume": {currency: 9.1e10 for currency in MARKET_CURRENCIES},
+            "market_cap_percentage": {"btc": 52.1, "eth": 16.8, "usdt": 4.2, "bnb": 3.5, "sol": 2.9},
+            "market_cap_change_percentage_24h_usd": self.universe.change("global"),
+        }}
+
+    def alpha_vantage(self, request: web.Request) -> Tuple[int, Any]:
+        function = request.query.get("function")
+        if function == "GLOBAL_QUOTE":
+            symbol = request.query.get("symbol", "").upper()
+            if symbol not in self.universe.stock_set:
+                return 200, {"Global Quote": {}}
+            price = self.universe.price(symbol)
+            change = self.universe.change(symbol)
+            return 200, {"Global Quote": {
+                "01. symbol": symbol,
+                "02. open": f"{price * 0.99:.4f}",
+                "03. high": f"{price * 1.02:.4f}",
+                "04. low": f"{price * 0.98:.4f}",
+                "05. price": f"{price:.4f}",
+                "06. volume": str(int(1e6 * (1 + _fraction(symbol)))),
+                "07. latest trading day": time.strftime("%Y-%m-%d"),
+                "08. previous close": f"{price - price * change / 100:.4f}",
+                "09. change": f"{price * change / 100:.4f}",
+                "10. change percent": f"{change:.4f}%",
+            }}
+        if function == "LISTING_STATUS":
+            rows = ["symbol,name,exchange,assetType,ipoDate,delistingDate,status"]
+            rows.extend(f"{symbol},{symbol} Inc,NYSE,Stock,2000-01-01,null,Active" for symbol in self.universe.stocks)
+            return 200, "\r\n".join(rows) + "\r\n"
+        return 200, {"Error Message": f"Invalid API call: unknown function {function}"}
+
+
+async def main(args):
+    stub = ProviderStub(
+        Universe(args.coins, args.stocks),
+        latency=args.latency / 1000,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        limit_per_minute=args.limit_per_minute,
+        fixtures=args.fixtures,
+        strict=args.strict,
+        record=args.record,
+        coingecko_upstream=args.coingecko_upstream,
+        alpha_vantage_upstream=args.alpha_vantage_upstream,
+    )
+    await stub.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+        logger.info(f"Fake providers stats: {stub.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0, help="средняя задержка ответа, мс")
+    parser.add_argument("--jitter", type=float, default=0.5, help="разброс задержки, доля от средней")
+    parser.add_argument("--error-rate", type=float, default=0, help="доля ответов 5xx")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="доля ответов о превышении лимита")
+    parser.add_argument("--limit-per-minute", type=float, default=None, help="лимит запросов в минуту на провайдера")
+    parser.add_argument("--coins", type=int, default=500, help="число монет в синтетическом справочнике")
+    parser.add_argument("--stocks", type=int, default=100, help="число тикеров в синтетическом справочнике")
+    parser.add_argument("--fixtures", default=None, help="каталог фикстур для воспроизведения или записи")
+    parser.add_argument("--strict", action="store_true", help="404 на запросы без фикстуры вместо синтетики")
+    parser.add_argument("--record", action="store_true", help="проксировать к настоящим API и сохранять фикстуры")
+    parser.add_argument("--coingecko-upstream", default=COINGECKO_UPSTREAM)
+    parser.add_argument("--alpha-vantage-upstream", default=ALPHA_VANTAGE_UPSTREAM)
+    args = parser.parse_args()
+    if args.record and not args.fixtures:
+        parser.error("--record requires --fixtures")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
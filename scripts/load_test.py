@@ -0,0 +1,601 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест обработчиков без Telegram, провайдеров котировок и БД
+
+N виртуальных пользователей проходят типовые сценарии (меню, карточки монет
+и акций, текстовые запросы, история, подписки, создание алерта через FSM),
+суммарно отправляя в Dispatcher около --rate обновлений в секунду. Bot API
+заменен сессией-заглушкой, провайдеры — генератором ответов с задержкой,
+БД — хранилищем в памяти. Кэши, single-flight, справочник активов, буфер
+истории и форматирование ответов работают так же, как в боте.
+
+В конце печатаются пропускная способность и p50/p95/p99 по каждому обработчику.
+
+Пример:
+    python -m scripts.load_test --users 200 --rate 500 --duration 30
+    python -m scripts.load_test --duration 60 --json result.json --fail-p95 50
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import aiohttp
+
+# Настройки читаются при импорте модулей бота, поэтому токен нужен до них
+LOAD_TEST_TOKEN = "123456:LOAD-TEST"
+os.environ.setdefault("BOT_TOKEN", LOAD_TEST_TOKEN)
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import EditMessageText, SendMessage, TelegramMethod
+from aiogram.types import Chat, InlineKeyboardMarkup, Message, TelegramObject, Update
+
+from config import settings
+from database.connection import db
+from main import create_dispatcher
+from services.finance_api import POPULAR_CRYPTO_IDS, POPULAR_STOCK_SYMBOLS, finance_api
+from services.interaction_logger import interaction_logger
+from services.symbol_catalog import SymbolEntry, symbol_catalog
+
+
+FAKE_COINS = POPULAR_CRYPTO_IDS + [
+    'ripple', 'dogecoin', 'polkadot', 'tron', 'chainlink', 'litecoin', 'avalanche-2',
+    'stellar', 'monero', 'uniswap', 'cosmos', 'near', 'aptos', 'arbitrum', 'optimism'
+]
+FAKE_STOCKS = POPULAR_STOCK_SYMBOLS + ['NVDA', 'META', 'NFLX', 'AMD', 'INTC', 'ORCL', 'IBM']
+
+# Тексты, которые пользователи пишут боту: точные совпадения, символы, промахи
+QUERY_TEXTS = ['bitcoin', 'btc', 'ethereum', 'eth', 'solana', 'doge', 'aapl', 'tsla', 'nvda',
+               'bit', 'unknowncoin', 'x']
+
+Step = Tuple[str, str]  # ('text' | 'callback' | 'button', значение)
+
+# Сценарии: (вес, шаги). 'button' нажимает кнопку последней клавиатуры с данным префиксом
+SCENARIOS: List[Tuple[int, List[Step]]] = [
+    (10, [('text', '/start'), ('callback', 'menu_crypto'), ('button', 'crypto_')]),
+    (6, [('callback', 'menu_stocks'), ('button', 'stock_')]),
+    (4, [('callback', 'menu_market')]),
+    (4, [('callback', 'menu_trending')]),
+    (20, [('text', '{query}')]),
+    (4, [('callback', 'menu_crypto'), ('callback', 'crypto_search'), ('text', '{coin}')]),
+    (5, [('callback', 'menu_history'), ('button', 'hist_o_'), ('button', 'hist_n_')]),
+    (3, [('callback', 'menu_subscriptions'), ('button', 'sub_')]),
+    (4, [('callback', 'menu_alerts'), ('callback', 'alert_add'), ('text', '{coin}'),
+         ('text', '{price}'), ('button', 'alert_')]),
+    (3, [('callback', 'menu_alerts'), ('callback', 'alert_list')]),
+    (1, [('callback', 'menu_alerts'), ('callback', 'alert_remove'), ('button', 'delete_alert_')]),
+    (2, [('callback', 'menu_help'), ('callback', 'menu_main')]),
+]
+
+
+def _stable_fraction(key: str) -> float:
+    """Детерминированное число из [0, 1) для ключа: одинаковые котировки между запусками"""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:4], "big") / 2 ** 32
+
+
+class FakeProviders:
+    """Ответы CoinGecko и Alpha Vantage в уже разобранном виде, с задержкой сети"""
+
+    def __init__(self, latency: float, throttle: bool):
+        self.latency = latency
+        self.throttle = throttle
+        self.calls: Counter = Counter()
+
+    def install(self, service):
+        """Подмена загрузчиков сервиса; кэши и публичные методы остаются настоящими"""
+        self.service = service
+        service._fetch_crypto_prices = self._wrap("simple/price", "coingecko", self.crypto_prices)
+        service._fetch_crypto_info = self._wrap("coins", "coingecko", self.crypto_info)
+        service._fetch_trending_cryptos = self._wrap("search/trending", "coingecko", self.trending)
+        service._fetch_search_crypto = self._wrap("search", "coingecko", self.search)
+        service._fetch_market_summary = self._wrap("global", "coingecko", self.market_summary)
+        service._fetch_stock_price = self._wrap("GLOBAL_QUOTE", "alpha_vantage", self.stock_price)
+
+    def _wrap(self, endpoint: str, provider: str, build: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+        async def fetch(*args):
+            self.calls[endpoint] += 1
+            if self.throttle:
+                await self.service._throttle(provider)
+            if self.latency:
+                await asyncio.sleep(self.latency * (0.5 + random.random()))
+            return build(*args)
+        return fetch
+
+    def catalog_entries(self) -> List[SymbolEntry]:
+        entries = [
+            SymbolEntry(kind="crypto", id=coin, symbol=coin[:3], name=coin.replace("-", " ").title(), rank=rank)
+            for rank, coin in enumerate(FAKE_COINS, 1)
+        ]
+        entries.extend(
+            SymbolEntry(kind="stock", id=symbol, symbol=symbol.lower(), name=symbol) for symbol in FAKE_STOCKS
+        )
+        return entries
+
+    @staticmethod
+    def _price(key: str) -> float:
+        return round(10 ** (1 + 4 * _stable_fraction(key)), 2)
+
+    @staticmethod
+    def _change(key: str) -> float:
+        return round(20 * _stable_fraction(key + ":change") - 10, 2)
+
+    def crypto_prices(self, coin_ids: List[str], currencies: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        return {
+            coin_id: {
+                currency: {
+                    "symbol": coin_id.upper(),
+                    "price": self._price(coin_id),
+                    "change_24h": self._change(coin_id),
+                    "market_cap": self._price(coin_id) * 1e7,
+                    "currency": currency.upper()
+                }
+                for currency in currencies
+            }
+            for coin_id in coin_ids
+            if coin_id in FAKE_COINS
+        }
+
+    def crypto_info(self, coin_id: str) -> Optional[Dict[str, Any]]:
+        if coin_id not in FAKE_COINS:
+            return None
+        price = self._price(coin_id)
+        change = self._change(coin_id)
+        return {
+            "id": coin_id,
+            "name": coin_id.replace("-", " ").title(),
+            "symbol": coin_id[:3].upper(),
+            "current_price": price,
+            "market_cap": price * 1e7,
+            "volume_24h": price * 1e5,
+            "price_change_24h": price * change / 100,
+            "price_change_percentage_24h": change,
+            "description": ("Synthetic coin for load testing. " * 20)[:500] + "..."
+        }
+
+    def trending(self) -> List[Dict[str, Any]]:
+        return [
+            {"id": coin, "name": coin.title(), "symbol": coin[:3].upper(),
+             "market_cap_rank": rank, "price_btc": self._price(coin) / 1e5}
+            for rank, coin in enumerate(FAKE_COINS[:10], 1)
+        ]
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        return [
+            {"id": coin, "name": coin.title(), "symbol": coin[:3].upper(), "market_cap_rank": rank}
+            for rank, coin in enumerate(FAKE_COINS, 1)
+            if query.lower() in coin
+        ][:5]
+
+    def market_summary(self) -> Dict[str, Any]:
+        return {
+            "total_market_cap": 2.5e12,
+            "total_volume": 9.1e10,
+            "market_cap_percentage": {"btc": 52.1, "eth": 16.8},
+            "active_cryptocurrencies": 12000,
+            "market_cap_change_24h": 1.2
+        }
+
+    def stock_price(self, symbol: str) -> Optional[Dict[str, Any]]:
+        if symbol not in FAKE_STOCKS:
+            return None
+        return {
+            "symbol": symbol,
+            "price": self._price(symbol),
+            "change": self._change(symbol),
+            "change_percent": f"{self._change(symbol)}%",
+            "volume": 1000000,
+            "market_cap": 0
+        }
+
+
+class MemoryDatabase:
+    """Методы Database, которые вызывают обработчики и буфер истории, поверх словарей"""
+
+    METHODS = (
+        "upsert_users", "save_interactions", "get_user_interactions", "add_price_alert",
+        "get_user_alerts", "delete_price_alert", "toggle_subscription", "get_user_subscriptions",
+    )
+
+    def __init__(self):
+        self.users: Dict[int, Optional[str]] = {}
+        self.interactions: Dict[int, List[SimpleNamespace]] = defaultdict(list)
+        self.alerts: Dict[int, SimpleNamespace] = {}
+        self.subscriptions: Dict[Tuple[int, str], SimpleNamespace] = {}
+        self._ids = itertools.count(1)
+        self.calls: Counter = Counter()
+
+    def install(self, database):
+        for name in self.METHODS:
+            setattr(database, name, self._counted(name, getattr(self, name)))
+
+    def _counted(self, name: str, method: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        async def call(*args, **kwargs):
+            self.calls[name] += 1
+            return await method(*args, **kwargs)
+        return call
+
+    async def upsert_users(self, users: List[Tuple[int, Optional[str], datetime]]) -> int:
+        for user_id, username, _ in users:
+            self.users[user_id] = username
+        return len(users)
+
+    async def save_interactions(self, records: List[tuple]) -> int:
+        for user_id, _, request_text, response_text, created_at in records:
+            self.interactions[user_id].append(SimpleNamespace(
+                id=next(self._ids), user_id=user_id, username=self.users.get(user_id),
+                request_text=request_text, response_text=response_text, created_at=created_at
+            ))
+        return len(records)
+
+    async def get_user_interactions(self, user_id: int, limit: int = 10,
+                                    before: Optional[Tuple[datetime, int]] = None,
+                                    after: Optional[Tuple[datetime, int]] = None) -> List[SimpleNamespace]:
+        rows = self.interactions.get(user_id, [])
+        if after is not None:
+            newer = [row for row in rows if (row.created_at, row.id) > after][:limit]
+            return newer[::-1]
+        older = [row for row in reversed(rows) if before is None or (row.created_at, row.id) < before]
+        return older[:limit]
+
+    async def add_price_alert(self, user_id: int, symbol: str,
+                              target_price: float, alert_type: str) -> SimpleNamespace:
+        alert = SimpleNamespace(
+            id=next(self._ids), user_id=user_id, symbol=symbol, target_price=target_price,
+            alert_type=alert_type, is_active=True, created_at=datetime.now()
+        )
+        self.alerts[alert.id] = alert
+        return alert
+
+    async def get_user_alerts(self, user_id: int) -> List[SimpleNamespace]:
+        return [alert for alert in self.alerts.values() if alert.user_id == user_id]
+
+    async def delete_price_alert(self, alert_id: int, user_id: int) -> bool:
+        alert = self.alerts.get(alert_id)
+        if alert is None or alert.user_id != user_id:
+            return False
+        del self.alerts[alert_id]
+        return True
+
+    async def toggle_subscription(self, user_id: int, subscription_type: str) -> SimpleNamespace:
+        key = (user_id, subscription_type)
+        subscription = self.subscriptions.get(key)
+        if subscription is None:
+            subscription = self.subscriptions[key] = SimpleNamespace(
+                id=next(self._ids), user_id=user_id, subscription_type=subscription_type,
+                is_active=True, created_at=datetime.now()
+            )
+        else:
+            subscription.is_active = not subscription.is_active
+        return subscription
+
+    async def get_user_subscriptions(self, user_id: int) -> List[SimpleNamespace]:
+        return [sub for (owner, _), sub in self.subscriptions.items() if owner == user_id]
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети.
+
+    Запрос сериализуется так же, как перед отправкой в Telegram, затем после
+    задержки возвращается правдоподобный результат. Последняя клавиатура каждого
+    чата запоминается, чтобы виртуальные пользователи могли нажимать ее кнопки.
+    """
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.keyboards: Dict[int, List[str]] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        files: Dict[str, Any] = {}
+        for value in method.model_dump(warnings=False).values():
+            self.prepare_value(value, bot=bot, files=files)
+        if self.latency:
+            await asyncio.sleep(self.latency * (0.5 + random.random()))
+
+        if isinstance(method, (SendMessage, EditMessageText)):
+            chat_id = int(method.chat_id or 0)
+            markup = method.reply_markup
+            if isinstance(markup, InlineKeyboardMarkup):
+                self.keyboards[chat_id] = [
+                    button.callback_data for row in markup.inline_keyboard for button in row if button.callback_data
+                ]
+            return Message(
+                message_id=method.message_id if isinstance(method, EditMessageText) else next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type="private"),
+                text=method.text
+            )
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+
+class LatencyStats:
+    """Длительности по именам обработчиков"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.unhandled = 0
+        self.started = time.perf_counter()
+
+    def reset(self):
+        self.samples.clear()
+        self.errors.clear()
+        self.unhandled = 0
+        self.started = time.perf_counter()
+
+    def record(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    @staticmethod
+    def percentile(ordered: List[float], q: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            result[name] = {
+                "count": len(ordered),
+                "errors": self.errors[name],
+                "p50_ms": self.percentile(ordered, 0.50) * 1000,
+                "p95_ms": self.percentile(ordered, 0.95) * 1000,
+                "p99_ms": self.percentile(ordered, 0.99) * 1000,
+                "max_ms": ordered[-1] * 1000,
+            }
+        return result
+
+
+class TimingMiddleware(BaseMiddleware):
+    """Время работы обработчика; регистрируется на диспетчере и действует во всех роутерах"""
+
+    def __init__(self, stats: LatencyStats):
+        self.stats = stats
+
+    async def __call__(self, handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.stats.errors[name] += 1
+            raise
+        finally:
+            self.stats.record(name, time.perf_counter() - started)
+
+
+class VirtualUser:
+    """Пользователь, который проходит сценарии по одному обновлению за раз"""
+
+    _update_ids = itertools.count(1)
+
+    def __init__(self, user_id: int, rng: random.Random, session: FakeSession):
+        self.user = {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"}
+        self.rng = rng
+        self.session = session
+        self.message_ids = itertools.count(1)
+
+    def _message(self, text: str, sender: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": self.user["id"], "type": "private"},
+            "from": sender,
+            "text": text,
+        }
+
+    def next_update(self, step: Step) -> Optional[Dict[str, Any]]:
+        """JSON обновления для шага сценария; None, если нажать нечего"""
+        kind, value = step
+        update: Dict[str, Any] = {"update_id": next(self._update_ids)}
+
+        if kind == "text":
+            text = value.format(
+                query=self.rng.choice(QUERY_TEXTS),
+                coin=self.rng.choice(FAKE_COINS[:10]),
+                price=f"{self.rng.uniform(1, 100000):.2f}"
+            )
+            update["message"] = self._message(text, self.user)
+            return update
+
+        if kind == "button":
+            buttons = [data for data in self.session.keyboards.get(self.user["id"], []) if data.startswith(value)]
+            if not buttons:
+                return None
+            value = self.rng.choice(buttons)
+
+        update["callback_query"] = {
+            "id": str(update["update_id"]),
+            "from": self.user,
+            "chat_instance": str(self.user["id"]),
+            "data": value,
+            "message": self._message("menu", {"id": 123456, "is_bot": True, "first_name": "Bot"}),
+        }
+        return update
+
+
+async def run_user(user: VirtualUser, bot: Bot, dp, stats: LatencyStats, interval: float, deadline: float):
+    weights = [weight for weight, _ in SCENARIOS]
+    # Старт вразнобой, чтобы пользователи не шли синхронной волной
+    await asyncio.sleep(user.rng.uniform(0, interval))
+
+    while time.monotonic() < deadline:
+        _, steps = user.rng.choices(SCENARIOS, weights)[0]
+        for step in steps:
+            data = user.next_update(step)
+            if data is None:
+                continue
+
+            started = time.perf_counter()
+            update = Update.model_validate(data, context={"bot": bot})
+            result = await dp.feed_update(bot, update)
+            elapsed = time.perf_counter() - started
+            stats.record("update", elapsed)
+            if result is UNHANDLED:
+                stats.unhandled += 1
+
+            # Интервалы между обновлениями распределены экспоненциально: суммарный поток близок
+            # к пуассоновскому. Время обработки входит в интервал, пока обработчики успевают
+            pause = user.rng.expovariate(1 / interval) - elapsed
+            remaining = deadline - time.monotonic()
+            if pause >= remaining:
+                await asyncio.sleep(max(0.0, remaining))
+                return
+            await asyncio.sleep(max(0.0, pause))
+
+
+async def fetch_stub_requests(url: str) -> Dict[str, int]:
+    """Число запросов по эндпоинтам со счетчиков scripts.fake_providers"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url.rstrip('/')}/stats") as response:
+            return (await response.json())["requests"]
+
+
+def print_report(summary: Dict[str, Dict[str, float]], elapsed: float, args, extra: Dict[str, Any]):
+    total = summary.get("update", {}).get("count", 0)
+    print(f"\n{total} updates in {elapsed:.1f}s: {total / elapsed:.1f}/s (target {args.rate:.0f}/s), "
+          f"{args.users} users, unhandled {extra['unhandled']}")
+    print(f"{'handler':<32}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in summary.items():
+        print(f"{name:<32}{row['count']:>8}{row['errors']:>8}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+    for title in ("bot_api_calls", "provider_calls", "db_calls"):
+        print(f"{title}: {dict(extra[title])}")
+    print(f"interaction_logger: written {extra['interaction_logger']['written']}, "
+          f"dropped {extra['interaction_logger']['dropped']}")
+
+
+async def main(args) -> int:
+    # Строка лога на каждое обновление исказила бы замер
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    settings.fsm_storage = "memory"
+    settings.shared_cache = "none"
+    if not settings.alpha_vantage_api_key:
+        # Без ключа get_stock_price не обращается к провайдеру
+        settings.alpha_vantage_api_key = "load-test"
+
+    providers = FakeProviders(args.provider_latency / 1000, args.rate_limits)
+    if args.providers_url:
+        # Настоящий HTTP-клиент сервиса против scripts.fake_providers
+        base = args.providers_url.rstrip("/")
+        settings.coingecko_api_url = f"{base}/api/v3"
+        settings.alpha_vantage_api_url = f"{base}/query"
+        if not args.rate_limits:
+            # Лимиты провайдеров фактически снимаются: замеряем бота, а не ожидание токенов
+            finance_api.scale_rate_limits(1e6)
+    else:
+        providers.install(finance_api)
+    memory_db = MemoryDatabase()
+    memory_db.install(db)
+    if not args.no_catalog:
+        if args.providers_url:
+            await symbol_catalog.refresh()
+        else:
+            symbol_catalog.build(providers.catalog_entries())
+
+    stats = LatencyStats()
+    session = FakeSession(args.api_latency / 1000)
+    bot = Bot(token=LOAD_TEST_TOKEN, session=session)
+    dp = create_dispatcher()
+    dp.message.middleware(TimingMiddleware(stats))
+    dp.callback_query.middleware(TimingMiddleware(stats))
+    await interaction_logger.start()
+
+    interval = args.users / args.rate
+    deadline = time.monotonic() + args.warmup + args.duration
+    users = [
+        VirtualUser(args.user_id + index, random.Random(args.seed + index), session)
+        for index in range(args.users)
+    ]
+    tasks = [asyncio.create_task(run_user(user, bot, dp, stats, interval, deadline)) for user in users]
+
+    if args.warmup:
+        await asyncio.sleep(args.warmup)
+        stats.reset()
+        session.calls.clear()
+        providers.calls.clear()
+        memory_db.calls.clear()
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        elapsed = time.perf_counter() - stats.started
+        await interaction_logger.stop()
+        await dp.storage.close()
+        await bot.session.close()
+        await finance_api.close_sessions()
+
+    if args.providers_url:
+        providers.calls = Counter(await fetch_stub_requests(args.providers_url))
+    summary = stats.summary()
+    extra = {
+        "unhandled": stats.unhandled,
+        "bot_api_calls": session.calls,
+        "provider_calls": providers.calls,
+        "db_calls": memory_db.calls,
+        "interaction_logger": interaction_logger.stats(),
+    }
+    print_report(summary, elapsed, args, extra)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "elapsed": elapsed,
+                "users": args.users,
+                "target_rate": args.rate,
+                "throughput": summary.get("update", {}).get("count", 0) / elapsed,
+                "handlers": summary,
+                "unhandled": stats.unhandled,
+                "bot_api_calls": dict(session.calls),
+                "provider_calls": dict(providers.calls),
+                "db_calls": dict(memory_db.calls),
+                "cache": finance_api.cache_stats(),
+            }, f, indent=2, default=str)
+
+    if args.fail_p95 is not None:
+        slow = [name for name, row in summary.items() if row["p95_ms"] > args.fail_p95]
+        if slow:
+            print(f"p95 above {args.fail_p95} ms: {', '.join(slow)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="число виртуальных пользователей")
+    parser.add_argument("--rate", type=float, default=200, help="суммарная частота обновлений в секунду")
+    parser.add_argument("--duration", type=float, default=30, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=3, help="прогрев без учета в статистике, с")
+    parser.add_argument("--api-latency", type=float, default=30, help="средняя задержка Bot API, мс")
+    parser.add_argument("--provider-latency", type=float, default=150, help="средняя задержка провайдеров, мс")
+    parser.add_argument("--rate-limits", action="store_true", help="пропускать запросы к провайдерам через лимитеры")
+    parser.add_argument("--providers-url", default=None,
+                        help="адрес scripts.fake_providers: запросы к провайдерам идут по HTTP, а не в генератор")
+    parser.add_argument("--no-catalog", action="store_true", help="без справочника активов (поиск через API)")
+    parser.add_argument("--user-id", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="файл для результатов в JSON")
+    parser.add_argument("--fail-p95", type=float, default=None, help="код выхода 1, если p95 обработчика выше, мс")
+    sys.exit(asyncio.run(main(parser.parse_args())))
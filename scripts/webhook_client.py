@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Локальный клиент вместо Telegram: отправляет синтетические обновления на webhook бота
+
+Пример:
+    python -m scripts.webhook_client --url http://localhost:8000/webhook --secret change_me --count 100
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+import aiohttp
+
+from services.webhook_server import SECRET_HEADER
+
+
+_update_ids = itertools.count(1)
+
+
+def make_message_update(user_id: int, text: str) -> dict:
+    """Обновление с текстовым сообщением от пользователя"""
+    update_id = next(_update_ids)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test", "username": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+async def main(args):
+    headers = {SECRET_HEADER: args.secret} if args.secret else {}
+    statuses = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def send(i: int):
+            update = make_message_update(args.user_id + i % args.users, args.text)
+            async with semaphore:
+                async with session.post(args.url, json=update) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(i) for i in range(args.count)))
+        elapsed = time.perf_counter() - started
+
+    print(f"Sent {args.count} updates in {elapsed:.2f}s ({args.count / elapsed:.0f}/s), statuses: {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/webhook")
+    parser.add_argument("--secret", default=None)
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--user-id", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--text", default="bitcoin")
+    asyncio.run(main(parser.parse_args()))
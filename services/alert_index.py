@@ -0,0 +1,101 @@
+import bisect
+from typing import Dict, Iterable, List, Tuple
+from database.models import PriceAlert
+
+
+_Entry = Tuple[float, int]  # (target_price, alert_id)
+
+
+class AlertIndex:
+    """Индекс активных ценовых алертов по символам.
+
+    Для каждого символа пороги "above" и "below" хранятся в отсортированных
+    списках, поэтому сработавшие алерты находятся бинарным поиском за O(log n + k).
+    max_id — наибольший id в индексе: с него дочитываются алерты, созданные
+    другими процессами.
+    """
+
+    def __init__(self):
+        self._above: Dict[str, List[_Entry]] = {}
+        self._below: Dict[str, List[_Entry]] = {}
+        self._alerts: Dict[int, PriceAlert] = {}
+        self.loaded = False
+        self.max_id = 0
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def __contains__(self, alert_id: int) -> bool:
+        return alert_id in self._alerts
+
+    def load(self, alerts: Iterable[PriceAlert]):
+        """Полная перестройка индекса"""
+        self.clear()
+        for alert in alerts:
+            self.add(alert)
+        self.loaded = True
+
+    def clear(self):
+        self._above.clear()
+        self._below.clear()
+        self._alerts.clear()
+        self.max_id = 0
+
+    def add(self, alert: PriceAlert):
+        if not alert.is_active or alert.id in self._alerts:
+            return
+        self._alerts[alert.id] = alert
+        self.max_id = max(self.max_id, alert.id)
+        bisect.insort(self._side(alert.alert_type).setdefault(self._key(alert.symbol), []),
+                      (float(alert.target_price), alert.id))
+
+    def remove(self, alert_id: int) -> bool:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return False
+
+        side = self._side(alert.alert_type)
+        key = self._key(alert.symbol)
+        entries = side.get(key, [])
+        entry = (float(alert.target_price), alert.id)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+        if not entries:
+            side.pop(key, None)
+        return True
+
+    def ids(self) -> List[int]:
+        return list(self._alerts)
+
+    def symbols(self) -> List[str]:
+        """Символы, по которым есть хотя бы один активный алерт"""
+        return list(self._above.keys() | self._below.keys())
+
+    def triggered(self, symbol: str, price: float) -> List[PriceAlert]:
+        """Алерты, сработавшие при данной цене символа"""
+        key = self._key(symbol)
+        result = []
+
+        above = self._above.get(key)
+        if above:
+            end = bisect.bisect_right(above, (price, float("inf")))
+            result.extend(self._alerts[alert_id] for _, alert_id in above[:end])
+
+        below = self._below.get(key)
+        if below:
+            start = bisect.bisect_left(below, (price, float("-inf")))
+            result.extend(self._alerts[alert_id] for _, alert_id in below[start:])
+
+        return result
+
+    def _side(self, alert_type: str) -> Dict[str, List[_Entry]]:
+        return self._above if alert_type == "above" else self._below
+
+    @staticmethod
+    def _key(symbol: str) -> str:
+        return symbol.lower()
+
+
+# Глобальный индекс алертов процесса
+alert_index = AlertIndex()
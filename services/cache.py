@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-кэш с временем жизни записей и объединением одновременных промахов"""
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.shared = None
+        self.namespace: Optional[str] = None
+
+    def attach_shared(self, shared, namespace: str):
+        """Подключение второго уровня, общего для процессов (services.shared_cache.SharedCache)"""
+        self.shared = shared
+        self.namespace = namespace
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение из кэша без учета статистики (None, если устарело)"""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Сохранение значения с вытеснением самых старых записей"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def keys(self) -> List[Hashable]:
+        """Ключи всех записей, включая еще не вытесненные устаревшие"""
+        return list(self._data.keys())
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Значение из кэша или результат loader(); одновременные промахи ждут один запрос.
+
+        Пустые результаты (None, [], {}) не кэшируются: сервис возвращает их при ошибках.
+        Если отменены все ожидающие, отменяется и сам запрос.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        
+        waiters = self._waiters
+        waiters[key] = waiters.get(key, 0) + 1
+        try:
+            # shield: отмена одного ожидающего не должна отменять общий запрос
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Отменен последний ожидающий — запрос больше никому не нужен
+            if waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            remaining = waiters.get(key, 1) - 1
+            if remaining:
+                waiters[key] = remaining
+            else:
+                waiters.pop(key, None)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            if self.shared is not None:
+                entry = await self.shared.get(self.namespace, key)
+                if entry and entry[0]:
+                    value, ttl = entry
+                    self.set(key, value, min(ttl, self.ttl))
+                    return value
+
+            value = await loader()
+            if value:
+                self.set(key, value)
+                if self.shared is not None:
+                    await self.shared.set(self.namespace, key, value, self.ttl)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики попаданий и промахов"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, Dict, Iterable, Optional, Union
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+from services.rate_limiter import TokenBucket
+
+
+Recipients = Union[Iterable[int], AsyncIterable[int]]
+
+
+@dataclass
+class FanoutStats:
+    recipients: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0  # пользователь заблокировал бота
+    retried: int = 0
+    duration: float = 0.0
+
+
+class FanoutSender:
+    """Рассылка сообщений в пределах лимитов Telegram.
+
+    Глобальный лимит (около 30 сообщений в секунду) обеспечивает token bucket,
+    в один чат отправляется не чаще раза в chat_interval секунд. Ответ 429
+    (retry_after) приостанавливает всю рассылку на указанное время.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = 30, chat_interval: float = 1.0,
+                 concurrency: int = 50, max_retries: int = 3):
+        self.bot = bot
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(global_rate, global_rate)
+        self._chat_next: Dict[int, float] = {}
+        self._resume_at = 0.0
+
+    async def send(self, chat_id: int, text: str, stats: Optional[FanoutStats] = None) -> bool:
+        """Отправка одного сообщения с повтором после retry_after"""
+        stats = stats or FanoutStats()
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                await self.bot.send_message(chat_id, text)
+                stats.sent += 1
+                return True
+            except TelegramRetryAfter as e:
+                self._resume_at = max(self._resume_at, time.monotonic() + e.retry_after)
+            except TelegramNetworkError:
+                await asyncio.sleep(2 ** attempt)
+            except TelegramForbiddenError:
+                stats.blocked += 1
+                return False
+            except TelegramAPIError as e:
+                print(f"Error sending message to {chat_id}: {e}")
+                break
+            if attempt < self.max_retries:
+                stats.retried += 1
+
+        stats.failed += 1
+        return False
+
+    async def broadcast(self, recipients: Recipients, text: str) -> FanoutStats:
+        """Отправка одного и того же текста всем получателям"""
+        stats = FanoutStats()
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def worker():
+            while True:
+                chat_id = await queue.get()
+                try:
+                    if chat_id is None:
+                        return
+                    await self.send(chat_id, text, stats)
+                except Exception as e:
+                    # Ошибка вне Telegram API (таймаут сессии и т.п.) не должна останавливать
+                    # воркер: без воркеров рассылка зависнет на queue.put
+                    print(f"Error sending message to {chat_id}: {e!r}")
+                    stats.failed += 1
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            if isinstance(recipients, AsyncIterable):
+                async for chat_id in recipients:
+                    stats.recipients += 1
+                    await queue.put(chat_id)
+            else:
+                for chat_id in recipients:
+                    stats.recipients += 1
+                    await queue.put(chat_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        stats.duration = time.monotonic() - started
+        return stats
+
+    async def _wait_turn(self, chat_id: int):
+        now = time.monotonic()
+        # Резервируем слот чата до ожидания, чтобы параллельные отправки в тот же чат шли по очереди
+        slot = max(now, self._chat_next.get(chat_id, 0.0), self._resume_at)
+        self._chat_next[chat_id] = slot + self.chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        while self._resume_at > time.monotonic():
+            await asyncio.sleep(self._resume_at - time.monotonic())
+        await self._bucket.acquire()
+
+        if len(self._chat_next) > 10000:
+            self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        self._chat_next = {chat_id: t for chat_id, t in self._chat_next.items() if t > now}
@@ -1,23 +1,165 @@
 import aiohttp
+import asyncio
+import csv
+import io
 import json
-from typing import Dict, List, Optional, Any
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Any, Sequence, Tuple
+from yarl import URL
 from config import settings
+from services.cache import TTLCache
+from services.metrics import UPSTREAM_BYTES, UPSTREAM_DURATION, UPSTREAM_ERRORS, UPSTREAM_RESPONSES
+from services.rate_limiter import Priority, PriorityTokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+# Активы, которые показываются в меню и обзоре рынка
+POPULAR_CRYPTO_IDS = ['bitcoin', 'ethereum', 'binancecoin', 'solana', 'cardano']
+POPULAR_STOCK_SYMBOLS = ['AAPL', 'GOOGL', 'TSLA', 'MSFT', 'AMZN']
+
+# Форма идентификатора монеты CoinGecko и тикера Alpha Vantage (BRK.B, RDS-A)
+_COIN_ID_RE = re.compile(r"[a-z0-9-]+")
+_TICKER_RE = re.compile(r"[A-Z][A-Z0-9.-]{0,9}")
+
+# Приоритет запросов текущей задачи; фоновые сервисы понижают его через finance_api.priority()
+_request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.INTERACTIVE)
 
 
 class FinanceAPIService:
     def __init__(self):
+        self.connector: Optional[aiohttp.TCPConnector] = None
         self.coingecko_session = None
         self.alpha_vantage_session = None
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.caches = {
+            "crypto_price": TTLCache(settings.price_cache_ttl, settings.cache_max_size),
+            "crypto_info": TTLCache(settings.crypto_info_cache_ttl, settings.cache_max_size),
+            "stock_price": TTLCache(settings.stock_cache_ttl, settings.cache_max_size),
+            "trending": TTLCache(settings.trending_cache_ttl, 1),
+            "search": TTLCache(settings.search_cache_ttl, settings.cache_max_size),
+            "market_summary": TTLCache(settings.market_cache_ttl, 1),
+        }
+        self.limiters = {
+            "coingecko": PriorityTokenBucket(
+                settings.coingecko_rate_limit_per_minute / 60,
+                settings.coingecko_rate_limit_burst
+            ),
+            "alpha_vantage": PriorityTokenBucket(
+                settings.alpha_vantage_rate_limit_per_minute / 60,
+                settings.alpha_vantage_rate_limit_burst
+            ),
+        }
+    
+    @staticmethod
+    @contextmanager
+    def priority(priority: Priority):
+        """Приоритет всех запросов к провайдерам внутри блока (наследуется дочерними задачами)"""
+        token = _request_priority.set(priority)
+        try:
+            yield
+        finally:
+            _request_priority.reset(token)
+    
+    async def _throttle(self, provider: str):
+        """Ожидание разрешения лимитера провайдера"""
+        await self.limiters[provider].acquire(_request_priority.get())
+    
+    def limiter_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Очереди и время ожидания лимитеров по провайдерам"""
+        return {provider: limiter.stats() for provider, limiter in self.limiters.items()}
+    
+    def _get_connector(self) -> aiohttp.TCPConnector:
+        """Общий пул соединений для всех провайдеров"""
+        if self.connector is None or self.connector.closed:
+            self.connector = aiohttp.TCPConnector(
+                limit=settings.http_pool_limit,
+                limit_per_host=settings.http_pool_limit_per_host,
+                ttl_dns_cache=settings.http_dns_cache_ttl,
+                keepalive_timeout=settings.http_keepalive_timeout
+            )
+        return self.connector
+    
+    def _create_session(self, provider: str, connect_timeout: float, read_timeout: float,
+                        total_timeout: float) -> aiohttp.ClientSession:
+        # Контекст трассировки каждого запроса знает провайдера — для меток метрик
+        trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=partial(SimpleNamespace, provider=provider))
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_end)
+        trace_config.on_request_exception.append(self._on_request_exception)
+        trace_config.on_response_chunk_received.append(self._on_response_chunk)
+        
+        return aiohttp.ClientSession(
+            connector=self._get_connector(),
+            connector_owner=False,
+            timeout=aiohttp.ClientTimeout(
+                total=total_timeout,
+                connect=connect_timeout,
+                sock_read=read_timeout
+            ),
+            trace_configs=[trace_config]
+        )
+    
+    async def _on_connection_created(self, session, context, params):
+        self.connections_created += 1
+    
+    async def _on_connection_reused(self, session, context, params):
+        self.connections_reused += 1
+    
+    @staticmethod
+    def _endpoint(provider: str, url: URL) -> str:
+        """Эндпоинт для меток метрик без идентификаторов в пути: coins/{id}, GLOBAL_QUOTE"""
+        if provider == "alpha_vantage":
+            return url.query.get("function", "query")
+        path = url.path[len(URL(settings.coingecko_api_url).path):].strip("/")
+        parts = path.split("/")
+        if len(parts) == 2 and parts[0] == "coins" and parts[1] not in ("list", "markets"):
+            return "coins/{id}"
+        return path
+    
+    async def _on_request_start(self, session, context, params):
+        context.endpoint = self._endpoint(context.provider, params.url)
+        context.bytes = UPSTREAM_BYTES.labels(context.provider, context.endpoint)
+        context.started = time.perf_counter()
+    
+    async def _on_request_end(self, session, context, params):
+        UPSTREAM_DURATION.labels(context.provider, context.endpoint).observe(time.perf_counter() - context.started)
+        UPSTREAM_RESPONSES.labels(context.provider, context.endpoint, params.response.status).inc()
+    
+    async def _on_request_exception(self, session, context, params):
+        UPSTREAM_ERRORS.labels(context.provider, context.endpoint, type(params.exception).__name__).inc()
+    
+    async def _on_response_chunk(self, session, context, params):
+        context.bytes.inc(len(params.chunk))
     
     async def _get_coingecko_session(self) -> aiohttp.ClientSession:
         if self.coingecko_session is None or self.coingecko_session.closed:
-            self.coingecko_session = aiohttp.ClientSession()
+            self.coingecko_session = self._create_session(
+                "coingecko",
+                settings.coingecko_connect_timeout,
+                settings.coingecko_read_timeout,
+                settings.coingecko_total_timeout
+            )
         return self.coingecko_session
     
     async def _get_alpha_vantage_session(self) -> aiohttp.ClientSession:
         """Получение сессии для Alpha Vantage API"""
         if self.alpha_vantage_session is None or self.alpha_vantage_session.closed:
-            self.alpha_vantage_session = aiohttp.ClientSession()
+            self.alpha_vantage_session = self._create_session(
+                "alpha_vantage",
+                settings.alpha_vantage_connect_timeout,
+                settings.alpha_vantage_read_timeout,
+                settings.alpha_vantage_total_timeout
+            )
         return self.alpha_vantage_session
     
     async def close_sessions(self):
@@ -26,14 +168,145 @@ class FinanceAPIService:
             await self.coingecko_session.close()
         if self.alpha_vantage_session and not self.alpha_vantage_session.closed:
             await self.alpha_vantage_session.close()
+        if self.connector and not self.connector.closed:
+            await self.connector.close()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Загрузка пула соединений"""
+        connector = self.connector
+        if connector is None or connector.closed:
+            in_use, idle, per_host = 0, 0, {}
+        else:
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            per_host = {
+                key.host: len(conns)
+                for key, conns in getattr(connector, "_acquired_per_host", {}).items()
+                if conns
+            }
+        
+        return {
+            "limit": settings.http_pool_limit,
+            "limit_per_host": settings.http_pool_limit_per_host,
+            "in_use": in_use,
+            "idle": idle,
+            "utilization": in_use / settings.http_pool_limit if settings.http_pool_limit else 0.0,
+            "in_use_per_host": per_host,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+        }
+    
+    def enable_shared_cache(self, shared):
+        """Второй уровень кэша, общий для процессов-воркеров"""
+        for name, cache in self.caches.items():
+            cache.attach_shared(shared, name)
+    
+    def scale_rate_limits(self, fraction: float):
+        """Доля лимитов провайдеров для одного из нескольких процессов"""
+        self.limiters = {
+            "coingecko": PriorityTokenBucket(
+                settings.coingecko_rate_limit_per_minute * fraction / 60,
+                max(1, int(settings.coingecko_rate_limit_burst * fraction))
+            ),
+            "alpha_vantage": PriorityTokenBucket(
+                settings.alpha_vantage_rate_limit_per_minute * fraction / 60,
+                max(1, int(settings.alpha_vantage_rate_limit_burst * fraction))
+            ),
+        }
+    
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Статистика кэшей по эндпоинтам"""
+        return {name: cache.stats() for name, cache in self.caches.items()}
     
     async def get_crypto_price(self, coin_id: str, currency: str = "usd") -> Optional[Dict[str, Any]]:
+        return await self.caches["crypto_price"].get_or_load(
+            (coin_id, currency), lambda: self._fetch_crypto_price(coin_id, currency)
+        )
+    
+    async def _fetch_crypto_price(self, coin_id: str, currency: str) -> Optional[Dict[str, Any]]:
+        prices = await self._fetch_crypto_prices([coin_id], [currency])
+        return prices.get(coin_id, {}).get(currency)
+    
+    async def get_crypto_prices(self, coin_ids: Iterable[str],
+                                currencies: Iterable[str] = ("usd",)) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Получение цен нескольких криптовалют: {coin_id: {currency: котировка}}
+
+        Котировки из кэша не запрашиваются повторно, остальные id делятся на пачки
+        и запрашиваются параллельно. Не найденные монеты в результат не попадают.
+        """
+        currencies = list(dict.fromkeys(currencies))
+        cache = self.caches["crypto_price"]
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        missing = []
+        
+        for coin_id in dict.fromkeys(coin_ids):
+            quotes = {currency: cache.get((coin_id, currency)) for currency in currencies}
+            if all(quotes.values()):
+                cache.hits += 1
+                result[coin_id] = quotes
+            else:
+                cache.misses += 1
+                missing.append(coin_id)
+        
+        if missing and cache.shared is not None:
+            # Котировки, уже полученные другими процессами
+            shared = await cache.shared.get_many(
+                cache.namespace, [(coin_id, currency) for coin_id in missing for currency in currencies]
+            )
+            fetched = []
+            for coin_id in missing:
+                entries = [shared.get((coin_id, currency)) for currency in currencies]
+                if all(entries):
+                    for currency, (quote, ttl) in zip(currencies, entries):
+                        cache.set((coin_id, currency), quote, min(ttl, cache.ttl))
+                    result[coin_id] = {currency: entry[0] for currency, entry in zip(currencies, entries)}
+                else:
+                    fetched.append(coin_id)
+            missing = fetched
+        
+        if missing:
+            chunks = await asyncio.gather(*(
+                self._fetch_crypto_prices(chunk, currencies)
+                for chunk in self._chunk_coin_ids(missing)
+            ))
+            loaded = {}
+            for chunk in chunks:
+                for coin_id, quotes in chunk.items():
+                    for currency, quote in quotes.items():
+                        cache.set((coin_id, currency), quote)
+                        loaded[(coin_id, currency)] = quote
+                    result[coin_id] = quotes
+            if cache.shared is not None:
+                await cache.shared.set_many(cache.namespace, loaded, cache.ttl)
+        
+        return result
+    
+    @staticmethod
+    def _chunk_coin_ids(coin_ids: List[str]) -> List[List[str]]:
+        """Разбиение списка id на пачки, укладывающиеся в длину URL"""
+        chunks, chunk, length = [], [], 0
+        for coin_id in coin_ids:
+            # +3 на закодированную запятую-разделитель
+            added = len(coin_id) + 3
+            if chunk and (len(chunk) >= settings.coingecko_batch_size
+                          or length + added > settings.coingecko_ids_max_length):
+                chunks.append(chunk)
+                chunk, length = [], 0
+            chunk.append(coin_id)
+            length += added
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+    
+    async def _fetch_crypto_prices(self, coin_ids: List[str],
+                                   currencies: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
         try:
+            await self._throttle("coingecko")
             session = await self._get_coingecko_session()
             url = f"{settings.coingecko_api_url}/simple/price"
             params = {
-                "ids": coin_id,
-                "vs_currencies": currency,
+                "ids": ",".join(coin_ids),
+                "vs_currencies": ",".join(currencies),
                 "include_24hr_change": "true",
                 "include_market_cap": "true"
             }
@@ -41,23 +314,34 @@ class FinanceAPIService:
             async with session.get(url, params=params) as response:
                 if response.status == 200:
                     data = await response.json()
-                    if coin_id in data:
-                        coin_data = data[coin_id]
-                        return {
-                            "symbol": coin_id.upper(),
-                            "price": coin_data.get(currency, 0),
-                            "change_24h": coin_data.get(f"{currency}_24h_change", 0),
-                            "market_cap": coin_data.get(f"{currency}_market_cap", 0),
-                            "currency": currency.upper()
+                    return {
+                        coin_id: {
+                            currency: {
+                                "symbol": coin_id.upper(),
+                                "price": coin_data.get(currency, 0),
+                                "change_24h": coin_data.get(f"{currency}_24h_change", 0),
+                                "market_cap": coin_data.get(f"{currency}_market_cap", 0),
+                                "currency": currency.upper()
+                            }
+                            for currency in currencies
                         }
-                return None
+                        for coin_id, coin_data in data.items()
+                        if coin_data
+                    }
+                return {}
         except Exception as e:
-            print(f"Error getting crypto price: {e}")
-            return None
+            logger.error(f"Error getting crypto prices: {e}")
+            return {}
     
     async def get_crypto_info(self, coin_id: str) -> Optional[Dict[str, Any]]:
         """Получение информации о криптовалюте"""
+        return await self.caches["crypto_info"].get_or_load(
+            coin_id, lambda: self._fetch_crypto_info(coin_id)
+        )
+    
+    async def _fetch_crypto_info(self, coin_id: str) -> Optional[Dict[str, Any]]:
         try:
+            await self._throttle("coingecko")
             session = await self._get_coingecko_session()
             url = f"{settings.coingecko_api_url}/coins/{coin_id}"
             params = {
@@ -84,12 +368,16 @@ class FinanceAPIService:
                     }
                 return None
         except Exception as e:
-            print(f"Error getting crypto info: {e}")
+            logger.error(f"Error getting crypto info: {e}")
             return None
     
     async def get_trending_cryptos(self) -> List[Dict[str, Any]]:
         """Получение трендовых криптовалют"""
+        return await self.caches["trending"].get_or_load("trending", self._fetch_trending_cryptos)
+    
+    async def _fetch_trending_cryptos(self) -> List[Dict[str, Any]]:
         try:
+            await self._throttle("coingecko")
             session = await self._get_coingecko_session()
             url = f"{settings.coingecko_api_url}/search/trending"
             
@@ -109,7 +397,7 @@ class FinanceAPIService:
                     return trending
                 return []
         except Exception as e:
-            print(f"Error getting trending cryptos: {e}")
+            logger.error(f"Error getting trending cryptos: {e}")
             return []
     
     async def get_stock_price(self, symbol: str) -> Optional[Dict[str, Any]]:
@@ -117,7 +405,14 @@ class FinanceAPIService:
         if not settings.alpha_vantage_api_key:
             return None
         
+        symbol = symbol.upper()
+        return await self.caches["stock_price"].get_or_load(
+            symbol, lambda: self._fetch_stock_price(symbol)
+        )
+    
+    async def _fetch_stock_price(self, symbol: str) -> Optional[Dict[str, Any]]:
         try:
+            await self._throttle("alpha_vantage")
             session = await self._get_alpha_vantage_session()
             url = settings.alpha_vantage_api_url
             params = {
@@ -136,17 +431,23 @@ class FinanceAPIService:
                             "price": float(quote.get("05. price", 0)),
                             "change": float(quote.get("09. change", 0)),
                             "change_percent": quote.get("10. change percent", "0%"),
-                            "volume": quote.get("06. volume", "0"),
-                            "market_cap": quote.get("07. market cap", "0")
+                            "volume": int(quote.get("06. volume", 0)),
+                            "market_cap": int(float(quote.get("07. market cap", 0)))
                         }
                 return None
         except Exception as e:
-            print(f"Error getting stock price: {e}")
+            logger.error(f"Error getting stock price: {e}")
             return None
     
     async def search_crypto(self, query: str) -> List[Dict[str, Any]]:
         """Поиск криптовалюты по названию"""
+        return await self.caches["search"].get_or_load(
+            query.lower(), lambda: self._fetch_search_crypto(query)
+        )
+    
+    async def _fetch_search_crypto(self, query: str) -> List[Dict[str, Any]]:
         try:
+            await self._throttle("coingecko")
             session = await self._get_coingecko_session()
             url = f"{settings.coingecko_api_url}/search"
             params = {"query": query}
@@ -165,12 +466,121 @@ class FinanceAPIService:
                     return coins
                 return []
         except Exception as e:
-            print(f"Error searching crypto: {e}")
+            logger.error(f"Error searching crypto: {e}")
+            return []
+    
+    async def resolve_query(self, query: str,
+                            kinds: Sequence[str] = ("crypto", "stock", "search")) -> Optional[Tuple[str, Any]]:
+        """Параллельный поиск актива по тексту: (kind, данные) или None.
+
+        Запросы CoinGecko из kinds стартуют одновременно; побеждает первый по
+        порядку kinds успешный результат. Он возвращается, как только известен
+        исход всех более приоритетных запросов, а оставшиеся запросы отменяются.
+        Запрос акции в гонке не участвует: отмена не вернет уже потраченный
+        запрос из квоты Alpha Vantage (5 в минуту), поэтому он начинается только
+        после промаха всех предыдущих видов или сразу, если текст не может быть
+        id монеты. Текст, не похожий на тикер, как акция не ищется.
+        """
+        lookups = {
+            "crypto": lambda: self.get_crypto_info(query.lower()),
+            "stock": lambda: self.get_stock_price(query.upper()),
+            "search": lambda: self.search_crypto(query),
+        }
+        if not _TICKER_RE.fullmatch(query.upper()):
+            kinds = [kind for kind in kinds if kind != "stock"]
+        eager_stock = not _COIN_ID_RE.fullmatch(query.lower())
+        tasks = {
+            kind: asyncio.ensure_future(lookups[kind]())
+            for kind in kinds if kind != "stock" or eager_stock
+        }
+        try:
+            for kind in kinds:
+                # Отложенный запрос стартует, когда все более приоритетные промахнулись
+                task = tasks.get(kind)
+                if task is None:
+                    task = tasks[kind] = asyncio.ensure_future(lookups[kind]())
+                result = await task
+                if result:
+                    return kind, result
+            return None
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+    
+    async def get_coin_list(self) -> List[Dict[str, Any]]:
+        """Полный список монет CoinGecko (id, symbol, name)"""
+        try:
+            await self._throttle("coingecko")
+            session = await self._get_coingecko_session()
+            url = f"{settings.coingecko_api_url}/coins/list"
+            
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return await response.json()
+                return []
+        except Exception as e:
+            logger.error(f"Error getting coin list: {e}")
+            return []
+    
+    async def get_coin_ranks(self, pages: int = 1) -> Dict[str, int]:
+        """Ранги монет по капитализации: {coin_id: rank} для первых pages * 250 монет"""
+        ranks = {}
+        try:
+            session = await self._get_coingecko_session()
+            url = f"{settings.coingecko_api_url}/coins/markets"
+            for page in range(1, pages + 1):
+                await self._throttle("coingecko")
+                params = {
+                    "vs_currency": "usd",
+                    "order": "market_cap_desc",
+                    "per_page": 250,
+                    "page": page
+                }
+                async with session.get(url, params=params) as response:
+                    if response.status != 200:
+                        break
+                    for coin in await response.json():
+                        if coin.get("market_cap_rank"):
+                            ranks[coin["id"]] = coin["market_cap_rank"]
+        except Exception as e:
+            logger.error(f"Error getting coin ranks: {e}")
+        return ranks
+    
+    async def get_stock_listing(self) -> List[Dict[str, str]]:
+        """Список активных тикеров Alpha Vantage (symbol, name)"""
+        if not settings.alpha_vantage_api_key:
+            return []
+        
+        try:
+            await self._throttle("alpha_vantage")
+            session = await self._get_alpha_vantage_session()
+            url = settings.alpha_vantage_api_url
+            params = {
+                "function": "LISTING_STATUS",
+                "apikey": settings.alpha_vantage_api_key
+            }
+            
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    text = await response.text()
+                    return [
+                        {"symbol": row["symbol"], "name": row.get("name") or row["symbol"]}
+                        for row in csv.DictReader(io.StringIO(text))
+                        if row.get("symbol")
+                    ]
+                return []
+        except Exception as e:
+            logger.error(f"Error getting stock listing: {e}")
             return []
     
     async def get_market_summary(self) -> Dict[str, Any]:
         """Получение сводки рынка"""
+        return await self.caches["market_summary"].get_or_load("global", self._fetch_market_summary)
+    
+    async def _fetch_market_summary(self) -> Dict[str, Any]:
         try:
+            await self._throttle("coingecko")
             session = await self._get_coingecko_session()
             url = f"{settings.coingecko_api_url}/global"
             
@@ -187,7 +597,7 @@ class FinanceAPIService:
                     }
                 return {}
         except Exception as e:
-            print(f"Error getting market summary: {e}")
+            logger.error(f"Error getting market summary: {e}")
             return {}
 
 
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from config import settings
+from database.connection import db
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+InteractionRecord = Tuple[int, Optional[str], str, str, datetime]
+
+
+class InteractionLogger:
+    """Отложенная (write-behind) запись взаимодействий пользователей.
+
+    Обработчики кладут записи в ограниченный буфер, фоновая задача сбрасывает
+    их в БД пачками через COPY по достижении размера пачки или по таймеру.
+    Неудачная запись повторяется write_retries раз с удваивающейся паузой; после
+    этого пачка возвращается в буфер, насколько хватает места, и отбрасывается
+    только остаток (и все при остановке). Пользователи пишутся в users только при первом обращении, смене username
+    или устаревании записи в кэше (identities).
+    """
+
+    def __init__(self, buffer_size: int, batch_size: int, flush_interval: float, put_timeout: float,
+                 identity_cache: TTLCache, write_retries: int = 5, retry_backoff: float = 0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self._task: Optional[asyncio.Task] = None
+        # user_id -> (username,): уже записанные в users пользователи
+        self.identities = identity_cache
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.requeued = 0
+        self.users_upserted = 0
+        self.flushes = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self.last_flush_size = 0
+        self.last_flush_seconds = 0.0
+
+    async def start(self):
+        """Запуск фоновой записи"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info("Interaction logger started")
+
+    async def stop(self):
+        """Остановка с записью всего, что осталось в буфере"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info("Interaction logger stopped")
+
+    async def log(self, user_id: int, username: Optional[str], request_text: str, response_text: str):
+        """Постановка взаимодействия в очередь на запись.
+
+        При заполненном буфере ждет не дольше put_timeout, затем запись отбрасывается.
+        """
+        record = (user_id, username, request_text, response_text, datetime.now())
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.blocked += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._queue.put(record), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return
+            finally:
+                self.blocked_seconds += time.perf_counter() - started
+
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики буфера и обратного давления"""
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "retries": self.retries,
+            "requeued": self.requeued,
+            "users_upserted": self.users_upserted,
+            "identity_cache": self.identities.stats(),
+            "flushes": self.flushes,
+            "blocked": self.blocked,
+            "blocked_seconds": self.blocked_seconds,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch, requeue=not stopping)
+
+        # Дописываем все, что успели поставить в очередь до остановки
+        batch = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                await self._flush(batch)
+                batch = []
+        if batch:
+            await self._flush(batch)
+
+    def _changed_users(self, batch: List[InteractionRecord]) -> List[Tuple[int, Optional[str], datetime]]:
+        """Пользователи пачки, которых нет в кэше или у которых сменился username"""
+        users = {}
+        for user_id, username, _, _, created_at in batch:
+            cached = self.identities.get(user_id)
+            if cached is None or cached[0] != username:
+                users[user_id] = (user_id, username, created_at)
+        return list(users.values())
+
+    async def _flush(self, batch: List[InteractionRecord], requeue: bool = False):
+        started = time.perf_counter()
+        users = self._changed_users(batch)
+        if users:
+            try:
+                self.users_upserted += await db.upsert_users(users)
+                for user_id, username, _ in users:
+                    self.identities.set(user_id, (username,))
+            except Exception as e:
+                logger.warning(f"Error writing {len(users)} users: {e}")
+
+        try:
+            await self._save(batch)
+            self.written += len(batch)
+        except Exception as e:
+            if requeue:
+                self._requeue(batch, e)
+            else:
+                self._drop(batch, e)
+        finally:
+            self.flushes += 1
+            self.last_flush_size = len(batch)
+            self.last_flush_seconds = time.perf_counter() - started
+
+    async def _save(self, batch: List[InteractionRecord]):
+        """Запись пачки с повторами; пачка пишется одной транзакцией, повтор безопасен"""
+        for attempt in range(self.write_retries + 1):
+            try:
+                await db.save_interactions(batch)
+                return
+            except Exception as e:
+                if attempt == self.write_retries:
+                    raise
+                delay = self.retry_backoff * 2 ** attempt
+                self.retries += 1
+                logger.warning(f"Error writing {len(batch)} interactions, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    def _requeue(self, batch: List[InteractionRecord], error: Exception):
+        """Возврат пачки в буфер в пределах свободного места; остаток отбрасывается"""
+        requeued = 0
+        for record in batch:
+            try:
+                self._queue.put_nowait(record)
+            except asyncio.QueueFull:
+                break
+            requeued += 1
+        self.requeued += requeued
+        logger.warning(f"Requeued {requeued} of {len(batch)} interactions after failed writes: {error}")
+        if requeued < len(batch):
+            self._drop(batch[requeued:], error)
+
+    def _drop(self, batch: List[InteractionRecord], error: Exception):
+        self.failed += len(batch)
+        logger.error(f"Dropped {len(batch)} interactions after {self.write_retries} retries: {error}")
+
+
+# Глобальный экземпляр логгера взаимодействий
+interaction_logger = InteractionLogger(
+    buffer_size=settings.interaction_buffer_size,
+    batch_size=settings.interaction_batch_size,
+    flush_interval=settings.interaction_flush_interval,
+    put_timeout=settings.interaction_put_timeout,
+    identity_cache=TTLCache(settings.user_cache_ttl, settings.user_cache_size),
+    write_retries=settings.interaction_write_retries,
+    retry_backoff=settings.interaction_retry_backoff
+)
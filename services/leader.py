@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+import asyncpg
+from config import settings
+from database.connection import db
+
+
+logger = logging.getLogger(__name__)
+
+Jobs = Callable[[], Awaitable[None]]
+
+
+class LeaderLock:
+    """Задачи, которые в кластере должен выполнять ровно один процесс.
+
+    Владелец определяется сессионной advisory-блокировкой PostgreSQL на
+    отдельном соединении вне пула: если процесс падает или теряет соединение,
+    сервер снимает блокировку сам. Остальные процессы (реплики webhook,
+    соседние runner'ы) раз в leader_retry_interval пытаются ее взять и
+    подхватывают задачи.
+    """
+
+    def __init__(self, name: str, start_jobs: Jobs, stop_jobs: Jobs):
+        self.name = name
+        self.start_jobs = start_jobs
+        self.stop_jobs = stop_jobs
+        self.is_leader = False
+        self._conn: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Первая попытка сразу, чтобы единственный процесс запускал задачи без задержки"""
+        if self._task:
+            return
+        await self._attempt()
+        self._task = asyncio.create_task(self._leader_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._release()
+
+    async def _leader_loop(self):
+        while True:
+            await asyncio.sleep(settings.leader_retry_interval)
+            await self._attempt()
+
+    async def _attempt(self):
+        try:
+            if self.is_leader:
+                # Соединение живо — блокировка все еще наша
+                await self._conn.fetchval('SELECT 1')
+            else:
+                await self._acquire()
+        except Exception as e:
+            logger.error(f"Leader lock {self.name}: {e}")
+            await self._release()
+
+    async def _acquire(self):
+        conn = await db.open_connection()
+        try:
+            acquired = await conn.fetchval('SELECT pg_try_advisory_lock(hashtext($1))', self.name)
+        except Exception:
+            await conn.close()
+            raise
+        if not acquired:
+            await conn.close()
+            return
+
+        self._conn = conn
+        self.is_leader = True
+        logger.info(f"Acquired leader lock {self.name}")
+        await self.start_jobs()
+
+    async def _release(self):
+        if self.is_leader:
+            self.is_leader = False
+            logger.info(f"Released leader lock {self.name}")
+            try:
+                await self.stop_jobs()
+            except Exception as e:
+                logger.error(f"Error stopping jobs of {self.name}: {e}")
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from types import CodeType, FrameType
+from typing import Deque, Dict, Iterable, Optional
+from aiogram import Dispatcher
+from config import settings
+from services.metrics import Sample, metrics
+from services.profiler import running_task_name
+
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics.histogram(
+    "bot_event_loop_lag_seconds", "Delay between a timer's scheduled and actual wake-up",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_STALLS = metrics.counter(
+    "bot_event_loop_stalls_total", "Callbacks that held the event loop longer than the stall threshold",
+    ["handler"])
+
+
+class LoopMonitor:
+    """Задержка цикла событий и сторож блокирующих вызовов.
+
+    Задача в цикле спит interval и измеряет, насколько позже срока проснулась:
+    это время, которое таймеры, ответы провайдеров и апдейты ждут своей очереди.
+    Каждое пробуждение обновляет отметку пульса. Поток-сторож следит за ней и,
+    если цикл не отвечает дольше threshold, снимает стек потока цикла — в нем
+    и виден блокирующий вызов, пока он еще выполняется. Обработчик находится
+    по кадру его функции в стеке, без затрат на каждый апдейт.
+    """
+
+    def __init__(self, interval: float, threshold: float, window: int, stack_depth: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self.lags: Deque[float] = deque(maxlen=window)
+        self.stalls = 0
+        self._handlers: Dict[CodeType, str] = {}
+        self._heartbeat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def register_handlers(self, dp: Dispatcher):
+        """Запоминает функции обработчиков всех роутеров, чтобы узнавать их в стеке"""
+        for router in dp.chain_tail:
+            for event_type, observer in router.observers.items():
+                # Наблюдатель update диспетчера — корень каждого стека, а не обработчик
+                if event_type == "update":
+                    continue
+                for handler in observer.handlers:
+                    code = getattr(handler.callback, "__code__", None)
+                    if code is not None:
+                        # Та же метка, что у bot_handler_duration_seconds
+                        self._handlers[code] = handler.callback.__name__
+
+    async def start(self):
+        if self._task:
+            return
+        loop = asyncio.get_running_loop()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._measure_lag())
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(threading.get_ident(), loop), name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            f"Event loop monitor started: interval {self.interval * 1000:.0f}ms, "
+            f"stall threshold {self.threshold * 1000:.0f}ms"
+        )
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _measure_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self._heartbeat = time.monotonic()
+            self.lags.append(lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self, loop_thread: int, loop: asyncio.AbstractEventLoop):
+        reported = 0.0
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            # Пульс запаздывает на interval и в норме; сверх этого цикл кем-то занят
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            # Об одной остановке сообщаем один раз, пока цикл не проснется
+            reported = heartbeat
+            frame = sys._current_frames().get(loop_thread)
+            if frame is not None:
+                self._report(frame, running_task_name(loop), stalled)
+
+    def _report(self, frame: FrameType, task: Optional[str], stalled: float):
+        handler = self._find_handler(frame)
+        self.stalls += 1
+        LOOP_STALLS.labels(handler or "none").inc()
+        stack = "".join(traceback.format_stack(frame, limit=self.stack_depth))
+        logger.warning(
+            f"Event loop blocked for {stalled * 1000:.0f}ms+ "
+            f"(task {task or 'none'}, handler {handler or 'none'}):\n{stack}"
+        )
+
+    def _find_handler(self, frame: FrameType) -> Optional[str]:
+        while frame is not None:
+            handler = self._handlers.get(frame.f_code)
+            if handler:
+                return handler
+            frame = frame.f_back
+        return None
+
+    def percentiles(self) -> Dict[str, float]:
+        """Перцентили задержки по последним window измерениям"""
+        lags = sorted(self.lags)
+        if not lags:
+            return {}
+        return {
+            quantile: lags[min(int(float(quantile) * len(lags)), len(lags) - 1)]
+            for quantile in ("0.5", "0.95", "0.99")
+        }
+
+
+# Глобальный экземпляр монитора цикла событий
+loop_monitor = LoopMonitor(
+    settings.loop_monitor_interval,
+    settings.loop_stall_threshold,
+    settings.loop_lag_window,
+    settings.loop_stall_stack_depth,
+)
+
+
+@metrics.collector("gauge", "Event loop lag percentiles over the recent window")
+def _collect_loop_lag() -> Iterable[Sample]:
+    for quantile, lag in loop_monitor.percentiles().items():
+        yield "bot_event_loop_lag_recent_seconds", {"quantile": quantile}, lag
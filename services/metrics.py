@@ -0,0 +1,341 @@
+import bisect
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Сэмпл сборщика: (имя метрики, метки, значение)
+Sample = Tuple[str, Dict[str, Any], float]
+Collector = Callable[[], Iterable[Sample]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # Последняя корзина — значения больше всех границ (+Inf)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Family:
+    """Метрика с метками; дочерние серии создаются при первом обращении и кэшируются"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _series(self):
+        for key, child in sorted(self._children.items()):
+            yield dict(zip(self.labelnames, key)), child
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.value)}" for labels, child in self._series()]
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, child in self._series():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики процесса в текстовом формате Prometheus.
+
+    Счетчики и гистограммы обновляются в месте события (словарь и сложение,
+    без блокировок: все происходит в одном цикле событий). Значения, которые
+    сервисы уже считают сами (кэши, пулы, лимитеры, буфер истории), не
+    дублируются: сборщики читают их статистику только в момент запроса /metrics.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._collectors: List[Tuple[str, str, Collector]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, family: _Family):
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self._families[family.name] = family
+        return family
+
+    def collector(self, kind: str, documentation: str):
+        """Декоратор сборщика: функция без аргументов возвращает сэмплы (имя, метки, значение)"""
+        def register(collect: Collector) -> Collector:
+            self._collectors.append((kind, documentation, collect))
+            return collect
+        return register
+
+    def render(self) -> str:
+        lines = []
+        for family in self._families.values():
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(family.render())
+
+        for kind, documentation, collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                logger.error(f"Metrics collector {collect.__name__} failed: {e}")
+                continue
+            # Серии одной метрики должны идти подряд после ее HELP и TYPE
+            grouped: Dict[str, List[str]] = {}
+            for name, labels, value in samples:
+                grouped.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for name, series in grouped.items():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(series)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics для Prometheus"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Длительность и ошибки обработчиков aiogram; регистрируется на диспетчере"""
+
+    async def __call__(self, handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_DURATION.labels(name).observe(time.perf_counter() - started)
+
+
+# Глобальный реестр метрик процесса
+metrics = MetricsRegistry()
+metrics_server = MetricsServer(metrics)
+
+HANDLER_DURATION = metrics.histogram(
+    "bot_handler_duration_seconds", "Handler execution time", ["handler"])
+HANDLER_ERRORS = metrics.counter(
+    "bot_handler_errors_total", "Handler calls that raised", ["handler"])
+
+UPSTREAM_DURATION = metrics.histogram(
+    "bot_upstream_request_duration_seconds", "Time to response headers from a provider",
+    ["provider", "endpoint"])
+UPSTREAM_RESPONSES = metrics.counter(
+    "bot_upstream_responses_total", "Provider responses by status code", ["provider", "endpoint", "status"])
+UPSTREAM_BYTES = metrics.counter(
+    "bot_upstream_response_bytes_total", "Response body bytes received from a provider", ["provider", "endpoint"])
+UPSTREAM_ERRORS = metrics.counter(
+    "bot_upstream_errors_total", "Provider requests that failed without a response", ["provider", "endpoint", "error"])
+
+DB_METHOD_DURATION = metrics.histogram(
+    "bot_db_method_duration_seconds", "Database method time including pool wait", ["method"])
+DB_METHOD_ERRORS = metrics.counter(
+    "bot_db_method_errors_total", "Database methods that raised", ["method"])
+DB_POOL_WAIT = metrics.histogram(
+    "bot_db_pool_acquire_seconds", "Wait for a connection from the pool", ["method"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+
+SUBSCRIPTION_CYCLE_DURATION = metrics.histogram(
+    "bot_subscription_cycle_duration_seconds", "Alert check and digest fan-out cycle", ["stage"],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+
+
+@metrics.collector("gauge", "Provider response caches: size and hit ratio")
+def _collect_caches() -> Iterable[Sample]:
+    from services.finance_api import finance_api
+    for cache, stats in finance_api.cache_stats().items():
+        for field in ("size", "hit_ratio"):
+            yield f"bot_cache_{field}", {"cache": cache}, stats[field]
+
+
+@metrics.collector("counter", "Provider response caches: hits, misses, coalesced loads, evictions")
+def _collect_cache_counters() -> Iterable[Sample]:
+    from services.finance_api import finance_api
+    for cache, stats in finance_api.cache_stats().items():
+        for field in ("hits", "misses", "coalesced", "evictions"):
+            yield f"bot_cache_{field}_total", {"cache": cache}, stats[field]
+
+
+@metrics.collector("gauge", "Provider HTTP connection pool")
+def _collect_http_pool() -> Iterable[Sample]:
+    from services.finance_api import finance_api
+    stats = finance_api.pool_stats()
+    for field in ("limit", "in_use", "idle"):
+        yield f"bot_http_pool_{field}", {}, stats[field]
+
+
+@metrics.collector("counter", "Provider HTTP connections: created and reused")
+def _collect_http_pool_counters() -> Iterable[Sample]:
+    from services.finance_api import finance_api
+    stats = finance_api.pool_stats()
+    for field in ("connections_created", "connections_reused"):
+        yield f"bot_http_pool_{field}_total", {}, stats[field]
+
+
+@metrics.collector("gauge", "Provider rate limiters: tokens and queue depth by priority")
+def _collect_limiters() -> Iterable[Sample]:
+    from services.finance_api import finance_api
+    for provider, stats in finance_api.limiter_stats().items():
+        yield "bot_rate_limiter_tokens", {"provider": provider}, stats["tokens"]
+        for priority, depth in stats["queue_depth"].items():
+            yield "bot_rate_limiter_queue_depth", {"provider": provider, "priority": priority}, depth
+
+
+@metrics.collector("counter", "Provider rate limiters: grants by priority")
+def _collect_limiter_counters() -> Iterable[Sample]:
+    from services.finance_api import finance_api
+    for provider, stats in finance_api.limiter_stats().items():
+        for priority, granted in stats["granted"].items():
+            yield "bot_rate_limiter_granted_total", {"provider": provider, "priority": priority}, granted
+
+
+@metrics.collector("gauge", "PostgreSQL connection pool")
+def _collect_db_pool() -> Iterable[Sample]:
+    from database.connection import db
+    if db.pool is None:
+        return
+    yield "bot_db_pool_size", {}, db.pool.get_size()
+    yield "bot_db_pool_idle", {}, db.pool.get_idle_size()
+    yield "bot_db_pool_max_size", {}, db.pool.get_max_size()
+
+
+@metrics.collector("counter", "Named queries: calls, rows, errors, total seconds")
+def _collect_queries() -> Iterable[Sample]:
+    from database.connection import db
+    for query, stats in db.query_stats().items():
+        labels = {"query": query}
+        yield "bot_db_query_calls_total", labels, stats["calls"]
+        yield "bot_db_query_rows_total", labels, stats["rows"]
+        yield "bot_db_query_errors_total", labels, stats["errors"]
+        yield "bot_db_query_seconds_total", labels, stats["avg_ms"] * stats["calls"] / 1000
+
+
+@metrics.collector("gauge", "Write-behind interaction buffer: depth and capacity")
+def _collect_interaction_logger() -> Iterable[Sample]:
+    from services.interaction_logger import interaction_logger
+    stats = interaction_logger.stats()
+    for field in ("depth", "capacity"):
+        yield f"bot_interaction_log_{field}", {}, stats[field]
+
+
+@metrics.collector("counter", "Write-behind interaction buffer: records, flushes and producer waits")
+def _collect_interaction_logger_counters() -> Iterable[Sample]:
+    from services.interaction_logger import interaction_logger
+    stats = interaction_logger.stats()
+    for field in ("enqueued", "written", "dropped", "failed", "retries", "requeued", "users_upserted",
+                  "flushes", "blocked", "blocked_seconds"):
+        yield f"bot_interaction_log_{field}_total", {}, stats[field]
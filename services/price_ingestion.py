@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Set
+from config import settings
+from database.connection import db
+from services.finance_api import finance_api, POPULAR_CRYPTO_IDS, POPULAR_STOCK_SYMBOLS
+from services.rate_limiter import Priority
+
+
+class PriceIngestionService:
+    """Фоновая запись истории котировок в price_ticks.
+
+    Отслеживаются активы из меню, активы с алертами и недавно просмотренные
+    пользователями монеты. Криптовалюты запрашиваются пакетно, котировки акций
+    берутся только из кэша, чтобы не тратить минутную квоту Alpha Vantage.
+    """
+
+    def __init__(self):
+        self.is_running = False
+        self.task = None
+        self.ticks_written = 0
+        self.last_cycle_symbols = 0
+
+    async def start(self):
+        """Запуск сбора истории"""
+        if not self.is_running:
+            self.is_running = True
+            self.task = asyncio.create_task(self._ingestion_loop())
+            print("Price ingestion started")
+
+    async def stop(self):
+        """Остановка сбора истории"""
+        if self.is_running:
+            self.is_running = False
+            if self.task:
+                self.task.cancel()
+                try:
+                    await self.task
+                except asyncio.CancelledError:
+                    pass
+            print("Price ingestion stopped")
+
+    async def _ingestion_loop(self):
+        while self.is_running:
+            try:
+                await self.ingest_once()
+            except Exception as e:
+                print(f"Error in price ingestion: {e}")
+            await asyncio.sleep(settings.price_ingestion_interval)
+
+    async def watched_symbols(self) -> Set[str]:
+        """Символы, по которым собирается история"""
+        symbols = set(POPULAR_CRYPTO_IDS)
+        # Из БД, а не из индекса процесса: в нем только алерты своего шарда
+        symbols.update(await db.get_alerted_symbols())
+        symbols.update(coin_id for coin_id in finance_api.caches["crypto_info"].keys())
+        symbols.update(coin_id for coin_id, _ in finance_api.caches["crypto_price"].keys())
+        return {symbol.lower() for symbol in symbols}
+
+    async def ingest_once(self) -> int:
+        """Один цикл: пакетный запрос цен и запись через COPY"""
+        symbols = await self.watched_symbols()
+        now = datetime.now()
+
+        with finance_api.priority(Priority.DIGESTS):
+            prices = await finance_api.get_crypto_prices(symbols)
+
+        records: List[tuple] = []
+        for coin_id, quotes in prices.items():
+            quote = quotes.get("usd")
+            if quote:
+                records.append((coin_id, now, float(quote['price']),
+                                quote.get('change_24h'), quote.get('market_cap')))
+
+        # Акции — только из кэша котировок
+        stock_cache = finance_api.caches["stock_price"]
+        for symbol in (symbols - prices.keys()) | {s.lower() for s in POPULAR_STOCK_SYMBOLS}:
+            quote = stock_cache.get(symbol.upper())
+            if quote:
+                records.append((symbol, now, float(quote['price']), None, None))
+
+        # Партиции заранее, чтобы COPY не упал на границе суток
+        await db.ensure_price_tick_partitions((now + timedelta(days=1)).date())
+
+        if records:
+            await db.save_price_ticks(records)
+        self.ticks_written += len(records)
+        self.last_cycle_symbols = len(records)
+        return len(records)
+
+
+# Глобальный экземпляр сервиса истории котировок
+price_ingestion = PriceIngestionService()
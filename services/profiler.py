@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Стек, в котором цикл событий ждет ввода-вывода: такие сэмплы считаются простоем
+_IDLE_MODULES = ("selectors",)
+# Кадр цикла, вызывающий колбэк или шаг задачи; все, что ниже, есть в каждом сэмпле
+_CALLBACK_FRAME = "asyncio.events:Handle._run"
+
+
+def running_task_name(loop: asyncio.AbstractEventLoop) -> Optional[str]:
+    """Корутина задачи, которую цикл выполняет прямо сейчас; можно вызывать из другого потока"""
+    try:
+        task = asyncio.current_task(loop)
+    except RuntimeError:
+        return None
+    if task is None:
+        return None
+    return getattr(task.get_coro(), "__qualname__", None) or task.get_name()
+
+
+@dataclass
+class ProfileResult:
+    """Результат профилирования: свернутые стеки и число сэмплов"""
+
+    seconds: float
+    interval: float
+    samples: int = 0
+    idle: int = 0
+    # "корень;...;лист" -> число сэмплов
+    stacks: Counter = field(default_factory=Counter)
+    # Корутина задачи, выполнявшейся в момент сэмпла -> число сэмплов
+    tasks: Counter = field(default_factory=Counter)
+
+    def collapsed(self) -> str:
+        """Формат свернутых стеков (flamegraph.pl, speedscope, inferno)"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+        """Функции по собственному и по полному (с вызванными) числу сэмплов, без простоя"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            if frames[-1].startswith(_IDLE_MODULES):
+                continue
+            own[frames[-1]] += count
+            if _CALLBACK_FRAME in frames:
+                inner = frames[len(frames) - frames[::-1].index(_CALLBACK_FRAME):]
+            else:
+                inner = frames[1:]
+            for frame in set(inner):
+                total[frame] += count
+        return own.most_common(limit), total.most_common(limit)
+
+    def summary(self, limit: int = 15) -> str:
+        busy = self.samples - self.idle
+        lines = [
+            f"Samples: {self.samples} over {self.seconds:.0f}s every {self.interval * 1000:.0f}ms, "
+            f"loop busy {busy / self.samples:.1%}" if self.samples else "No samples collected"
+        ]
+        if not busy:
+            return "\n".join(lines)
+
+        own, total = self.top_functions(limit)
+        for title, rows in (("Self time", own), ("Total time", total), ("Tasks", self.tasks.most_common(limit))):
+            lines.append("")
+            lines.append(f"{title}:")
+            lines.extend(f"{count / busy:6.1%}  {count:6d}  {name}" for name, count in rows)
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потока цикла событий.
+
+    Отдельный поток с заданным интервалом снимает стек потока цикла через
+    sys._current_frames() и запоминает выполнявшуюся задачу asyncio. Цикл не
+    останавливается и не трассируется, поэтому профилировать можно боевой
+    трафик: цена — один обход стека за интервал.
+    """
+
+    def __init__(self, interval: float, output_dir: str):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.running = False
+        self._labels: Dict[CodeType, str] = {}
+
+    async def profile(self, seconds: float) -> ProfileResult:
+        """Профилирование текущего цикла событий в течение seconds"""
+        if self.running:
+            raise RuntimeError("Profiling is already running")
+        self.running = True
+
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        result = ProfileResult(seconds=seconds, interval=self.interval)
+
+        loop_thread = threading.get_ident()
+
+        def finish(error: Optional[BaseException] = None):
+            # Ожидающий мог быть отменен, пока поток сэмплировал
+            if not done.done():
+                if error is None:
+                    done.set_result(result)
+                else:
+                    done.set_exception(error)
+
+        def run():
+            try:
+                self._sample(result, loop_thread, loop)
+                loop.call_soon_threadsafe(finish)
+            except Exception as e:
+                loop.call_soon_threadsafe(finish, e)
+
+        threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+        try:
+            return await done
+        finally:
+            self.running = False
+            self._labels.clear()
+
+    def _sample(self, result: ProfileResult, loop_thread: int, loop: asyncio.AbstractEventLoop):
+        deadline = time.monotonic() + result.seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(loop_thread)
+            if frame is not None:
+                task = running_task_name(loop)
+                stack = self._collapse(frame, task)
+                result.stacks[stack] += 1
+                result.samples += 1
+                if stack.rsplit(";", 1)[-1].startswith(_IDLE_MODULES):
+                    result.idle += 1
+                elif task:
+                    result.tasks[task] += 1
+            time.sleep(self.interval)
+
+    def _label(self, frame: FrameType) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            module = frame.f_globals.get("__name__", "?")
+            label = self._labels[code] = f"{module}:{code.co_qualname}"
+        return label
+
+    def _collapse(self, frame: FrameType, task: Optional[str]) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame))
+            frame = frame.f_back
+        # Корень — задача asyncio: стеки разных обработчиков не смешиваются в flamegraph
+        labels.append(f"task:{task}" if task else "loop")
+        return ";".join(reversed(labels))
+
+    def save(self, result: ProfileResult, limit: int = 30) -> Tuple[str, str]:
+        """Запись свернутых стеков и сводки в output_dir; возвращает пути файлов"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}")
+        with open(f"{base}.folded", "w") as f:
+            f.write(result.collapsed())
+        with open(f"{base}.txt", "w") as f:
+            f.write(result.summary(limit))
+        return f"{base}.folded", f"{base}.txt"
+
+    async def profile_to_files(self, seconds: float):
+        """Профилирование с записью результата в файлы и сводкой в лог"""
+        try:
+            result = await self.profile(seconds)
+        except RuntimeError as e:
+            logger.warning(str(e))
+            return
+        folded, _ = await asyncio.get_running_loop().run_in_executor(None, self.save, result)
+        logger.info(f"Profile written to {folded}\n{result.summary()}")
+
+    def install_signal_handler(self, sig: int = signal.SIGUSR1):
+        """Профилирование по сигналу: kill -USR1 <pid>"""
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(
+            sig, lambda: loop.create_task(self.profile_to_files(settings.profiler_default_seconds))
+        )
+
+    def remove_signal_handler(self, sig: int = signal.SIGUSR1):
+        asyncio.get_running_loop().remove_signal_handler(sig)
+
+
+# Глобальный экземпляр профилировщика
+profiler = SamplingProfiler(settings.profiler_interval, settings.profiler_output_dir)
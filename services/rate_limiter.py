@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class TokenBucket:
+    """Асинхронный token bucket: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        """Ожидание и списание токенов (ожидающие обслуживаются по очереди)"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class Priority(IntEnum):
+    """Классы приоритета запросов к провайдерам (меньше — важнее)"""
+    INTERACTIVE = 0
+    ALERTS = 1
+    DIGESTS = 2
+
+
+class PriorityTokenBucket:
+    """Token bucket с очередью ожидания по приоритетам.
+
+    Когда токенов нет, запрос не отклоняется, а ждет в очереди; освободившийся
+    токен получает самый приоритетный из ожидающих (при равенстве — самый ранний).
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        self.granted = {priority: 0 for priority in Priority}
+        self.wait_seconds = {priority: 0.0 for priority in Priority}
+        self.max_wait_seconds = {priority: 0.0 for priority in Priority}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Ожидание токена с учетом приоритета"""
+        started = time.monotonic()
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            self._record(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Токен уже выдан, но ожидающий отменен — возвращаем токен
+                self._tokens += 1
+                self._schedule()
+            raise
+        self._record(priority, time.monotonic() - started)
+
+    def _schedule(self):
+        if self._wakeup is not None or not self._waiters:
+            return
+        delay = max(0.0, (1 - self._tokens) / self.rate)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._wakeup = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            future.set_result(None)
+            self._tokens -= 1
+        # Отмененные ожидающие в голове очереди не должны удерживать таймер
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+    def _record(self, priority: Priority, waited: float):
+        self.granted[priority] += 1
+        self.wait_seconds[priority] += waited
+        self.max_wait_seconds[priority] = max(self.max_wait_seconds[priority], waited)
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди и время ожидания по приоритетам"""
+        self._refill()
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+
+        return {
+            "tokens": self._tokens,
+            "queue_depth": depth,
+            "granted": {p.name.lower(): n for p, n in self.granted.items()},
+            "avg_wait_seconds": {
+                p.name.lower(): self.wait_seconds[p] / self.granted[p] if self.granted[p] else 0.0
+                for p in Priority
+            },
+            "max_wait_seconds": {p.name.lower(): w for p, w in self.max_wait_seconds.items()},
+        }
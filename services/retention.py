@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date
+from typing import Dict, Optional
+from config import settings
+from database.connection import db
+from database.migrations import shift_month
+
+
+class RetentionService:
+    """Ротация истории взаимодействий.
+
+    Месячные партиции user_interactions старше interaction_hot_months переносятся
+    в архив (тексты ответов — в словарь без повторов) и удаляются целиком.
+    Архивные партиции старше interaction_archive_months тоже удаляются целиком,
+    без DELETE по строкам.
+    """
+
+    def __init__(self):
+        self.is_running = False
+        self.task = None
+        self.partitions_archived = 0
+        self.rows_archived = 0
+        self.partitions_dropped = 0
+        self.responses_purged = 0
+
+    async def start(self):
+        """Запуск ротации истории"""
+        if not self.is_running:
+            self.is_running = True
+            self.task = asyncio.create_task(self._retention_loop())
+            print("Retention service started")
+
+    async def stop(self):
+        """Остановка ротации истории"""
+        if self.is_running:
+            self.is_running = False
+            if self.task:
+                self.task.cancel()
+                try:
+                    await self.task
+                except asyncio.CancelledError:
+                    pass
+            print("Retention service stopped")
+
+    async def _retention_loop(self):
+        while self.is_running:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Error in retention: {e}")
+            await asyncio.sleep(settings.retention_interval)
+
+    async def run_once(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Один проход: архивация старых партиций и удаление устаревшего архива"""
+        current = (today or date.today()).replace(day=1)
+        hot_cutoff = shift_month(current, -settings.interaction_hot_months)
+        archive_cutoff = shift_month(current, -settings.interaction_archive_months)
+        archived = dropped = 0
+
+        for month in sorted(await db.get_partitions('user_interactions')):
+            if month < hot_cutoff:
+                self.rows_archived += await db.archive_interaction_partition(month)
+                archived += 1
+
+        for month in sorted(await db.get_partitions('user_interactions_archive')):
+            if month < archive_cutoff:
+                await db.drop_archive_partition(month)
+                dropped += 1
+
+        purged = await db.purge_interaction_responses(archive_cutoff)
+
+        self.partitions_archived += archived
+        self.partitions_dropped += dropped
+        self.responses_purged += purged
+        return {"archived": archived, "dropped": dropped, "responses_purged": purged}
+
+
+# Глобальный экземпляр сервиса хранения истории
+retention_service = RetentionService()
@@ -0,0 +1,118 @@
+import asyncio
+import json
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+from config import settings
+from database.connection import Database, db
+
+
+class SharedCache:
+    """Общий для процессов кэш ответов провайдеров в PostgreSQL.
+
+    Служит вторым уровнем для TTLCache: воркеры runner'а видят котировки, уже
+    полученные соседями, и не тратят на них общий лимит провайдера. Таблица
+    api_cache нежурналируемая — при сбое БД кэш просто теряется.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._purge_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        return json.dumps(key, ensure_ascii=False, default=str)
+
+    async def get_many(self, namespace: str, keys: Iterable[Hashable]) -> Dict[Hashable, Tuple[Any, float]]:
+        """Неустаревшие значения: {ключ: (значение, оставшееся время жизни)}"""
+        encoded = {self._key(key): key for key in keys}
+        if not encoded:
+            return {}
+
+        try:
+            async with self.database.acquire("SharedCache.get_many") as conn:
+                rows = await conn.fetch('''
+                    SELECT key, value, extract(epoch FROM expires_at - CURRENT_TIMESTAMP) AS ttl
+                    FROM api_cache
+                    WHERE namespace = $1 AND key = ANY($2::text[]) AND expires_at > CURRENT_TIMESTAMP
+                ''', namespace, list(encoded))
+        except Exception as e:
+            self.errors += 1
+            print(f"Error reading shared cache: {e}")
+            return {}
+
+        found = {encoded[row['key']]: (json.loads(row['value']), float(row['ttl'])) for row in rows}
+        self.hits += len(found)
+        self.misses += len(encoded) - len(found)
+        return found
+
+    async def get(self, namespace: str, key: Hashable) -> Optional[Tuple[Any, float]]:
+        return (await self.get_many(namespace, [key])).get(key)
+
+    async def set_many(self, namespace: str, items: Dict[Hashable, Any], ttl: float):
+        """Сохранение значений одной командой"""
+        if not items:
+            return
+
+        keys = [self._key(key) for key in items]
+        values = [json.dumps(value, ensure_ascii=False, default=str) for value in items.values()]
+        try:
+            async with self.database.acquire("SharedCache.set_many") as conn:
+                await conn.execute('''
+                    INSERT INTO api_cache (namespace, key, value, expires_at)
+                    SELECT $1, k, v::jsonb, CURRENT_TIMESTAMP + make_interval(secs => $4)
+                    FROM unnest($2::text[], $3::text[]) AS t(k, v)
+                    ON CONFLICT (namespace, key) DO UPDATE
+                    SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at
+                ''', namespace, keys, values, float(ttl))
+        except Exception as e:
+            self.errors += 1
+            print(f"Error writing shared cache: {e}")
+
+    async def set(self, namespace: str, key: Hashable, value: Any, ttl: float):
+        await self.set_many(namespace, {key: value}, ttl)
+
+    async def purge_expired(self) -> int:
+        """Удаление устаревших записей"""
+        async with self.database.acquire("SharedCache.purge_expired") as conn:
+            result = await conn.execute('''
+                DELETE FROM api_cache
+                WHERE expires_at <= CURRENT_TIMESTAMP
+            ''')
+        return int(result.split()[-1])
+
+    async def start_purge(self):
+        """Фоновая очистка; достаточно одного процесса на кластер"""
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def stop_purge(self):
+        if self._purge_task:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(settings.shared_cache_purge_interval)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                print(f"Error purging shared cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Глобальный экземпляр общего кэша
+shared_cache = SharedCache(db)
@@ -1,19 +1,38 @@
 import asyncio
 import random
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional
+from aiogram import Bot
+from config import settings
 from database.connection import db
+from database.models import PriceAlert, UserSubscription
+from services.alert_index import alert_index
+from services.fanout import FanoutSender, FanoutStats
 from services.finance_api import finance_api
+from services.metrics import SUBSCRIPTION_CYCLE_DURATION
+from services.rate_limiter import Priority
 
 
 class SubscriptionService:
     def __init__(self):
         self.is_running = False
         self.task = None
+        self.sender: Optional[FanoutSender] = None
+        self.last_cycle_stats: Dict[str, FanoutStats] = {}
+        self.alert_index_loaded_at = 0.0
     
-    async def start_subscription_service(self):
+    async def start_subscription_service(self, bot: Optional[Bot] = None):
         """Запуск сервиса подписок"""
         if not self.is_running:
+            if bot is not None:
+                self.sender = FanoutSender(
+                    bot,
+                    global_rate=settings.telegram_global_rate,
+                    chat_interval=settings.telegram_chat_interval,
+                    concurrency=settings.fanout_concurrency,
+                    max_retries=settings.fanout_max_retries
+                )
             self.is_running = True
             self.task = asyncio.create_task(self._subscription_loop())
             print("Subscription service started")
@@ -34,54 +53,91 @@ class SubscriptionService:
         """Основной цикл сервиса подписок"""
         while self.is_running:
             try:
+                started = time.perf_counter()
+                await self.check_price_alerts()
+                alerts_done = time.perf_counter()
                 await self._process_subscriptions()
+                finished = time.perf_counter()
+                SUBSCRIPTION_CYCLE_DURATION.labels("alerts").observe(alerts_done - started)
+                SUBSCRIPTION_CYCLE_DURATION.labels("digests").observe(finished - alerts_done)
                 await asyncio.sleep(300)  # Проверка каждые 5 минут
             except Exception as e:
                 print(f"Error in subscription loop: {e}")
                 await asyncio.sleep(60)  # Пауза при ошибке
     
     async def _process_subscriptions(self):
-        """Обработка активных подписок"""
-        # Получаем всех пользователей с активными подписками
-        subscriptions = await self._get_all_active_subscriptions()
+        """Обработка активных подписок: текст рендерится один раз на тип и рассылается всем"""
+        renderers = {
+            'crypto': self._render_crypto_update,
+            'stocks': self._render_stocks_update,
+            'news': self._render_news_update,
+        }
         
-        for sub in subscriptions:
-            try:
-                if sub.subscription_type == 'crypto':
-                    await self._send_crypto_update(sub.user_id)
-                elif sub.subscription_type == 'stocks':
-                    await self._send_stocks_update(sub.user_id)
-                elif sub.subscription_type == 'news':
-                    await self._send_news_update(sub.user_id)
-            except Exception as e:
-                print(f"Error processing subscription for user {sub.user_id}: {e}")
+        # Дайджесты используют квоту провайдеров в последнюю очередь
+        with finance_api.priority(Priority.DIGESTS):
+            results = await asyncio.gather(*(
+                self._fan_out(subscription_type, render)
+                for subscription_type, render in renderers.items()
+            ), return_exceptions=True)
+        
+        for subscription_type, result in zip(renderers, results):
+            if isinstance(result, Exception):
+                print(f"Error processing {subscription_type} subscriptions: {result}")
+            elif result is not None:
+                self.last_cycle_stats[subscription_type] = result
+                print(f"Subscription fan-out {subscription_type}: {result}")
+    
+    async def _fan_out(self, subscription_type: str, render) -> Optional[FanoutStats]:
+        """Рассылка одного отрендеренного сообщения всем подписчикам типа"""
+        message = await render()
+        if not message:
+            return None
+        
+        recipients = self._iter_subscribers(subscription_type)
+        if self.sender is None:
+            # Бот не передан — только считаем получателей
+            stats = FanoutStats()
+            async for user_id in recipients:
+                stats.recipients += 1
+            print(f"Would send {subscription_type} update to {stats.recipients} users: {message[:100]}...")
+            return stats
+        
+        return await self.sender.broadcast(recipients, message)
     
-    async def _get_all_active_subscriptions(self):
-        """Получение всех активных подписок"""
-        # Здесь должна быть логика получения подписок из БД
-        # Пока возвращаем пустой список
-        return []
+    async def _iter_subscribers(self, subscription_type: str) -> AsyncIterator[int]:
+        async for subscriptions in self._get_all_active_subscriptions(subscription_type):
+            for sub in subscriptions:
+                yield sub.user_id
     
-    async def _send_crypto_update(self, user_id: int):
-        """Отправка обновления по криптовалютам"""
+    def _get_all_active_subscriptions(self, subscription_type: Optional[str] = None) -> AsyncIterator[List[UserSubscription]]:
+        """Получение всех активных подписок (пачками)"""
+        return db.iter_active_subscriptions(subscription_type=subscription_type)
+    
+    async def _render_crypto_update(self) -> Optional[str]:
+        """Текст обновления по криптовалютам (None, если данных нет)"""
         # Получаем трендовые криптовалюты
         trending = await finance_api.get_trending_cryptos()
         
         if trending:
+            top = trending[:5]
+            prices = await finance_api.get_crypto_prices(coin['id'] for coin in top)
+            
             message = "🔥 Обновление по криптовалютам:\n\n"
-            for i, coin in enumerate(trending[:5], 1):
+            for i, coin in enumerate(top, 1):
                 message += f"{i}. {coin['name']} ({coin['symbol']})\n"
                 if coin['market_cap_rank']:
                     message += f"   Ранг: #{coin['market_cap_rank']}\n"
+                usd = prices.get(coin['id'], {}).get("usd")
+                if usd:
+                    message += f"   Цена: ${usd['price']:,.2f}\n"
                 message += f"   Цена в BTC: {coin['price_btc']:.8f}\n\n"
             
             message += "💡 Используйте /trending для получения полного списка"
-            
-            # Здесь должна быть отправка сообщения пользователю
-            print(f"Would send crypto update to user {user_id}: {message[:100]}...")
+            return message
+        return None
     
-    async def _send_stocks_update(self, user_id: int):
-        """Отправка обновления по акциям"""
+    async def _render_stocks_update(self) -> Optional[str]:
+        """Текст обновления по акциям"""
         # Эмуляция данных по акциям
         stocks_data = [
             {"symbol": "AAPL", "change": "+2.5%"},
@@ -97,12 +153,10 @@ class SubscriptionService:
             message += f"{emoji} {stock['symbol']}: {stock['change']}\n"
         
         message += "\n💡 Используйте /price <символ> для получения подробной информации"
-        
-        # Здесь должна быть отправка сообщения пользователю
-        print(f"Would send stocks update to user {user_id}: {message[:100]}...")
+        return message
     
-    async def _send_news_update(self, user_id: int):
-        """Отправка финансовых новостей"""
+    async def _render_news_update(self) -> Optional[str]:
+        """Текст финансовых новостей"""
         # Эмуляция финансовых новостей
         news_items = [
             "📰 Bitcoin достиг нового максимума года",
@@ -117,9 +171,7 @@ class SubscriptionService:
             message += f"{i}. {news}\n"
         
         message += "\n💡 Оставайтесь в курсе событий!"
-        
-        # Здесь должна быть отправка сообщения пользователю
-        print(f"Would send news update to user {user_id}: {message[:100]}...")
+        return message
     
     async def send_welcome_message(self, user_id: int, subscription_type: str):
         """Отправка приветственного сообщения при подписке"""
@@ -132,8 +184,7 @@ class SubscriptionService:
         message = messages.get(subscription_type, "Добро пожаловать!")
         message += "\n\n💡 Используйте /subscriptions для управления подписками"
         
-        # Здесь должна быть отправка сообщения пользователю
-        print(f"Would send welcome message to user {user_id}: {message}")
+        await self._send_message(user_id, message)
     
     async def send_price_alert(self, user_id: int, symbol: str, current_price: float, target_price: float, alert_type: str):
         """Отправка ценового алерта"""
@@ -152,69 +203,94 @@ class SubscriptionService:
 💡 Используйте /alerts для управления алертами
         """
         
-        # Здесь должна быть отправка сообщения пользователю
-        print(f"Would send price alert to user {user_id}: {message}")
+        await self._send_message(user_id, message)
+    
+    async def _send_message(self, user_id: int, message: str):
+        """Отправка одиночного сообщения через общий ограничитель скорости"""
+        if self.sender is None:
+            print(f"Would send message to user {user_id}: {message}")
+            return
+        await self.sender.send(user_id, message)
     
     async def check_price_alerts(self):
         """Проверка и отправка ценовых алертов"""
-        # Получаем все активные алерты
-        alerts = await self._get_all_active_alerts()
+        await self.sync_alert_index()
         
-        for alert in alerts:
-            try:
-                # Получаем текущую цену
-                current_price = await self._get_current_price(alert.symbol)
-                
-                if current_price is not None:
-                    should_trigger = False
-                    
-                    if alert.alert_type == "above" and current_price >= alert.target_price:
-                        should_trigger = True
-                    elif alert.alert_type == "below" and current_price <= alert.target_price:
-                        should_trigger = True
-                    
-                    if should_trigger:
-                        await self.send_price_alert(
-                            alert.user_id,
-                            alert.symbol,
-                            current_price,
-                            alert.target_price,
-                            alert.alert_type
-                        )
-                        # Деактивируем алерт
-                        await self._deactivate_alert(alert.id)
-                        
-            except Exception as e:
-                print(f"Error checking alert {alert.id}: {e}")
-    
-    async def _get_all_active_alerts(self):
-        """Получение всех активных алертов"""
-        # Здесь должна быть логика получения алертов из БД
-        # Пока возвращаем пустой список
-        return []
-    
-    async def _get_current_price(self, symbol: str) -> float:
-        """Получение текущей цены актива"""
-        try:
-            # Пробуем получить цену криптовалюты
-            crypto_info = await finance_api.get_crypto_info(symbol.lower())
-            if crypto_info:
-                return crypto_info['current_price']
-            
-            # Пробуем получить цену акции
+        # Одна цена на символ, сработавшие алерты ищем по индексу
+        with finance_api.priority(Priority.ALERTS):
+            prices = await self._get_current_prices(alert_index.symbols())
+        
+        for symbol, current_price in prices.items():
+            for alert in alert_index.triggered(symbol, current_price):
+                try:
+                    # Сначала деактивируем: алерт, удаленный пользователем после
+                    # синхронизации индекса, не сработает
+                    if not await self._deactivate_alert(alert.id):
+                        continue
+                    await self.send_price_alert(
+                        alert.user_id,
+                        alert.symbol,
+                        current_price,
+                        alert.target_price,
+                        alert.alert_type
+                    )
+                except Exception as e:
+                    print(f"Error checking alert {alert.id}: {e}")
+    
+    async def sync_alert_index(self):
+        """Приведение индекса к БД: алерты создают и удаляют и другие процессы (реплики, воркеры)
+
+        Каждый цикл дочитываются алерты с id больше уже известных и убираются
+        удаленные и неактивные. Полная перезагрузка раз в alert_index_reload_interval
+        подбирает алерты, чья транзакция зафиксировалась позже транзакции с большим id.
+        """
+        if not alert_index.loaded or time.monotonic() - self.alert_index_loaded_at >= settings.alert_index_reload_interval:
+            await self.load_alert_index()
+            return
+        
+        async for alerts in self._get_all_active_alerts(after_id=alert_index.max_id):
+            for alert in alerts:
+                alert_index.add(alert)
+        
+        known = alert_index.ids()
+        for alert_id in set(known) - await db.get_active_alert_ids(known):
+            alert_index.remove(alert_id)
+    
+    async def load_alert_index(self):
+        """Загрузка активных алертов в индекс"""
+        alert_index.clear()
+        async for alerts in self._get_all_active_alerts():
+            for alert in alerts:
+                alert_index.add(alert)
+        alert_index.loaded = True
+        self.alert_index_loaded_at = time.monotonic()
+    
+    def _get_all_active_alerts(self, after_id: int = 0) -> AsyncIterator[List[PriceAlert]]:
+        """Получение всех активных алертов (пачками)"""
+        return db.iter_active_alerts(after_id=after_id)
+    
+    async def _get_current_prices(self, symbols) -> Dict[str, float]:
+        """Текущие цены набора символов: криптовалюты одним пакетным запросом, остальное по одному"""
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        
+        crypto_prices = await finance_api.get_crypto_prices(symbol.lower() for symbol in symbols)
+        prices = {}
+        for symbol in symbols:
+            quote = crypto_prices.get(symbol.lower(), {}).get("usd")
+            if quote:
+                prices[symbol] = quote['price']
+                continue
+            # Не криптовалюта — пробуем как акцию
             stock_info = await finance_api.get_stock_price(symbol.upper())
             if stock_info:
-                return stock_info['price']
-            
-            return None
-        except Exception as e:
-            print(f"Error getting price for {symbol}: {e}")
-            return None
+                prices[symbol] = stock_info['price']
+        return prices
     
-    async def _deactivate_alert(self, alert_id: int):
-        """Деактивация алерта"""
-        # Здесь должна быть логика обновления БД
-        print(f"Would deactivate alert {alert_id}")
+    async def _deactivate_alert(self, alert_id: int) -> bool:
+        """Деактивация алерта; False — алерт уже удален или деактивирован"""
+        return await db.deactivate_price_alert(alert_id)
 
 
 # Глобальный экземпляр сервиса подписок
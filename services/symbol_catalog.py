@@ -0,0 +1,234 @@
+import asyncio
+import bisect
+import time
+from dataclasses import astuple, dataclass
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from services.finance_api import finance_api
+from services.rate_limiter import Priority
+from services.shared_cache import SharedCache, shared_cache
+
+# Снимок справочника в общем кэше (api_cache): версия читается при каждом опросе,
+# записи — только когда версия сменилась
+SNAPSHOT_NAMESPACE = "symbol_catalog"
+
+
+@dataclass
+class SymbolEntry:
+    kind: str  # 'crypto' or 'stock'
+    id: str  # id CoinGecko или тикер акции
+    symbol: str
+    name: str
+    rank: Optional[int] = None
+
+
+def _rank_key(entry: SymbolEntry) -> Tuple[int, int, str]:
+    # Монеты с рангом — по рангу, затем акции, затем монеты без ранга
+    if entry.rank is not None:
+        return (0, entry.rank, entry.id)
+    return (1 if entry.kind == "stock" else 2, 0, entry.id)
+
+
+class SymbolCatalog:
+    """Локальный справочник активов для разрешения свободного текста без запросов к API.
+
+    Точные совпадения ищутся по словарям (id, тикер, символ, название), префиксы —
+    бинарным поиском по отсортированному массиву ключей.
+
+    Из CoinGecko /coins/list и списка тикеров Alpha Vantage справочник загружает
+    один процесс в кластере (start_refresh, задача владельца блокировки background)
+    и публикует снимок в общем кэше. Остальные процессы только читают снимок
+    (start), не расходуя на справочник свою долю лимитов провайдеров.
+    """
+
+    def __init__(self, shared: SharedCache):
+        self.shared = shared
+        self.by_id: Dict[str, SymbolEntry] = {}
+        self.stocks: Dict[str, SymbolEntry] = {}
+        self.by_symbol: Dict[str, List[SymbolEntry]] = {}
+        self.by_name: Dict[str, List[SymbolEntry]] = {}
+        self._prefix_keys: List[str] = []
+        self._prefix_entries: List[SymbolEntry] = []
+        self.loaded = False
+        self.version: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.by_id) + len(self.stocks)
+
+    async def start(self):
+        """Запуск фоновой загрузки снимка из общего кэша"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._load_loop())
+
+    async def stop(self):
+        await self.stop_refresh()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def start_refresh(self):
+        """Запуск обновления из API провайдеров; достаточно одного процесса на кластер"""
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresh(self):
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+            self.refresh_task = None
+
+    async def _load_loop(self):
+        while True:
+            try:
+                await self.load_shared()
+            except Exception as e:
+                print(f"Error loading symbol catalog snapshot: {e}")
+            await asyncio.sleep(settings.symbol_catalog_poll_interval if self.loaded else 30)
+
+    async def _refresh_loop(self):
+        interval = settings.symbol_catalog_refresh_interval
+        while True:
+            try:
+                # Снимок, опубликованный прежним владельцем, еще свежий — провайдеров не трогаем
+                snapshot = await self.shared.get(SNAPSHOT_NAMESPACE, "version")
+                fresh_for = snapshot[1] - interval if snapshot else 0
+                if fresh_for > 0:
+                    await self.load_shared()
+                    await asyncio.sleep(fresh_for)
+                    continue
+                loaded = await self.refresh()
+                if loaded:
+                    await self.publish()
+            except Exception as e:
+                print(f"Error refreshing symbol catalog: {e}")
+                loaded = False
+            await asyncio.sleep(interval if loaded else 300)
+
+    async def publish(self):
+        """Запись текущего справочника в общий кэш; снимок живет два интервала обновления"""
+        entries = [astuple(entry) for entry in (*self.by_id.values(), *self.stocks.values())]
+        version = time.time()
+        await self.shared.set_many(SNAPSHOT_NAMESPACE, {"entries": entries, "version": version},
+                                   settings.symbol_catalog_refresh_interval * 2)
+        self.version = version
+
+    async def load_shared(self) -> bool:
+        """Загрузка снимка из общего кэша, если его версия новее загруженной"""
+        snapshot = await self.shared.get(SNAPSHOT_NAMESPACE, "version")
+        if snapshot is None or snapshot[0] == self.version:
+            return False
+        version = snapshot[0]
+        found = await self.shared.get(SNAPSHOT_NAMESPACE, "entries")
+        if not found:
+            return False
+        self.build([SymbolEntry(*row) for row in found[0]])
+        self.version = version
+        print(f"Symbol catalog snapshot loaded: {len(self.by_id)} coins, {len(self.stocks)} stocks")
+        return True
+
+    async def refresh(self) -> bool:
+        """Загрузка справочника; при пустом ответе провайдера старые данные сохраняются"""
+        with finance_api.priority(Priority.DIGESTS):
+            coins, ranks, stocks = await asyncio.gather(
+                finance_api.get_coin_list(),
+                finance_api.get_coin_ranks(settings.symbol_catalog_rank_pages),
+                finance_api.get_stock_listing()
+            )
+        if not coins:
+            return False
+
+        entries = [
+            SymbolEntry(
+                kind="crypto",
+                id=coin["id"],
+                symbol=(coin.get("symbol") or "").lower(),
+                name=coin.get("name") or coin["id"],
+                rank=ranks.get(coin["id"])
+            )
+            for coin in coins
+            if coin.get("id")
+        ]
+        entries.extend(
+            SymbolEntry(kind="stock", id=stock["symbol"].upper(), symbol=stock["symbol"].lower(), name=stock["name"])
+            for stock in stocks
+        )
+        self.build(entries)
+        print(f"Symbol catalog loaded: {len(self.by_id)} coins, {len(self.stocks)} stocks")
+        return True
+
+    def build(self, entries: List[SymbolEntry]):
+        """Построение индексов и атомарная замена текущих"""
+        by_id, stocks, by_symbol, by_name = {}, {}, {}, {}
+        prefix: Dict[str, List[SymbolEntry]] = {}
+
+        for entry in sorted(entries, key=_rank_key):
+            if entry.kind == "crypto":
+                by_id[entry.id] = entry
+                if entry.symbol:
+                    by_symbol.setdefault(entry.symbol, []).append(entry)
+            else:
+                stocks[entry.id] = entry
+            by_name.setdefault(entry.name.lower(), []).append(entry)
+
+            for key in {entry.id.lower(), entry.symbol, entry.name.lower()}:
+                if key:
+                    prefix.setdefault(key, []).append(entry)
+
+        keys, values = [], []
+        for key in sorted(prefix):
+            for entry in prefix[key]:
+                keys.append(key)
+                values.append(entry)
+
+        self.by_id, self.stocks, self.by_symbol, self.by_name = by_id, stocks, by_symbol, by_name
+        self._prefix_keys, self._prefix_entries = keys, values
+        self.loaded = True
+
+    def resolve(self, query: str) -> Optional[SymbolEntry]:
+        """Точное разрешение запроса: id монеты, символ монеты, тикер акции, название"""
+        text = query.strip().lower()
+        if not text:
+            return None
+
+        if text in self.by_id:
+            return self.by_id[text]
+
+        # Списки отсортированы по рангу — первым идет самый крупный актив.
+        # Монета из рейтинга важнее одноименного тикера, тикер — важнее безранговой монеты
+        symbols = self.by_symbol.get(text)
+        if symbols and symbols[0].rank is not None:
+            return symbols[0]
+        if text.upper() in self.stocks:
+            return self.stocks[text.upper()]
+        matches = symbols or self.by_name.get(text)
+        return matches[0] if matches else None
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[SymbolEntry]:
+        """Активы, у которых id, символ или название начинаются с prefix (по рангу)"""
+        text = prefix.strip().lower()
+        if not text:
+            return []
+
+        start = bisect.bisect_left(self._prefix_keys, text)
+        found = {}
+        scan_limit = start + settings.symbol_catalog_scan_limit
+        for i in range(start, min(len(self._prefix_keys), scan_limit)):
+            if not self._prefix_keys[i].startswith(text):
+                break
+            entry = self._prefix_entries[i]
+            found[(entry.kind, entry.id)] = entry
+
+        return sorted(found.values(), key=_rank_key)[:limit]
+
+
+# Глобальный справочник символов
+symbol_catalog = SymbolCatalog(shared_cache)
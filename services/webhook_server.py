@@ -0,0 +1,131 @@
+import asyncio
+import hmac
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+UpdateHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Прием обновлений Telegram через webhook.
+
+    Запрос проверяется по секретному токену, кладется в ограниченную очередь и
+    сразу подтверждается; обработку выполняют workers фоновых задач. При
+    переполненной очереди отвечаем 503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, on_update: UpdateHandler, path: str, secret_token: Optional[str] = None,
+                 workers: int = 32, queue_size: int = 1000,
+                 readiness: Optional[Callable[[], bool]] = None):
+        self.on_update = on_update
+        self.path = path
+        self.secret_token = secret_token
+        self.workers = workers
+        self.readiness = readiness
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        self.accepting = False
+
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        app.router.add_get("/health", self._handle_health)
+        app.router.add_get("/ready", self._handle_ready)
+        return app
+
+    async def start(self, host: str, port: int):
+        """Запуск обработчиков и HTTP-сервера"""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.accepting = True
+        logger.info(f"Webhook server listening on {host}:{port}{self.path}")
+
+    async def stop(self):
+        """Остановка приема и дообработка уже принятых обновлений"""
+        self.accepting = False
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def is_ready(self) -> bool:
+        return self.accepting and (self.readiness is None or self.readiness())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+        }
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            return web.Response(status=401)
+        if not self.accepting:
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        # Обновление Telegram — всегда объект; остальное до воркеров не доходит
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        self.received += 1
+        return web.Response()
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def _handle_ready(self, request: web.Request) -> web.Response:
+        if not self.is_ready():
+            return web.json_response({"status": "not ready"}, status=503)
+        return web.json_response({"status": "ready", **self.stats()})
+
+    async def _worker(self):
+        while True:
+            data = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self.on_update(data)
+                self.processed += 1
+            except Exception:
+                # Воркер не должен завершаться из-за одного обновления, иначе очередь
+                # перестанет разбираться, а прием продолжит отвечать 200
+                self.failed += 1
+                logger.exception("Error processing update")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
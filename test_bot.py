@@ -6,10 +6,10 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import settings
 from database.connection import db
+from database.fsm_storage import create_fsm_storage
 from services.finance_api import finance_api
 from handlers import menu, messages
 
@@ -25,7 +25,7 @@ async def test_bot():
     try:
         # Создаем бота
         bot = Bot(token=settings.bot_token)
-        dp = Dispatcher(storage=MemoryStorage())
+        dp = Dispatcher(storage=create_fsm_storage())
         
         # Подключаемся к БД
         print("📊 Подключение к базе данных...")
@@ -0,0 +1,4 @@
+import os
+
+# Settings() требует токен; тестам он не нужен, сеть и БД не используются
+os.environ.setdefault("BOT_TOKEN", "0:test")
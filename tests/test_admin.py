@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message, Update, User
+from handlers import admin, messages
+
+
+class RecordingSession(BaseSession):
+    """Сессия Bot API без сети: запоминает отправленные сообщения"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def make_request(self, bot, method, timeout=None):
+        assert isinstance(method, SendMessage)
+        self.sent.append(method.text)
+        return Message(message_id=len(self.sent), date=datetime.now(),
+                       chat=Chat(id=method.chat_id, type="private"), text=method.text)
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+def test_non_admin_profile_is_answered_and_not_resolved_as_a_query(monkeypatch):
+    queries = []
+
+    async def process_finance_query(query):
+        queries.append(query)
+        return "quote"
+
+    monkeypatch.setattr(messages, "process_finance_query", process_finance_query)
+    monkeypatch.setattr(admin, "profiler", None)
+
+    async def scenario():
+        session = RecordingSession()
+        bot = Bot("42:test", session=session)
+        dp = Dispatcher()
+        dp.include_routers(admin.router, messages.router)
+
+        user = User(id=777, is_bot=False, first_name="Test")
+        update = Update(update_id=1, message=Message(
+            message_id=1, date=datetime.now(), chat=Chat(id=777, type="private"),
+            from_user=user, text="/profile 5"))
+        await dp.feed_update(bot, update)
+
+        assert session.sent == ["⛔ Команда доступна только администраторам."]
+        assert queries == []
+
+    asyncio.run(scenario())
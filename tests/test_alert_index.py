@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from services.alert_index import AlertIndex
+
+
+def make_alert(alert_id, target_price, alert_type, symbol="bitcoin", is_active=True):
+    return SimpleNamespace(id=alert_id, user_id=1, symbol=symbol, target_price=target_price,
+                           alert_type=alert_type, is_active=is_active)
+
+
+def triggered_ids(index, symbol, price):
+    return sorted(alert.id for alert in index.triggered(symbol, price))
+
+
+def test_above_fires_at_and_over_target():
+    index = AlertIndex()
+    index.add(make_alert(1, 100.0, "above"))
+    index.add(make_alert(2, 150.0, "above"))
+
+    assert triggered_ids(index, "bitcoin", 99.99) == []
+    assert triggered_ids(index, "bitcoin", 100.0) == [1]
+    assert triggered_ids(index, "bitcoin", 150.0) == [1, 2]
+
+
+def test_below_fires_at_and_under_target():
+    index = AlertIndex()
+    index.add(make_alert(1, 100.0, "below"))
+    index.add(make_alert(2, 50.0, "below"))
+
+    assert triggered_ids(index, "bitcoin", 100.01) == []
+    assert triggered_ids(index, "bitcoin", 100.0) == [1]
+    assert triggered_ids(index, "bitcoin", 50.0) == [1, 2]
+
+
+def test_equal_targets_are_kept_apart_by_id():
+    index = AlertIndex()
+    for alert_id in (3, 1, 2):
+        index.add(make_alert(alert_id, 100.0, "above"))
+
+    assert triggered_ids(index, "bitcoin", 100.0) == [1, 2, 3]
+    assert index.remove(2)
+    assert triggered_ids(index, "bitcoin", 100.0) == [1, 3]
+
+
+def test_symbols_are_case_insensitive_and_removed_when_empty():
+    index = AlertIndex()
+    index.add(make_alert(1, 10.0, "below", symbol="AAPL"))
+
+    assert index.symbols() == ["aapl"]
+    assert triggered_ids(index, "aapl", 9.0) == [1]
+    assert index.remove(1)
+    assert not index.remove(1)
+    assert index.symbols() == []
+
+
+def test_inactive_and_duplicate_alerts_are_ignored():
+    index = AlertIndex()
+    index.add(make_alert(1, 10.0, "above", is_active=False))
+    index.add(make_alert(2, 10.0, "above"))
+    index.add(make_alert(2, 10.0, "above"))
+
+    assert len(index) == 1
+    assert index.max_id == 2
+    assert triggered_ids(index, "bitcoin", 10.0) == [2]
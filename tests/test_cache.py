@@ -0,0 +1,96 @@
+import asyncio
+from services.cache import TTLCache
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        calls = 0
+        release = asyncio.Event()
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"price": 1}
+
+        waiters = [asyncio.ensure_future(cache.get_or_load("btc", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+
+        assert calls == 1
+        assert results == [{"price": 1}] * 5
+        assert await cache.get_or_load("btc", loader) == {"price": 1}
+        stats = cache.stats()
+        assert (stats["misses"], stats["coalesced"], stats["hits"], stats["inflight"]) == (1, 4, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_load_survives_until_last_waiter_is_cancelled():
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def loader():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.ensure_future(cache.get_or_load("btc", loader))
+        second = asyncio.ensure_future(cache.get_or_load("btc", loader))
+        await started.wait()
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+        assert cache.stats()["inflight"] == 1
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        assert cache.stats()["inflight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_empty_results_are_not_cached():
+    async def scenario():
+        cache = TTLCache(ttl=60)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            return None
+
+        assert await cache.get_or_load("btc", loader) is None
+        assert await cache.get_or_load("btc", loader) is None
+        assert calls == 2
+        assert len(cache) == 0
+
+    asyncio.run(scenario())
+
+
+def test_lru_eviction_and_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10, max_size=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    now[0] += 10
+    assert cache.get("a") is None
+    assert len(cache) == 1
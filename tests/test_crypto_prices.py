@@ -0,0 +1,73 @@
+import asyncio
+from config import settings
+from services.finance_api import FinanceAPIService
+
+
+def quote(coin_id, currency):
+    return {"symbol": coin_id.upper(), "price": 1.0, "change_24h": 0, "market_cap": 0,
+            "currency": currency.upper()}
+
+
+def make_service(unknown=()):
+    """Сервис, у которого запрос /simple/price подменен: фиксирует пачки id"""
+    service = FinanceAPIService()
+    service.requested = []
+
+    async def fetch(coin_ids, currencies):
+        service.requested.append(list(coin_ids))
+        return {
+            coin_id: {currency: quote(coin_id, currency) for currency in currencies}
+            for coin_id in coin_ids
+            if coin_id not in unknown
+        }
+
+    service._fetch_crypto_prices = fetch
+    return service
+
+
+def test_chunks_respect_batch_size_and_url_length(monkeypatch):
+    monkeypatch.setattr(settings, "coingecko_batch_size", 3)
+    monkeypatch.setattr(settings, "coingecko_ids_max_length", 20)
+    ids = ["a", "b", "c", "d", "long-coin-id-1", "e", "this-id-is-longer-than-the-limit"]
+
+    chunks = FinanceAPIService._chunk_coin_ids(ids)
+
+    assert [coin_id for chunk in chunks for coin_id in chunk] == ids
+    assert all(1 <= len(chunk) <= 3 for chunk in chunks)
+    # Каждая пачка, кроме состоящих из одного длинного id, укладывается в длину URL
+    assert all(sum(len(coin_id) + 3 for coin_id in chunk) <= 20 for chunk in chunks if len(chunk) > 1)
+    assert chunks[-1] == ["this-id-is-longer-than-the-limit"]
+
+
+def test_only_uncached_ids_are_requested_once(monkeypatch):
+    monkeypatch.setattr(settings, "coingecko_batch_size", 2)
+
+    async def scenario():
+        service = make_service(unknown={"nosuchcoin"})
+        service.caches["crypto_price"].set(("bitcoin", "usd"), quote("bitcoin", "usd"))
+
+        prices = await service.get_crypto_prices(
+            ["bitcoin", "ethereum", "solana", "ethereum", "nosuchcoin"])
+
+        assert sorted(prices) == ["bitcoin", "ethereum", "solana"]
+        assert service.requested == [["ethereum", "solana"], ["nosuchcoin"]]
+
+        # Второй вызов целиком из кэша; ненайденная монета запрашивается снова
+        service.requested.clear()
+        await service.get_crypto_prices(["bitcoin", "ethereum", "solana", "nosuchcoin"])
+        assert service.requested == [["nosuchcoin"]]
+
+    asyncio.run(scenario())
+
+
+def test_cached_quote_counts_only_when_every_currency_is_cached():
+    async def scenario():
+        service = make_service()
+        service.caches["crypto_price"].set(("bitcoin", "usd"), quote("bitcoin", "usd"))
+
+        prices = await service.get_crypto_prices(["bitcoin"], currencies=("usd", "eur", "usd"))
+
+        assert service.requested == [["bitcoin"]]
+        assert sorted(prices["bitcoin"]) == ["eur", "usd"]
+
+    asyncio.run(scenario())
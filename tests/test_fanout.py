@@ -0,0 +1,76 @@
+import asyncio
+import time
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from services.fanout import FanoutSender
+
+
+class FakeBot:
+    """Записывает время каждой отправки; errors — исключения для первых вызовов"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def send_times(bot, chat_id):
+    return [sent_at for sent_chat, sent_at in bot.sent if sent_chat == chat_id]
+
+
+def test_messages_to_one_chat_are_spaced_by_chat_interval():
+    async def scenario():
+        bot = FakeBot()
+        sender = FanoutSender(bot, global_rate=1000, chat_interval=0.1, concurrency=4)
+        started = time.monotonic()
+        stats = await sender.broadcast([1, 1, 1, 2], "digest")
+
+        assert (stats.recipients, stats.sent, stats.failed) == (4, 4, 0)
+        times = send_times(bot, 1)
+        assert all(later - earlier >= 0.09 for earlier, later in zip(times, times[1:]))
+        # Другой чат не ждет очереди первого
+        assert send_times(bot, 2)[0] - started < 0.05
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_pauses_the_whole_broadcast():
+    async def scenario():
+        retry = TelegramRetryAfter(SendMessage(chat_id=1, text="digest"), "Too Many Requests", retry_after=1)
+        bot = FakeBot(errors=[retry])
+        sender = FanoutSender(bot, global_rate=1000, chat_interval=0, concurrency=1)
+        started = time.monotonic()
+        stats = await sender.broadcast([1, 2, 3], "digest")
+
+        assert (stats.sent, stats.retried, stats.failed) == (3, 1, 0)
+        assert min(sent_at for _, sent_at in bot.sent) - started >= 0.95
+
+    asyncio.run(scenario())
+
+
+def test_blocked_users_are_counted_separately():
+    async def scenario():
+        forbidden = TelegramForbiddenError(SendMessage(chat_id=1, text="digest"), "bot was blocked by the user")
+        bot = FakeBot(errors=[forbidden])
+        stats = await FanoutSender(bot, global_rate=1000, chat_interval=0, concurrency=1).broadcast([1, 2], "digest")
+
+        assert (stats.sent, stats.blocked, stats.failed) == (1, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_unexpected_errors_do_not_stall_the_broadcast():
+    async def scenario():
+        bot = FakeBot(errors=[asyncio.TimeoutError(), RuntimeError("session closed")] * 5)
+        sender = FanoutSender(bot, global_rate=1000, chat_interval=0, concurrency=2)
+        stats = await asyncio.wait_for(sender.broadcast(range(20), "digest"), 5)
+
+        assert (stats.recipients, stats.sent, stats.failed) == (20, 10, 10)
+
+    asyncio.run(scenario())
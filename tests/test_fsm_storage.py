@@ -0,0 +1,101 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from aiogram.fsm.storage.base import StorageKey
+from database.fsm_storage import PostgresStorage
+
+
+class FakeConnection:
+    """Таблица fsm_states в словаре: ровно те запросы, которые делает PostgresStorage"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchrow(self, query, key):
+        assert "FROM fsm_states" in query
+        return self.rows.get(key)
+
+    async def execute(self, query, key, value):
+        row = self.rows.setdefault(key, {"state": None, "data": "{}"})
+        if "INSERT INTO fsm_states (key, state" in query:
+            row["state"] = value
+        elif "INSERT INTO fsm_states (key, data" in query:
+            row["data"] = value
+        else:
+            raise AssertionError(query)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.rows = {}
+        self.reads = 0
+
+    @asynccontextmanager
+    async def acquire(self, method):
+        self.reads += 1
+        yield FakeConnection(self.rows)
+
+
+def make_key(user_id=1, destiny="default"):
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id, destiny=destiny)
+
+
+def test_write_on_one_replica_is_seen_by_another():
+    async def scenario():
+        database = FakeDatabase()
+        replica_a = PostgresStorage(database, state_ttl=3600)
+        replica_b = PostgresStorage(database, state_ttl=3600)
+        try:
+            # Промах на B не запоминается: запись A видна сразу
+            assert await replica_b.get_state(make_key()) is None
+            await replica_a.set_state(make_key(), "AlertStates:waiting_for_price")
+            await replica_a.set_data(make_key(), {"symbol": "bitcoin"})
+
+            assert await replica_b.get_state(make_key()) == "AlertStates:waiting_for_price"
+            assert await replica_b.get_data(make_key()) == {"symbol": "bitcoin"}
+
+            await replica_b.set_state(make_key(), None)
+            assert await replica_a.get_state(make_key()) is None
+        finally:
+            await replica_a.close()
+            await replica_b.close()
+
+    asyncio.run(scenario())
+
+
+def test_state_and_data_are_written_independently():
+    async def scenario():
+        database = FakeDatabase()
+        storage = PostgresStorage(database, state_ttl=3600)
+        try:
+            await storage.set_data(make_key(), {"symbol": "AAPL"})
+            await storage.set_state(make_key(), "AlertStates:waiting_for_type")
+            assert await storage.get_data(make_key()) == {"symbol": "AAPL"}
+
+            await storage.set_data(make_key(), {})
+            assert await storage.get_state(make_key()) == "AlertStates:waiting_for_type"
+            assert json.loads(database.rows[storage._key(make_key())]["data"]) == {}
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_every_read_goes_to_the_database():
+    async def scenario():
+        database = FakeDatabase()
+        storage = PostgresStorage(database, state_ttl=3600)
+        await storage.get_state(make_key())
+        await storage.get_state(make_key())
+        assert database.reads == 2
+
+    asyncio.run(scenario())
+
+
+def test_keys_differ_by_user_and_destiny():
+    keys = {
+        PostgresStorage._key(make_key(1)),
+        PostgresStorage._key(make_key(2)),
+        PostgresStorage._key(make_key(1, destiny="profile")),
+    }
+    assert len(keys) == 3
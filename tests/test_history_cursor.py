@@ -0,0 +1,23 @@
+from datetime import datetime
+from types import SimpleNamespace
+from handlers.menu import _history_cursor, _parse_history_cursor
+
+
+def test_cursor_round_trip_keeps_microseconds():
+    interaction = SimpleNamespace(created_at=datetime(2025, 3, 14, 15, 9, 26, 535897), id=271828)
+
+    assert _parse_history_cursor(_history_cursor(interaction)) == (interaction.created_at, interaction.id)
+
+
+def test_cursor_order_matches_keyset_order():
+    older = SimpleNamespace(created_at=datetime(2025, 1, 1, 12, 0, 0, 1), id=9)
+    newer = SimpleNamespace(created_at=datetime(2025, 1, 1, 12, 0, 0, 2), id=1)
+
+    assert _parse_history_cursor(_history_cursor(older)) < _parse_history_cursor(_history_cursor(newer))
+
+
+def test_largest_cursor_fits_callback_data():
+    # Telegram ограничивает callback_data 64 байтами
+    interaction = SimpleNamespace(created_at=datetime(9999, 12, 31, 23, 59, 59, 999999), id=2 ** 63 - 1)
+
+    assert len(f"hist_o_{_history_cursor(interaction)}".encode()) <= 64
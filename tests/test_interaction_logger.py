@@ -0,0 +1,113 @@
+import asyncio
+from services import interaction_logger as logger_module
+from services.cache import TTLCache
+from services.interaction_logger import InteractionLogger
+
+
+class FakeDatabase:
+    """save_interactions падает failures раз подряд (None — всегда), затем пишет пачку"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self.users = []
+
+    async def upsert_users(self, users):
+        self.users.extend(users)
+        return len(users)
+
+    async def save_interactions(self, batch):
+        if self.failures is None or self.failures > 0:
+            if self.failures:
+                self.failures -= 1
+            raise ConnectionError("connection reset")
+        self.batches.append(list(batch))
+        return len(batch)
+
+
+def make_logger(monkeypatch, database, buffer_size=100, batch_size=3, flush_interval=10.0, **kwargs):
+    monkeypatch.setattr(logger_module, "db", database)
+    return InteractionLogger(buffer_size, batch_size, flush_interval, put_timeout=0.1,
+                             identity_cache=TTLCache(60, 100), **kwargs)
+
+
+async def log_many(interaction_logger, count):
+    for i in range(count):
+        await interaction_logger.log(i, f"user{i}", f"request {i}", "response")
+
+
+def test_full_batches_flush_without_waiting_for_the_timer(monkeypatch):
+    async def scenario():
+        database = FakeDatabase()
+        interaction_logger = make_logger(monkeypatch, database)
+        await interaction_logger.start()
+        await log_many(interaction_logger, 7)
+        await asyncio.sleep(0.05)
+        assert [len(batch) for batch in database.batches] == [3, 3]
+
+        # Остаток дописывается при остановке, не дожидаясь flush_interval
+        await interaction_logger.stop()
+        assert [len(batch) for batch in database.batches] == [3, 3, 1]
+        assert interaction_logger.stats()["written"] == 7
+
+    asyncio.run(scenario())
+
+
+def test_partial_batch_flushes_after_interval(monkeypatch):
+    async def scenario():
+        database = FakeDatabase()
+        interaction_logger = make_logger(monkeypatch, database, batch_size=100, flush_interval=0.05)
+        await interaction_logger.start()
+        await log_many(interaction_logger, 2)
+        await asyncio.sleep(0.2)
+        assert [len(batch) for batch in database.batches] == [2]
+        assert len(database.users) == 2
+        await interaction_logger.stop()
+
+    asyncio.run(scenario())
+
+
+def test_failed_write_is_retried(monkeypatch):
+    async def scenario():
+        database = FakeDatabase(failures=2)
+        interaction_logger = make_logger(monkeypatch, database, write_retries=3, retry_backoff=0.01)
+        await interaction_logger.start()
+        await log_many(interaction_logger, 3)
+        await interaction_logger.stop()
+
+        stats = interaction_logger.stats()
+        assert [len(batch) for batch in database.batches] == [3]
+        assert (stats["written"], stats["retries"], stats["failed"]) == (3, 2, 0)
+
+    asyncio.run(scenario())
+
+
+def test_batch_is_requeued_and_dropped_only_on_stop(monkeypatch):
+    async def scenario():
+        database = FakeDatabase(failures=None)
+        interaction_logger = make_logger(monkeypatch, database, write_retries=1, retry_backoff=0.01)
+        await interaction_logger.start()
+        await log_many(interaction_logger, 3)
+        await asyncio.sleep(0.1)
+        stats = interaction_logger.stats()
+        assert stats["requeued"] >= 3
+        assert stats["failed"] == 0
+
+        await interaction_logger.stop()
+        stats = interaction_logger.stats()
+        assert (stats["written"], stats["failed"]) == (0, 3)
+
+    asyncio.run(scenario())
+
+
+def test_requeue_keeps_only_what_fits_in_the_buffer(monkeypatch):
+    async def scenario():
+        interaction_logger = make_logger(monkeypatch, FakeDatabase(), buffer_size=3)
+        await log_many(interaction_logger, 1)
+        batch = [(i, None, "request", "response", None) for i in range(4)]
+        interaction_logger._requeue(batch, ConnectionError("connection reset"))
+
+        stats = interaction_logger.stats()
+        assert (stats["depth"], stats["requeued"], stats["failed"]) == (3, 2, 2)
+
+    asyncio.run(scenario())
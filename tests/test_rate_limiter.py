@@ -0,0 +1,76 @@
+import asyncio
+from services.rate_limiter import Priority, PriorityTokenBucket, TokenBucket
+
+
+def test_priority_bucket_refills_up_to_capacity(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("services.rate_limiter.time.monotonic", lambda: now[0])
+
+    async def scenario():
+        bucket = PriorityTokenBucket(rate=2, capacity=3)
+        for _ in range(3):
+            await bucket.acquire()
+        assert bucket.stats()["tokens"] == 0
+
+        now[0] += 1
+        assert bucket.stats()["tokens"] == 2
+        now[0] += 60
+        assert bucket.stats()["tokens"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def scenario():
+        bucket = PriorityTokenBucket(rate=100, capacity=1)
+        await bucket.acquire()
+        order = []
+
+        async def request(name, priority):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        # Ставим в очередь от наименее важного к самому важному
+        tasks = [
+            asyncio.ensure_future(request("digest", Priority.DIGESTS)),
+            asyncio.ensure_future(request("alert-1", Priority.ALERTS)),
+            asyncio.ensure_future(request("alert-2", Priority.ALERTS)),
+            asyncio.ensure_future(request("user", Priority.INTERACTIVE)),
+        ]
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+
+        assert order == ["user", "alert-1", "alert-2", "digest"]
+        granted = bucket.stats()["granted"]
+        assert granted == {"interactive": 2, "alerts": 2, "digests": 1}
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_consume_a_token():
+    async def scenario():
+        bucket = PriorityTokenBucket(rate=20, capacity=1)
+        await bucket.acquire()
+
+        cancelled = asyncio.ensure_future(bucket.acquire(Priority.INTERACTIVE))
+        waiting = asyncio.ensure_future(bucket.acquire(Priority.DIGESTS))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await asyncio.wait_for(waiting, 1)
+        assert bucket.stats()["granted"]["digests"] == 1
+        assert bucket.stats()["granted"]["interactive"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_paces_after_burst():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        # Два токена из запаса, еще два — по 20 мс каждый
+        assert loop.time() - started >= 0.035
+
+    asyncio.run(scenario())
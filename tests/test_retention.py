@@ -0,0 +1,72 @@
+import asyncio
+from datetime import date
+from config import settings
+from services import retention
+from services.retention import RetentionService
+
+
+class FakeDatabase:
+    """Партиции по месяцам; фиксирует, что архивировано и что удалено"""
+
+    def __init__(self, hot_months, archive_months):
+        self.partitions = {
+            'user_interactions': {month: f"user_interactions_{month:%Y%m}" for month in hot_months},
+            'user_interactions_archive': {
+                month: f"user_interactions_archive_{month:%Y%m}" for month in archive_months
+            },
+        }
+        self.archived = []
+        self.dropped = []
+        self.purged_before = []
+
+    async def get_partitions(self, parent):
+        return dict(self.partitions[parent])
+
+    async def archive_interaction_partition(self, month):
+        self.archived.append(month)
+        return 10
+
+    async def drop_archive_partition(self, month):
+        self.dropped.append(month)
+
+    async def purge_interaction_responses(self, before):
+        self.purged_before.append(before)
+        return 1
+
+
+def test_partitions_older_than_the_cutoffs_are_rotated(monkeypatch):
+    monkeypatch.setattr(settings, "interaction_hot_months", 3)
+    monkeypatch.setattr(settings, "interaction_archive_months", 24)
+    database = FakeDatabase(
+        hot_months=[date(2024, 10, 1), date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1),
+                    date(2025, 2, 1), date(2025, 3, 1)],
+        archive_months=[date(2022, 12, 1), date(2023, 1, 1), date(2023, 2, 1), date(2023, 3, 1)],
+    )
+    monkeypatch.setattr(retention, "db", database)
+    service = RetentionService()
+
+    # Середина месяца: отсчет идет от первого числа текущего месяца
+    result = asyncio.run(service.run_once(today=date(2025, 2, 17)))
+
+    # Горячими остаются ноябрь, декабрь, январь и текущий февраль (и будущий март)
+    assert database.archived == [date(2024, 10, 1)]
+    assert database.dropped == [date(2022, 12, 1), date(2023, 1, 1)]
+    assert database.purged_before == [date(2023, 2, 1)]
+    assert result == {"archived": 1, "dropped": 2, "responses_purged": 1}
+    assert (service.rows_archived, service.partitions_archived, service.partitions_dropped) == (10, 1, 2)
+
+
+def test_cutoffs_cross_the_year_boundary(monkeypatch):
+    monkeypatch.setattr(settings, "interaction_hot_months", 1)
+    monkeypatch.setattr(settings, "interaction_archive_months", 12)
+    database = FakeDatabase(
+        hot_months=[date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)],
+        archive_months=[date(2023, 12, 1), date(2024, 1, 1)],
+    )
+    monkeypatch.setattr(retention, "db", database)
+
+    asyncio.run(RetentionService().run_once(today=date(2025, 1, 1)))
+
+    assert database.archived == [date(2024, 11, 1)]
+    assert database.dropped == [date(2023, 12, 1)]
+    assert database.purged_before == [date(2024, 1, 1)]
@@ -0,0 +1,67 @@
+import asyncio
+import json
+from services import symbol_catalog as catalog_module
+from services.symbol_catalog import SymbolCatalog
+
+
+class FakeSharedCache:
+    """api_cache в словаре; значения проходят через JSON, как в PostgreSQL"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, namespace, key):
+        if (namespace, key) not in self.values:
+            return None
+        value, ttl = self.values[(namespace, key)]
+        return json.loads(value), ttl
+
+    async def set_many(self, namespace, items, ttl):
+        for key, value in items.items():
+            self.values[(namespace, key)] = (json.dumps(value), ttl)
+
+
+class FakeProviders:
+    def __init__(self):
+        self.calls = 0
+
+    async def get_coin_list(self):
+        self.calls += 1
+        return [{"id": "bitcoin", "symbol": "btc", "name": "Bitcoin"}]
+
+    async def get_coin_ranks(self, pages):
+        self.calls += 1
+        return {"bitcoin": 1}
+
+    async def get_stock_listing(self):
+        self.calls += 1
+        return [{"symbol": "AAPL", "name": "Apple Inc"}]
+
+    def priority(self, priority):
+        return self.finance_api.priority(priority)
+
+
+def test_followers_load_the_published_snapshot_without_provider_calls(monkeypatch):
+    providers = FakeProviders()
+    providers.finance_api = catalog_module.finance_api
+    monkeypatch.setattr(catalog_module, "finance_api", providers)
+
+    async def scenario():
+        shared = FakeSharedCache()
+        leader, follower = SymbolCatalog(shared), SymbolCatalog(shared)
+
+        assert not await follower.load_shared()
+        assert await leader.refresh()
+        await leader.publish()
+        assert providers.calls == 3
+
+        assert await follower.load_shared()
+        assert follower.resolve("btc").id == "bitcoin"
+        assert follower.resolve("aapl").id == "AAPL"
+        assert follower.resolve("bitcoin").rank == 1
+        # Та же версия повторно не перестраивается
+        assert not await follower.load_shared()
+        assert not await leader.load_shared()
+        assert providers.calls == 3
+
+    asyncio.run(scenario())
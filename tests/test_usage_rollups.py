@@ -0,0 +1,109 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+import asyncpg
+import pytest
+from database import queries
+from database.connection import Database
+from database.queries import QueryConnection
+
+# Проверка самих SQL-счетчиков требует PostgreSQL: TEST_DATABASE_URL=postgresql://...
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+RECORDS = [
+    (1, "alice", "btc", "ok", datetime(2025, 1, 31, 10, 0)),
+    (1, "alice", "eth", "ok", datetime(2025, 1, 31, 9, 0)),
+    (2, "bob", "aapl", "ok", datetime(2025, 1, 31, 12, 0)),
+    (1, "alice", "sol", "ok", datetime(2025, 2, 1, 8, 30)),
+]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.copied = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.extend(records)
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def test_batch_is_rolled_up_per_user_and_day(monkeypatch):
+    calls = []
+
+    async def execute(conn, query, *args):
+        calls.append((query, args))
+
+    monkeypatch.setattr(queries, "execute", execute)
+
+    async def scenario():
+        conn = FakeConnection()
+        database = Database()
+        database.pool = FakePool(conn)
+        database._interaction_partitions.update({date(2025, 1, 1), date(2025, 2, 1)})
+
+        assert await database.save_interactions(RECORDS) == 4
+        assert len(conn.copied) == 4
+        [(query, (user_ids, days, counts, first_at, last_at))] = calls
+        assert query is Database._UPDATE_USAGE
+        assert sorted(zip(user_ids, days, counts, first_at, last_at)) == [
+            (1, date(2025, 1, 31), 2, datetime(2025, 1, 31, 9, 0), datetime(2025, 1, 31, 10, 0)),
+            (1, date(2025, 2, 1), 1, datetime(2025, 2, 1, 8, 30), datetime(2025, 2, 1, 8, 30)),
+            (2, date(2025, 1, 31), 1, datetime(2025, 1, 31, 12, 0), datetime(2025, 1, 31, 12, 0)),
+        ]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_incremental_rollups_match_a_full_backfill():
+    async def snapshot(database):
+        async with database.pool.acquire() as conn:
+            daily = await conn.fetch('SELECT * FROM user_daily_usage ORDER BY user_id, day')
+            totals = await conn.fetch('SELECT * FROM user_usage_totals ORDER BY user_id')
+        return [dict(row) for row in daily], [dict(row) for row in totals]
+
+    async def scenario():
+        schema = f"test_usage_rollups_{os.getpid()}"
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        await admin.execute(f'CREATE SCHEMA {schema}')
+        database = Database()
+        try:
+            database.pool = await asyncpg.create_pool(
+                TEST_DATABASE_URL, min_size=1, max_size=2, connection_class=QueryConnection,
+                server_settings={"search_path": schema}
+            )
+            await database.migrate()
+
+            # Второй день пользователя 1 приходит отдельной пачкой, первый — двумя
+            await database.save_interactions(RECORDS[:2])
+            await database.save_interactions(RECORDS[2:])
+            await database.save_interactions([(1, "alice", "btc", "ok", datetime(2025, 1, 31, 8, 0))])
+
+            usage = await database.get_user_usage(1)
+            assert (usage.total_interactions, usage.active_days) == (4, 2)
+            assert usage.first_interaction == datetime(2025, 1, 31, 8, 0)
+            assert usage.last_interaction == datetime(2025, 2, 1, 8, 30)
+
+            incremental = await snapshot(database)
+            await database.backfill_usage_rollups()
+            assert await snapshot(database) == incremental
+        finally:
+            if database.pool:
+                await database.pool.close()
+            await admin.execute(f'DROP SCHEMA {schema} CASCADE')
+            await admin.close()
+
+    asyncio.run(scenario())
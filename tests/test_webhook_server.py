@@ -0,0 +1,86 @@
+import asyncio
+from aiohttp.test_utils import TestClient, TestServer
+from services.webhook_server import SECRET_HEADER, WebhookServer
+
+
+async def run_server(server, scenario):
+    """Воркеры через start() (порт выбирает система), запросы — через тестовый клиент"""
+    await server.start("127.0.0.1", 0)
+    client = TestClient(TestServer(server.build_app()))
+    await client.start_server()
+    try:
+        await scenario(client)
+    finally:
+        await client.close()
+        await server.stop()
+
+
+def test_secret_token_is_required():
+    received = []
+
+    async def on_update(data):
+        received.append(data)
+
+    async def scenario(client):
+        assert (await client.post("/webhook", json={"update_id": 1})).status == 401
+        wrong = await client.post("/webhook", json={"update_id": 2}, headers={SECRET_HEADER: "wrong"})
+        assert wrong.status == 401
+        right = await client.post("/webhook", json={"update_id": 3}, headers={SECRET_HEADER: "s3cret"})
+        assert right.status == 200
+
+    server = WebhookServer(on_update, "/webhook", secret_token="s3cret", workers=1)
+    asyncio.run(run_server(server, scenario))
+    assert received == [{"update_id": 3}]
+
+
+def test_full_queue_answers_503():
+    release = asyncio.Event()
+
+    async def on_update(data):
+        await release.wait()
+
+    async def scenario(client):
+        # Первое обновление занимает воркер, второе — единственное место в очереди
+        assert (await client.post("/webhook", json={"update_id": 1})).status == 200
+        await asyncio.sleep(0.01)
+        assert (await client.post("/webhook", json={"update_id": 2})).status == 200
+        assert (await client.post("/webhook", json={"update_id": 3})).status == 503
+        assert server.stats()["rejected"] == 1
+        release.set()
+
+    server = WebhookServer(on_update, "/webhook", workers=1, queue_size=1)
+    asyncio.run(run_server(server, scenario))
+    assert server.stats()["processed"] == 2
+
+
+def test_non_object_bodies_are_rejected_and_errors_keep_workers_alive():
+    received = []
+
+    async def on_update(data):
+        if data["update_id"] == 1:
+            raise RuntimeError("handler failed")
+        received.append(data)
+
+    async def scenario(client):
+        for body in ([], [1], "update", 42):
+            assert (await client.post("/webhook", json=body)).status == 400
+        assert (await client.post("/webhook", data=b"{not json")).status == 400
+
+        assert (await client.post("/webhook", json={"update_id": 1})).status == 200
+        assert (await client.post("/webhook", json={"update_id": 2})).status == 200
+
+    server = WebhookServer(on_update, "/webhook", workers=1)
+    asyncio.run(run_server(server, scenario))
+    assert received == [{"update_id": 2}]
+    assert (server.stats()["failed"], server.stats()["processed"]) == (1, 1)
+
+
+def test_updates_are_refused_until_started():
+    async def scenario():
+        server = WebhookServer(lambda data: None, "/webhook")
+        async with TestClient(TestServer(server.build_app())) as client:
+            assert (await client.post("/webhook", json={"update_id": 1})).status == 503
+            assert (await client.get("/ready")).status == 503
+            assert (await client.get("/health")).status == 200
+
+    asyncio.run(scenario())